@@ -0,0 +1,58 @@
+import os
+import time
+import argparse
+import numpy as np
+import scipy.io.wavfile as wav
+import speechpy
+import audio_io
+
+
+def legacy_logenergy(sound_file_path):
+    """The previous AudioDataset.__getitem__ path: two decodes and unused frames/power spectrum."""
+    fs, signal = wav.read(sound_file_path)
+    import soundfile as sf
+    signal, fs = sf.read(sound_file_path)
+    frames = speechpy.processing.stack_frames(signal, sampling_frequency=fs, frame_length=0.025,
+                                              frame_stride=0.01, zero_padding=True)
+    # The power spectrum was computed and dropped.
+    speechpy.processing.power_spectrum(frames, fft_points=2 * 40)[:, 1:]
+    return speechpy.feature.lmfe(signal, sampling_frequency=fs, frame_length=0.025, frame_stride=0.01,
+                                 num_filters=40, fft_length=1024, low_frequency=0, high_frequency=None)
+
+
+def time_per_file(fn, sound_files, repeats):
+    """Returns the best average time per file over the repeats."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.time()
+        for sound_file_path in sound_files:
+            fn(sound_file_path)
+        best = min(best, (time.time() - start) / len(sound_files))
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-file feature extraction micro-benchmark')
+    parser.add_argument('--file_path',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file_path.txt'),
+                        help='The file names of the sound files')
+    parser.add_argument('--audio_dir',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Audio'),
+                        help='Location of sound files')
+    parser.add_argument('--repeats', type=int, default=20, help='Number of passes over the files')
+    args = parser.parse_args()
+
+    with open(args.file_path, 'r') as f:
+        sound_files = [os.path.join(args.audio_dir, x.strip().split()[1]) for x in f if x.strip()]
+
+    # Both paths must produce the same features.
+    for sound_file_path in sound_files:
+        assert np.allclose(legacy_logenergy(sound_file_path), audio_io.extract_logenergy(sound_file_path)), \
+            'Features differ for %s' % sound_file_path
+
+    legacy_time = time_per_file(legacy_logenergy, sound_files, args.repeats)
+    new_time = time_per_file(audio_io.extract_logenergy, sound_files, args.repeats)
+    print('files: %d' % len(sound_files))
+    print('legacy: %.2f ms/file' % (1000 * legacy_time))
+    print('single decode: %.2f ms/file' % (1000 * new_time))
+    print('speedup: %.2fx' % (legacy_time / new_time))
@@ -0,0 +1,121 @@
+import os
+import struct
+import zlib
+import hashlib
+import tempfile
+import numpy as np
+
+
+class FeatureCache(object):
+    """On-disk cache of full-length log-mel-energy matrices.
+
+    Each entry is keyed by the audio file path, size and modification time together
+    with the extraction parameters, so a modified file or a change in the parameters
+    is a cache miss. Entries are stored as float32 (the precision of the feature cubes)
+    after a small header holding an adler32 checksum, which is verified on every read.
+    The least recently used entries are evicted when the cache grows over its size.
+
+    Args:
+        cache_dir (string): The directory of the cache files.
+        max_size_mb (float): The maximum size of the cache in megabytes.
+    """
+
+    # magic, adler32 checksum of the data, number of frames, number of filters.
+    HEADER = struct.Struct('<4sIII')
+    MAGIC = b'LMFE'
+    EXTENSION = '.lmfe'
+
+    def __init__(self, cache_dir, max_size_mb=10240):
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """Returns a list of (path, size, last_access) for all the cache entries."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.EXTENSION):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Removed by another process in the meantime.
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _entry_path(self, sound_file_path, params):
+        stat = os.stat(sound_file_path)
+        key = '|'.join([os.path.abspath(sound_file_path), str(stat.st_size), repr(stat.st_mtime)] +
+                       ['%s=%r' % (name, params[name]) for name in sorted(params)])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + self.EXTENSION)
+
+    def get(self, sound_file_path, params):
+        """Returns the cached features of a file or None on a cache miss.
+
+        Args:
+            sound_file_path (string): The path of the audio file.
+            params (dict): The feature extraction parameters.
+        """
+        entry_path = self._entry_path(sound_file_path, params)
+        try:
+            with open(entry_path, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            return None
+
+        if len(content) >= self.HEADER.size:
+            magic, checksum, num_frames, num_filters = self.HEADER.unpack_from(content)
+            data = content[self.HEADER.size:]
+            if magic == self.MAGIC and len(data) == 4 * num_frames * num_filters and \
+                    zlib.adler32(data) & 0xffffffff == checksum:
+                # Mark the entry as recently used.
+                os.utime(entry_path, None)
+                return np.frombuffer(data, dtype='<f4').reshape(num_frames, num_filters)
+
+        print('cache entry %s is corrupted!' % entry_path)
+        self._remove(entry_path)
+        return None
+
+    def put(self, sound_file_path, params, feature):
+        """Adds the features of a file to the cache.
+
+        Args:
+            sound_file_path (string): The path of the audio file.
+            params (dict): The feature extraction parameters.
+            feature (ndarray): The (num_frames x num_filters) log-mel-energy matrix.
+        """
+        entry_path = self._entry_path(sound_file_path, params)
+        data = np.ascontiguousarray(feature, dtype='<f4').tobytes()
+        header = self.HEADER.pack(self.MAGIC, zlib.adler32(data) & 0xffffffff, feature.shape[0], feature.shape[1])
+
+        # Write to a temporary file first so readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(data)
+        os.rename(tmp_path, entry_path)
+
+        self.size += len(header) + len(data)
+        if self.size > self.max_size:
+            self._evict()
+
+    def _remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache is within 90% of its size."""
+        # The directory is rescanned because other processes may share the cache.
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in entries)
+        low_watermark = 0.9 * self.max_size
+        for entry_path, size, _ in entries:
+            if self.size <= low_watermark:
+                break
+            self._remove(entry_path)
+            self.size -= size
@@ -1,6 +1,5 @@
 import os
 from scipy.io.wavfile import read
-import scipy.io.wavfile as wav
 import subprocess as sp
 import numpy as np
 import argparse
@@ -8,8 +7,9 @@ import random
 import os
 import sys
 from random import shuffle
-import speechpy
 import datetime
+import audio_io
+from manifest_index import ManifestIndex
 
 
 ######################################
@@ -18,46 +18,26 @@ import datetime
 class AudioDataset():
     """Audio dataset."""
 
-    def __init__(self, files_path, audio_dir, transform=None):
+    def __init__(self, files_path, audio_dir, transform=None, num_threads=16):
         """
         Args:
             files_path (string): Path to the .txt file which the address of files are saved in it.
             root_dir (string): Directory with all the audio files.
             transform (callable, optional): Optional transform to be applied
                 on a sample.
+            num_threads (int): Number of threads validating the sound files.
         """
 
         # self.sound_files = [x.strip() for x in content]
         self.audio_dir = audio_dir
         self.transform = transform
 
-        # Open the .txt file and create a list from each line.
-        with open(files_path, 'r') as f:
-            content = f.readlines()
-        # you may also want to remove whitespace characters like `\n` at the end of each line
-        list_files = []
-        for x in content:
-            sound_file_path = os.path.join(self.audio_dir, x.strip().split()[1])
-            try:
-                with open(sound_file_path, 'rb') as f:
-                    riff_size, _ = wav._read_riff_chunk(f)
-                    file_size = os.path.getsize(sound_file_path)
-
-                # Assertion error.
-                assert riff_size == file_size and os.path.getsize(sound_file_path) > 1000, "Bad file!"
-
-                # Add to list if file is OK!
-                list_files.append(x.strip())
-            except OSError as err:
-                print("OS error: {0}".format(err))
-            except ValueError:
-                print('file %s is corrupted!' % sound_file_path)
-            # except:
-            #     print("Unexpected error:", sys.exc_info()[0])
-            #     raise
+        # Validate the files of the manifest (or load the results of a previous validation).
+        index = ManifestIndex(files_path, self.audio_dir, num_threads=num_threads)
+        index.report()
 
         # Save the correct and healthy sound files to a list.
-        self.sound_files = list_files
+        self.sound_files = index.healthy_files()
 
     def __len__(self):
         return len(self.sound_files)
@@ -66,35 +46,13 @@ class AudioDataset():
         # Get the sound file path
         sound_file_path = os.path.join(self.audio_dir, self.sound_files[idx].split()[1])
 
-        ##############################
-        ### Reading and processing ###
-        ##############################
-
-        # Reading .wav file
-        fs, signal = wav.read(sound_file_path)
-
-        # Reading .wav file
-        import soundfile as sf
-        signal, fs = sf.read(sound_file_path)
-
         ###########################
         ### Feature Extraction ####
         ###########################
 
-        # DEFAULTS:
-        num_coefficient = 40
-
-        # Staching frames
-        frames = speechpy.processing.stack_frames(signal, sampling_frequency=fs, frame_length=0.025,
-                                                  frame_stride=0.01,
-                                                  zero_padding=True)
-
-        # # Extracting power spectrum (choosing 3 seconds and elimination of DC)
-        power_spectrum = speechpy.processing.power_spectrum(frames, fft_points=2 * num_coefficient)[:, 1:]
-
-        logenergy = speechpy.feature.lmfe(signal, sampling_frequency=fs, frame_length=0.025, frame_stride=0.01,
-                                          num_filters=num_coefficient, fft_length=1024, low_frequency=0,
-                                          high_frequency=None)
+        # The file is decoded once and only the log-mel-energy features are computed.
+        logenergy = audio_io.extract_logenergy(sound_file_path, num_filters=40, frame_length=0.025,
+                                               frame_stride=0.01, fft_length=1024)
         print(logenergy.shape)
         ########################
         ### Handling sample ####
@@ -1,6 +1,5 @@
 import os
 from scipy.io.wavfile import read
-import scipy.io.wavfile as wav
 import subprocess as sp
 import numpy as np
 import argparse
@@ -8,9 +7,12 @@ import random
 import os
 import sys
 from random import shuffle
-import speechpy
 import datetime
 import tables
+import multiprocessing
+from feature_cache import FeatureCache
+import audio_io
+from manifest_index import ManifestIndex
 
 ######################################
 ####### Define the dataset class #####
@@ -18,84 +20,52 @@ import tables
 class AudioDataset():
     """Audio dataset."""
 
-    def __init__(self, files_path, audio_dir, transform=None):
+    # The log-mel-energy extraction parameters (part of the feature cache key).
+    feature_params = {'num_filters': 40, 'frame_length': 0.025, 'frame_stride': 0.01, 'fft_length': 1024}
+
+    def __init__(self, files_path, audio_dir, transform=None, cache=None, num_threads=16):
         """
         Args:
             files_path (string): Path to the .txt file which the address of files are saved in it.
             root_dir (string): Directory with all the audio files.
             transform (callable, optional): Optional transform to be applied
                 on a sample.
+            cache (FeatureCache, optional): Cache of the full-length log-mel-energy features.
+            num_threads (int): Number of threads validating the sound files.
         """
 
         # self.sound_files = [x.strip() for x in content]
         self.audio_dir = audio_dir
         self.transform = transform
+        self.cache = cache
 
-        # Open the .txt file and create a list from each line.
-        with open(files_path, 'r') as f:
-            content = f.readlines()
-        # you may also want to remove whitespace characters like `\n` at the end of each line
-        list_files = []
-        for x in content:
-            sound_file_path = os.path.join(self.audio_dir, x.strip().split()[1])
-            try:
-                with open(sound_file_path, 'rb') as f:
-                    riff_size, _ = wav._read_riff_chunk(f)
-                    file_size = os.path.getsize(sound_file_path)
-
-                # Assertion error.
-                assert riff_size == file_size and os.path.getsize(sound_file_path) > 1000, "Bad file!"
-
-                # Add to list if file is OK!
-                if riff_size > 40000: #to omit small file
-                    list_files.append(x.strip())
-            except OSError as err:
-                print("OS error: {0}".format(err))
-            except ValueError:
-                print('file %s is corrupted!' % sound_file_path)
-            # except:
-            #     print("Unexpected error:", sys.exc_info()[0])
-            #     raise
+        # Validate the files of the manifest (or load the results of a previous validation).
+        index = ManifestIndex(files_path, self.audio_dir, num_threads=num_threads)
+        index.report()
 
         # Save the correct and healthy sound files to a list.
-        self.sound_files = list_files
+        self.sound_files = index.healthy_files(min_riff_size=40000) # to omit small file
 
     def __len__(self):
         return len(self.sound_files)
 
+    def extract_logenergy(self, sound_file_path):
+        """Returns the full-length log-mel-energy features of a sound file."""
+        # The file is decoded once and only the log-mel-energy features are computed.
+        return audio_io.extract_logenergy(sound_file_path, **self.feature_params)
+
     def __getitem__(self, idx):
         # Get the sound file path
         sound_file_path = os.path.join(self.audio_dir, self.sound_files[idx].split()[1])
 
-        ##############################
-        ### Reading and processing ###
-        ##############################
-
-        # Reading .wav file
-        fs, signal = wav.read(sound_file_path)
-
-        # Reading .wav file
-        import soundfile as sf
-        signal, fs = sf.read(sound_file_path)
-
-        ###########################
-        ### Feature Extraction ####
-        ###########################
-
-        # DEFAULTS:
-        num_coefficient = 40
-
-        # Staching frames
-        frames = speechpy.processing.stack_frames(signal, sampling_frequency=fs, frame_length=0.025,
-                                                  frame_stride=0.01,
-                                                  zero_padding=True)
-
-        # # Extracting power spectrum (choosing 3 seconds and elimination of DC)
-        power_spectrum = speechpy.processing.power_spectrum(frames, fft_points=2 * num_coefficient)[:, 1:]
-
-        logenergy = speechpy.feature.lmfe(signal, sampling_frequency=fs, frame_length=0.025, frame_stride=0.01,
-                                          num_filters=num_coefficient, fft_length=1024, low_frequency=0,
-                                          high_frequency=None)
+        # The features are recomputed only if they are not cached.
+        logenergy = None
+        if self.cache is not None:
+            logenergy = self.cache.get(sound_file_path, self.feature_params)
+        if logenergy is None:
+            logenergy = self.extract_logenergy(sound_file_path)
+            if self.cache is not None:
+                self.cache.put(sound_file_path, self.feature_params, logenergy)
         #print(logenergy.shape)
 
         ########################
@@ -214,10 +184,51 @@ class Compose(object):
         format_string += '\n)'
         return format_string
 
+# The dataset used by each extraction worker process.
+_worker_dataset = None
+
+
+def _init_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+    # Forked workers inherit the same random state, so they must be reseeded for the
+    # random cube offsets of Feature_Cube to differ between workers.
+    np.random.seed()
+
+
+def _extract_item(idx):
+    return _worker_dataset.__getitem__(idx)
+
+
 class data_saver():
     def __init__(self):
         pass
 
+    @staticmethod
+    def extract(dataset, num_workers=1, chunksize=16):
+        """Yields the (feature, label) samples of the dataset in order.
+
+        Args:
+            dataset (AudioDataset): The dataset to extract the features from.
+            num_workers (int): The number of extraction processes. With a single worker
+                the features are extracted in the calling process.
+            chunksize (int): The number of files sent to a worker at once.
+        """
+        if num_workers <= 1:
+            for idx in range(len(dataset)):
+                yield dataset.__getitem__(idx)
+            return
+
+        # The files are fanned out to the workers and the results come back in the order of
+        # the dataset, so the caller stays the single writer of the HDF5 file.
+        pool = multiprocessing.Pool(processes=num_workers, initializer=_init_worker, initargs=(dataset,))
+        try:
+            for sample in pool.imap(_extract_item, range(len(dataset)), chunksize=chunksize):
+                yield sample
+        finally:
+            pool.terminate()
+            pool.join()
+
     @staticmethod
     def get_label_map():
         label_map = {}
@@ -230,8 +241,8 @@ class data_saver():
         return label_map
 
     @staticmethod
-    def save_dev_v2(file_path):
-        dataset = AudioDataset(files_path=file_path, audio_dir="",transform=Compose(
+    def save_dev_v2(file_path, num_workers=1, cache=None):
+        dataset = AudioDataset(files_path=file_path, audio_dir="", cache=cache, transform=Compose(
                                    [CMVN(), Feature_Cube(cube_shape=(20, 80, 40), augmentation=True), ToOutput()]))  # args.audio_dir,)
 
         # idx is the representation of the batch size which chosen to be as one sample (index) from the data.
@@ -256,8 +267,7 @@ class data_saver():
         label_map = data_saver.get_label_map()
 
         random.seed(123)
-        for idx in range(len(dataset)):
-            feature, label = dataset.__getitem__(idx)
+        for feature, label in data_saver.extract(dataset, num_workers):
             print(label, feature.shape)
             label_index = label_map[label]
             randint = random.randint(1, 10)
@@ -285,8 +295,8 @@ class data_saver():
         fileh.close()
 
     @staticmethod
-    def save_dev(file_path):
-        dataset = AudioDataset(files_path=file_path, audio_dir="",  # args.audio_dir,
+    def save_dev(file_path, num_workers=1, cache=None):
+        dataset = AudioDataset(files_path=file_path, audio_dir="", cache=cache,  # args.audio_dir,
                                transform=Compose(
                                    [CMVN(), Feature_Cube(cube_shape=(20, 80, 40), augmentation=True), ToOutput()]))
 
@@ -305,8 +315,7 @@ class data_saver():
                                              filters=filters)
         # utterance_earray.append(feature_list)
         random.seed(123)
-        for idx in range(len(dataset)):
-            feature, label = dataset.__getitem__(idx)
+        for feature, label in data_saver.extract(dataset, num_workers):
             print(label, feature.shape)
             randint = random.randint(1, 10)
             if randint > 2:
@@ -333,8 +342,8 @@ class data_saver():
         fileh.close()
 
     @staticmethod
-    def save_enrollment(file_path):
-        dataset = AudioDataset(files_path=file_path, audio_dir="",  # args.audio_dir,
+    def save_enrollment(file_path, num_workers=1, cache=None):
+        dataset = AudioDataset(files_path=file_path, audio_dir="", cache=cache,  # args.audio_dir,
                                transform=Compose(
                                    [CMVN(), Feature_Cube(cube_shape=(1, 80, 40), augmentation=True), ToOutput()]))
 
@@ -353,8 +362,7 @@ class data_saver():
                                              filters=filters)
         # utterance_earray.append(feature_list)
         random.seed(123)
-        for idx in range(len(dataset)):
-            feature, label = dataset.__getitem__(idx)
+        for feature, label in data_saver.extract(dataset, num_workers):
             print(label, feature.shape)
             randint = random.randint(1, 10)
             if randint > 2:
@@ -381,8 +389,8 @@ class data_saver():
         fileh.close()
 
     @staticmethod
-    def save_enrollment_v2(file_path):
-        dataset = AudioDataset(files_path=file_path, audio_dir="",  # args.audio_dir,
+    def save_enrollment_v2(file_path, num_workers=1, cache=None):
+        dataset = AudioDataset(files_path=file_path, audio_dir="", cache=cache,  # args.audio_dir,
                                transform=Compose(
                                    [CMVN(), Feature_Cube(cube_shape=(1, 80, 40), augmentation=True), ToOutput()]))
 
@@ -402,8 +410,7 @@ class data_saver():
         # utterance_earray.append(feature_list)
         label_map = data_saver.get_label_map()
         random.seed(123)
-        for idx in range(len(dataset)):
-            feature, label = dataset.__getitem__(idx)
+        for feature, label in data_saver.extract(dataset, num_workers):
             label_index = label_map[label]
             print(label,label_index, feature.shape)
             randint = random.randint(1, 10)
@@ -451,12 +458,27 @@ if __name__ == '__main__':
     parser.add_argument('--task_type',
                         default="dev",
                         help='develpment or enrollment')
+
+    # The number of processes used for feature extraction.
+    parser.add_argument('--num_workers', type=int,
+                        default=1,
+                        help='Number of feature extraction processes')
+
+    # The directory of the log-mel-energy feature cache. No cache is used if not provided.
+    parser.add_argument('--cache_dir',
+                        default=None,
+                        help='Location of the feature cache')
+
+    parser.add_argument('--cache_size_mb', type=float,
+                        default=10240,
+                        help='Maximum size of the feature cache in megabytes')
     args = parser.parse_args()
 
+    cache = FeatureCache(args.cache_dir, args.cache_size_mb) if args.cache_dir else None
     if args.task_type == "development":
-        data_saver.save_dev_v2(args.file_path)
+        data_saver.save_dev_v2(args.file_path, args.num_workers, cache)
     elif args.task_type == "enrollment":
-        data_saver.save_enrollment_v2(args.file_path)
+        data_saver.save_enrollment_v2(args.file_path, args.num_workers, cache)
 
     '''
     dataset = AudioDataset(files_path=args.file_path, audio_dir="",#args.audio_dir,
@@ -0,0 +1,123 @@
+import os
+import tempfile
+from multiprocessing.pool import ThreadPool
+import scipy.io.wavfile as wav
+
+# Status of a sound file in the manifest index.
+STATUS_OK = 'ok'
+STATUS_BAD = 'bad'
+STATUS_CORRUPTED = 'corrupted'
+STATUS_OS_ERROR = 'os_error'
+
+
+def validate_file(sound_file_path):
+    """Checks the RIFF header of a sound file against its size.
+
+    Args:
+        sound_file_path (string): The path of the sound file.
+
+    Returns:
+        A (size, riff_size, status) tuple. The sizes are -1 if they could not be read.
+    """
+    size, riff_size = -1, -1
+    try:
+        with open(sound_file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            riff_size = wav._read_riff_chunk(f)[0]
+    except (IOError, OSError):
+        return size, riff_size, STATUS_OS_ERROR
+    except ValueError:
+        return size, riff_size, STATUS_CORRUPTED
+
+    if riff_size != size or size <= 1000:
+        return size, riff_size, STATUS_BAD
+    return size, riff_size, STATUS_OK
+
+
+class ManifestIndex(object):
+    """Validation results of all the sound files of a manifest.
+
+    The results are saved in a sidecar index next to the manifest (manifest + '.index')
+    with one "path size riff_size status" line per manifest line. As long as the manifest
+    and the audio directory are unchanged, the index is loaded instead of opening every
+    sound file again.
+
+    Args:
+        files_path (string): Path to the .txt file which the address of files are saved in it.
+        audio_dir (string): Directory with all the audio files.
+        num_threads (int): Number of threads validating the sound files.
+    """
+
+    def __init__(self, files_path, audio_dir, num_threads=16):
+        self.files_path = files_path
+        self.index_path = files_path + '.index'
+        self.audio_dir = audio_dir
+
+        # Open the .txt file and create a list from each non-empty line.
+        with open(files_path, 'r') as f:
+            self.lines = [x.strip() for x in f if x.strip()]
+
+        self.records = self._load()
+        if self.records is None:
+            self.records = self._validate(num_threads)
+            self._save()
+
+    def _signature(self):
+        stat = os.stat(self.files_path)
+        return '# %d %r %s' % (stat.st_size, stat.st_mtime, os.path.abspath(self.audio_dir))
+
+    def _load(self):
+        """Returns the records of the sidecar index or None if it is missing or stale."""
+        try:
+            with open(self.index_path, 'r') as f:
+                content = f.read().splitlines()
+        except (IOError, OSError):
+            return None
+        if not content or content[0] != self._signature() or len(content) != len(self.lines) + 1:
+            return None
+
+        records = []
+        for line in content[1:]:
+            path, size, riff_size, status = line.rsplit('\t', 3)
+            records.append((path, int(size), int(riff_size), status))
+        return records
+
+    def _validate(self, num_threads):
+        paths = [os.path.join(self.audio_dir, x.split()[1]) for x in self.lines]
+
+        # Validation is I/O bound, so the files are opened concurrently.
+        pool = ThreadPool(max(1, num_threads))
+        try:
+            results = pool.map(validate_file, paths, chunksize=64)
+        finally:
+            pool.close()
+            pool.join()
+        return [(path,) + result for path, result in zip(paths, results)]
+
+    def _save(self):
+        content = [self._signature()] + ['%s\t%d\t%d\t%s' % record for record in self.records]
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.index_path)))
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(content) + '\n')
+            os.rename(tmp_path, self.index_path)
+        except (IOError, OSError) as err:
+            print("Could not save the manifest index: {0}".format(err))
+
+    def healthy_files(self, min_riff_size=0):
+        """Returns the manifest lines of the healthy sound files.
+
+        Args:
+            min_riff_size (int): Files with a smaller RIFF size are omitted.
+        """
+        return [line for line, (_, _, riff_size, status) in zip(self.lines, self.records)
+                if status == STATUS_OK and riff_size > min_riff_size]
+
+    def report(self):
+        """Prints a single summary of the files which failed the validation."""
+        failed = [record for record in self.records if record[3] != STATUS_OK]
+        if not failed:
+            return
+        print('%d of %d files failed the validation:' % (len(failed), len(self.records)))
+        for path, size, riff_size, status in failed:
+            print('  %s: %s (size=%d, riff_size=%d)' % (path, status, size, riff_size))
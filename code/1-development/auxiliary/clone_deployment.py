@@ -0,0 +1,117 @@
+"""
+Placement of the data-parallel clones (towers) of the training graph
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def clone_device(clone_index, clone_on_cpu=False):
+    """The device of a clone: its own CPU device with clone_on_cpu, otherwise its GPU."""
+    if clone_on_cpu:
+        return '/cpu:%d' % clone_index
+    return '/gpu:%d' % clone_index
+
+
+def cluster_spec(ps_hosts, worker_hosts):
+    """The cluster of a distributed training, or None for a local training.
+
+    Args:
+      ps_hosts: The comma-separated host:port list of the parameter servers.
+      worker_hosts: The comma-separated host:port list of the workers.
+
+    Returns:
+      A `tf.train.ClusterSpec` or None if there are no workers.
+
+    Raises:
+      ValueError: if there are workers but no parameter server.
+    """
+    if not worker_hosts:
+        return None
+    if not ps_hosts:
+        raise ValueError('A distributed training needs at least one parameter server (ps_hosts)')
+    return tf.train.ClusterSpec({'ps': ps_hosts.split(','), 'worker': worker_hosts.split(',')})
+
+
+def replica_device(cluster, task, device='/cpu:0'):
+    """The device of the operations of a worker.
+
+    In a distributed training the variables are spread over the parameter servers and
+    the other operations stay on `device` of the worker.
+
+    Args:
+      cluster: The output of `cluster_spec`.
+      task: The index of the worker.
+      device: The local device, e.g. the output of `clone_device`.
+
+    Returns:
+      A device name or function for `tf.device`.
+    """
+    if cluster is None:
+        return device
+    return tf.train.replica_device_setter(worker_device='/job:worker/task:%d%s' % (task, device), cluster=cluster)
+
+
+def session_config(num_clones, clone_on_cpu=False, intra_op_threads=0, inter_op_threads=0):
+    """The session configuration for the clones.
+
+    With clone_on_cpu the host is split in one CPU device per clone, so the towers
+    are separate devices which run concurrently instead of being soft-placed one after
+    another on /cpu:0. The operations of all the devices share the intra-op thread
+    pool, and the inter-op pool sets how many of them run at the same time.
+
+    Args:
+      num_clones: The number of clones.
+      clone_on_cpu: Whether or not the clones are deployed on CPU devices.
+      intra_op_threads: The number of threads used inside each operation (0: one per core).
+      inter_op_threads: The number of operations run concurrently (0: one per core).
+
+    Returns:
+      A `tf.ConfigProto`.
+    """
+    config = tf.ConfigProto(allow_soft_placement=True,
+                            intra_op_parallelism_threads=intra_op_threads,
+                            inter_op_parallelism_threads=inter_op_threads)
+    if clone_on_cpu:
+        config.device_count['CPU'] = num_clones
+    return config
+
+
+def average_gradients(tower_grads):
+    """Calculate the average gradient for each shared variable across all towers.
+
+    Note that this function provides a synchronization point across all towers.
+
+    Args:
+      tower_grads: List of lists of (gradient, variable) tuples. The outer list
+        is over individual gradients. The inner list is over the gradient
+        calculation for each tower.
+    Returns:
+       List of pairs of (gradient, variable) where the gradient has been averaged
+       across all towers.
+    """
+    average_grads = []
+    for grad_and_vars in zip(*tower_grads):
+        # Note that each grad_and_vars looks like the following:
+        #   ((grad0_gpu0, var0_gpu0), ... , (grad0_gpuN, var0_gpuN))
+        grads = []
+        for g, _ in grad_and_vars:
+            # Add 0 dimension to the gradients to represent the tower.
+            expanded_g = tf.expand_dims(g, 0)
+
+            # Append on a 'tower' dimension which we will average over below.
+            grads.append(expanded_g)
+
+        # Average over the 'tower' dimension.
+        grad = tf.concat(axis=0, values=grads)
+        grad = tf.reduce_mean(grad, 0)
+
+        # Keep in mind that the Variables are redundant because they are shared
+        # across towers. So .. we will just return the first tower's pointer to
+        # the Variable.
+        v = grad_and_vars[0][1]
+        grad_and_var = (grad, v)
+        average_grads.append(grad_and_var)
+    return average_grads
@@ -0,0 +1,86 @@
+"""
+tf.data input pipeline over the HDF5 datasets
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+
+# The label of the samples which only pad a minibatch to its fixed size.
+PAD_LABEL = -1
+
+
+def pad_batch(speech, label, batch_size):
+    """Pads a minibatch to `batch_size` samples by repeating its last sample.
+
+    The padded samples get the label `PAD_LABEL`, which masks them out of the losses,
+    accuracies and outputs. They are not masked out of the batch-norm statistics of a
+    training step though: the last, padded minibatch of an epoch normalizes with its
+    last sample counted several times. Minibatches which are already full are returned
+    unchanged.
+    """
+    num_padded = batch_size - speech.shape[0]
+    if num_padded <= 0:
+        return speech, label
+    speech = np.concatenate([speech, np.repeat(speech[-1:], num_padded, axis=0)])
+    label = np.concatenate([label, np.full([num_padded], PAD_LABEL, dtype=label.dtype)])
+    return speech, label
+
+
+def hdf5_dataset(batches_fn, sample_shape, transform, num_parallel_calls=4, prefetch_batches=4,
+                 batch_size=None):
+    """Creates a dataset of network-ready minibatches.
+
+    The minibatches are read by `batches_fn` in their HDF5 layout and transformed to
+    the network input inside the pipeline, which runs ahead of the network.
+
+    Args:
+      batches_fn: A callable returning an iterator of (speech, label) numpy minibatches in
+        the HDF5 layout. It is called every time the iterator is initialized.
+      sample_shape: The shape of one speech sample in the HDF5 file, e.g. [20, 80, 40].
+      transform: A function mapping a speech minibatch tensor to the network input.
+      num_parallel_calls: The number of minibatches transformed in parallel.
+      prefetch_batches: The number of minibatches prepared ahead of the network.
+      batch_size: If set, the shorter minibatches (the tail of the data) are padded to
+        this size with `pad_batch`, so that no sample is dropped.
+
+    Returns:
+      A `tf.data.Dataset` of (speech, label) tuples.
+    """
+    def generator():
+        for speech, label in batches_fn():
+            speech, label = np.asarray(speech, dtype=np.float32), np.asarray(label, dtype=np.int32)
+            if batch_size is not None:
+                speech, label = pad_batch(speech, label, batch_size)
+            yield speech, label
+
+    dataset = tf.data.Dataset.from_generator(
+        generator, (tf.float32, tf.int32),
+        (tf.TensorShape([None] + list(sample_shape)), tf.TensorShape([None])))
+    dataset = dataset.map(lambda speech, label: (transform(speech), label),
+                          num_parallel_calls=num_parallel_calls)
+    return dataset.prefetch(prefetch_batches)
+
+
+def development_transform(speech):
+    """Adds the channel dimension: [batch, 20, 80, 40] -> [batch, 20, 80, 40, 1]."""
+    return tf.expand_dims(speech, -1)
+
+
+def enrollment_transform(speech):
+    """Stacks the utterances of each speaker in a single cube.
+
+    [num_speakers, num_utterances, 1, 80, 40] -> [num_speakers, num_utterances, 80, 40, 1]
+    """
+    return tf.transpose(speech, perm=[0, 1, 3, 4, 2])
+
+
+def evaluation_transform(speech, num_utterances=20):
+    """Repeats each evaluation utterance to match the depth of the network input.
+
+    [batch, 1, 80, 40] -> [batch, num_utterances, 80, 40, 1]
+    """
+    return tf.expand_dims(tf.tile(speech, [1, num_utterances, 1, 1]), -1)
@@ -0,0 +1,115 @@
+"""
+Background prefetching of minibatches from the HDF5 dataset
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import random
+import threading
+import time
+
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def hdf5_batches(data, labels, batch_size, num_batches, shuffle=False):
+    """Reads consecutive minibatches from the PyTables arrays.
+
+    Args:
+      data: The utterance EArray of shape [num_samples, 20, 80, 40].
+      labels: The label EArray of shape [num_samples].
+      batch_size: The number of samples in each batch.
+      num_batches: The number of batches to read.
+      shuffle: Whether or not to shuffle the samples inside each batch.
+
+    Yields:
+      Tuples of (speech, label) in which speech is a contiguous float32 array of shape
+      [batch_size, 20, 80, 40]. The last batch is shorter if the data ends before it is full.
+    """
+    for batch_num in range(num_batches):
+        start_idx = batch_num * batch_size
+        end_idx = (batch_num + 1) * batch_size
+        speech, label = data[start_idx:end_idx], labels[start_idx:end_idx]
+
+        if shuffle:
+            index = random.sample(range(speech.shape[0]), speech.shape[0])
+            speech = speech[index]
+            label = label[index]
+
+        yield np.ascontiguousarray(speech, dtype=np.float32), label
+
+
+class BatchPrefetcher(object):
+    """Iterates over minibatches which are produced by a background thread.
+
+    The background thread reads (and decompresses) the next batches while the caller
+    runs the network on the current one. At most `capacity` batches are kept ready.
+    The statistics tell whether the training is I/O bound: a queue which is mostly
+    empty means the consumer waits on the reader.
+
+    Args:
+      batches: An iterable of minibatches, e.g. the output of `hdf5_batches`.
+      capacity: The maximum number of prefetched batches.
+    """
+
+    _END = object()
+
+    def __init__(self, batches, capacity=4):
+        self.capacity = capacity
+        self._queue = queue.Queue(maxsize=capacity)
+        self._num_steps = 0
+        self._occupancy_sum = 0
+        self._wait_time = 0.0
+        self._start_time = time.time()
+
+        self._thread = threading.Thread(target=self._produce, args=(batches,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _produce(self, batches):
+        try:
+            for batch in batches:
+                self._queue.put(batch)
+        except Exception as err:
+            self._queue.put(err)
+            return
+        self._queue.put(self._END)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._occupancy_sum += self._queue.qsize()
+        start_time = time.time()
+        batch = self._queue.get()
+        self._wait_time += time.time() - start_time
+
+        if batch is self._END:
+            self._thread.join()
+            raise StopIteration
+        if isinstance(batch, Exception):
+            raise batch
+        self._num_steps += 1
+        return batch
+
+    next = __next__
+
+    @property
+    def steps_per_sec(self):
+        """The number of batches consumed per second."""
+        return self._num_steps / max(time.time() - self._start_time, 1e-12)
+
+    @property
+    def mean_occupancy(self):
+        """The average number of ready batches when the consumer asks for one."""
+        return self._occupancy_sum / max(self._num_steps, 1)
+
+    @property
+    def wait_fraction(self):
+        """The fraction of the wall time the consumer spent waiting for a batch."""
+        return self._wait_time / max(time.time() - self._start_time, 1e-12)
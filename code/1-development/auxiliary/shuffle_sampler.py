@@ -0,0 +1,107 @@
+"""
+Chunk-aware shuffling over the compressed HDF5 dataset
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+class ChunkShuffleSampler(object):
+    """Near-random sample order at close to sequential read throughput.
+
+    Reading one random sample of a chunked, compressed EArray decompresses its whole
+    chunk. Instead, the order of the chunks is shuffled every epoch, a window of
+    decompressed chunks is held in memory and the samples are shuffled inside that
+    window (together with the samples left over from the previous window).
+
+    Args:
+      num_samples: The number of samples of the dataset.
+      chunk_size: The number of samples in each HDF5 chunk.
+      buffer_size: The number of samples held in memory for shuffling. It is rounded
+        to a whole number of chunks (at least one).
+      seed: The random seed. Each epoch uses `seed + epoch` so that epochs differ but
+        are reproducible. If None, the order is not reproducible.
+      num_shards: The number of workers sharing the dataset.
+      shard_index: The worker of this sampler. Every epoch each worker reads a disjoint
+        share of the shuffled chunks, which requires the same seed on all workers.
+
+    Raises:
+      ValueError: If there are fewer chunks than shards, so a shard would get no samples.
+    """
+
+    def __init__(self, num_samples, chunk_size, buffer_size=256, seed=None, num_shards=1, shard_index=0):
+        self.num_samples = num_samples
+        self.chunk_size = max(1, int(chunk_size))
+        self.num_chunks = int(np.ceil(num_samples / float(self.chunk_size)))
+        if self.num_chunks < num_shards:
+            raise ValueError('num_shards [%d] is larger than the number of chunks [%d] of the dataset'
+                             % (num_shards, self.num_chunks))
+        self.window_chunks = max(1, int(buffer_size // self.chunk_size))
+        self.seed = seed
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+
+    @property
+    def num_shard_samples(self):
+        """The fewest samples a shard gets in an epoch, so all the workers can run the same number of steps."""
+        if self.num_shards == 1:
+            return self.num_samples
+        last_chunk_shortfall = self.num_chunks * self.chunk_size - self.num_samples
+        return max(0, (self.num_chunks // self.num_shards) * self.chunk_size - last_chunk_shortfall)
+
+    def random_state(self, epoch):
+        return np.random.RandomState(None if self.seed is None else self.seed + epoch)
+
+    def windows(self, rng):
+        """Yields the (start_idx, end_idx) sample ranges of the chunks of each window.
+
+        The chunks of a window are sorted so they are read in file order.
+        """
+        chunk_order = rng.permutation(self.num_chunks)[self.shard_index::self.num_shards]
+        for window_start in range(0, len(chunk_order), self.window_chunks):
+            window = np.sort(chunk_order[window_start:window_start + self.window_chunks])
+            yield [(chunk * self.chunk_size, min((chunk + 1) * self.chunk_size, self.num_samples))
+                   for chunk in window]
+
+
+def chunk_shuffled_batches(data, labels, batch_size, num_batches, sampler, epoch):
+    """Reads shuffled minibatches following the chunk layout of the PyTables arrays.
+
+    Args:
+      data: The utterance EArray of shape [num_samples, 20, 80, 40].
+      labels: The label EArray of shape [num_samples].
+      batch_size: The number of samples in each batch.
+      num_batches: The number of batches to read.
+      sampler: A `ChunkShuffleSampler` over the arrays.
+      epoch: The epoch number, which selects the shuffling of the epoch.
+
+    Yields:
+      Tuples of (speech, label) in which speech is a contiguous float32 array of shape
+      [batch_size, 20, 80, 40]. The samples left over at the end of the epoch form a
+      last, shorter batch.
+    """
+    rng = sampler.random_state(epoch)
+    carry_speech = data[0:0]
+    carry_label = labels[0:0]
+    batch_num = 0
+    for window in sampler.windows(rng):
+        buffer_speech = np.concatenate([carry_speech] + [data[start:end] for start, end in window])
+        buffer_label = np.concatenate([carry_label] + [labels[start:end] for start, end in window])
+        index = rng.permutation(buffer_speech.shape[0])
+
+        num_full = buffer_speech.shape[0] // batch_size
+        for i in range(num_full):
+            if batch_num == num_batches:
+                return
+            batch_index = index[i * batch_size:(i + 1) * batch_size]
+            yield np.ascontiguousarray(buffer_speech[batch_index], dtype=np.float32), buffer_label[batch_index]
+            batch_num += 1
+
+        # The samples which do not fill a batch are mixed with the next window.
+        carry_speech = buffer_speech[index[num_full * batch_size:]]
+        carry_label = buffer_label[index[num_full * batch_size:]]
+
+    if carry_speech.shape[0] > 0 and batch_num < num_batches:
+        yield np.ascontiguousarray(carry_speech, dtype=np.float32), carry_label
@@ -0,0 +1,50 @@
+"""Tests for the chunk-aware shuffling."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+import shuffle_sampler
+
+
+class ChunkShuffleSamplerTest(unittest.TestCase):
+
+  def _shard_samples(self, sampler, epoch):
+    samples = []
+    for window in sampler.windows(sampler.random_state(epoch)):
+      for start, end in window:
+        samples.extend(range(start, end))
+    return samples
+
+  def testShardsCoverTheDatasetOnce(self):
+    num_samples, chunk_size, num_shards = 1000, 64, 3
+    shards = [self._shard_samples(shuffle_sampler.ChunkShuffleSampler(
+        num_samples, chunk_size, buffer_size=128, seed=7, num_shards=num_shards, shard_index=shard_index), 2)
+              for shard_index in range(num_shards)]
+    self.assertEqual(sorted(sum(shards, [])), list(range(num_samples)))
+
+    sampler = shuffle_sampler.ChunkShuffleSampler(num_samples, chunk_size, num_shards=num_shards)
+    for samples in shards:
+      self.assertGreaterEqual(len(samples), sampler.num_shard_samples)
+      self.assertGreater(sampler.num_shard_samples, 0)
+
+  def testBatchesOfOneShard(self):
+    data = np.arange(300, dtype=np.float32).reshape(300, 1, 1, 1)
+    labels = np.arange(300)
+    sampler = shuffle_sampler.ChunkShuffleSampler(300, 32, buffer_size=64, seed=1)
+    batches = list(shuffle_sampler.chunk_shuffled_batches(data, labels, 16, 100, sampler, 0))
+    seen = np.concatenate([label for _, label in batches])
+    self.assertEqual(sorted(seen.tolist()), list(range(300)))
+    self.assertEqual(sampler.num_shard_samples, 300)
+
+  def testMoreShardsThanChunks(self):
+    with self.assertRaises(ValueError):
+      shuffle_sampler.ChunkShuffleSampler(100, 64, num_shards=4)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,93 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import tensorflow as tf
+from nets import nets_factory
+from auxiliary import clone_deployment
+
+tf.app.flags.DEFINE_string(
+    'model_speech', 'cnn_speech', 'The name of the architecture to train.')
+
+tf.app.flags.DEFINE_string(
+    'clone_counts', '1,2,4,8,16,32,64', 'Comma-separated numbers of CPU clones to time.')
+
+tf.app.flags.DEFINE_integer(
+    'batch_size_per_clone', 4, 'The number of samples processed by each clone at each step.')
+
+tf.app.flags.DEFINE_integer(
+    'num_classes', 1211, 'The number of speakers of the softmax layer.')
+
+tf.app.flags.DEFINE_integer(
+    'num_steps', 20, 'The number of timed training steps.')
+
+tf.app.flags.DEFINE_integer(
+    'num_warmup_steps', 3, 'The number of untimed training steps before timing.')
+
+tf.app.flags.DEFINE_integer(
+    'intra_op_parallelism_threads', 0,
+    'The number of threads used inside each operation. If 0, one per core.')
+
+tf.app.flags.DEFINE_integer(
+    'inter_op_parallelism_threads', 0,
+    'The number of operations run concurrently. If 0, one per core.')
+
+# Store all elemnts in FLAG structure!
+FLAGS = tf.app.flags.FLAGS
+
+
+def samples_per_sec(num_clones):
+    """Times the tower training step of train_softmax.py with `num_clones` CPU clones.
+
+    The inputs are generated inside the graph, so only the computation is timed.
+    """
+    graph = tf.Graph()
+    with graph.as_default(), tf.device('/cpu:0'):
+        model_speech_fn = nets_factory.get_network_fn(FLAGS.model_speech, num_classes=FLAGS.num_classes,
+                                                      is_training=True)
+        opt = tf.train.AdamOptimizer(1e-3)
+        tower_grads = []
+        with tf.variable_scope(tf.get_variable_scope()):
+            for i in range(num_clones):
+                with tf.device(clone_deployment.clone_device(i, clone_on_cpu=True)):
+                    with tf.name_scope('tower_%d' % i):
+                        speech = tf.random_normal([FLAGS.batch_size_per_clone, 20, 80, 40, 1])
+                        labels = tf.random_uniform([FLAGS.batch_size_per_clone], maxval=FLAGS.num_classes,
+                                                   dtype=tf.int32)
+                        logits, _ = model_speech_fn(speech)
+                        loss = tf.reduce_mean(tf.nn.softmax_cross_entropy_with_logits(
+                            logits=logits, labels=tf.one_hot(labels, depth=FLAGS.num_classes)))
+                        tf.get_variable_scope().reuse_variables()
+                        tower_grads.append(opt.compute_gradients(loss))
+        train_op = opt.apply_gradients(clone_deployment.average_gradients(tower_grads))
+        init_op = tf.global_variables_initializer()
+
+    config = clone_deployment.session_config(num_clones, True, FLAGS.intra_op_parallelism_threads,
+                                             FLAGS.inter_op_parallelism_threads)
+    with tf.Session(graph=graph, config=config) as sess:
+        sess.run(init_op)
+        for _ in range(FLAGS.num_warmup_steps):
+            sess.run(train_op)
+        start_time = time.time()
+        for _ in range(FLAGS.num_steps):
+            sess.run(train_op)
+        elapsed = time.time() - start_time
+    return FLAGS.num_steps * num_clones * FLAGS.batch_size_per_clone / elapsed
+
+
+def main(_):
+    results = []
+    for num_clones in [int(count) for count in FLAGS.clone_counts.split(',')]:
+        results.append((num_clones, samples_per_sec(num_clones)))
+
+    print("clones  samples/sec  speedup  efficiency")
+    base = results[0][1] / results[0][0]
+    for num_clones, throughput in results:
+        print("%6d  %11.2f  %7.2f  %9.2f" % (num_clones, throughput, throughput / (base * results[0][0]),
+                                             throughput / (base * num_clones)))
+
+
+if __name__ == '__main__':
+    tf.app.run()
@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import tensorflow as tf
+import tables
+import numpy as np
+from nets import nets_factory
+from auxiliary import input_prefetch
+from auxiliary import input_pipeline
+
+tf.app.flags.DEFINE_string(
+    'development_dataset_path', '../../data/development_sample_dataset_speaker.hdf5',
+    'The development dataset which the training batches are read from.')
+
+tf.app.flags.DEFINE_string(
+    'model_speech', 'cnn_speech', 'The name of the architecture to train.')
+
+tf.app.flags.DEFINE_integer(
+    'batch_size', 3, 'The number of samples in each batch.')
+
+tf.app.flags.DEFINE_integer(
+    'num_steps', 50, 'The number of timed training steps of each input path.')
+
+tf.app.flags.DEFINE_integer(
+    'num_warmup_steps', 5, 'The number of untimed training steps before timing.')
+
+tf.app.flags.DEFINE_integer(
+    'num_preprocessing_threads', 8,
+    'The number of threads used to create the batches.')
+
+tf.app.flags.DEFINE_integer(
+    'prefetch_batches', 4,
+    'The number of minibatches which are prepared ahead of the network.')
+
+# Store all elemnts in FLAG structure!
+FLAGS = tf.app.flags.FLAGS
+
+fileh = tables.open_file(FLAGS.development_dataset_path, mode='r')
+num_subjects = len(np.unique(fileh.root.label_train[:]))
+
+
+def training_batches(num_steps):
+    """Yields `num_steps` shuffled training minibatches, going over the data as many times as necessary."""
+    num_batches_per_epoch = int(fileh.root.label_train.shape[0] / FLAGS.batch_size)
+    while num_steps > 0:
+        num_batches = min(num_steps, num_batches_per_epoch)
+        for batch in input_prefetch.hdf5_batches(fileh.root.utterance_train, fileh.root.label_train,
+                                                 FLAGS.batch_size, num_batches, shuffle=True):
+            yield batch
+        num_steps -= num_batches
+
+
+def build_train_op(batch_speech, batch_labels):
+    model_speech_fn = nets_factory.get_network_fn(FLAGS.model_speech, num_classes=num_subjects, is_training=True)
+    logits, _ = model_speech_fn(batch_speech)
+    label_onehot = tf.one_hot(batch_labels, depth=num_subjects, axis=-1)
+    loss = tf.reduce_mean(tf.nn.softmax_cross_entropy_with_logits(logits=logits, labels=label_onehot))
+    return tf.train.AdamOptimizer(1e-3).minimize(loss)
+
+
+def run_steps(sess, train_op, feed_dicts):
+    """Runs the training steps and returns the number of timed steps per second."""
+    num_steps = 0
+    for step, feed_dict in enumerate(feed_dicts):
+        if step == FLAGS.num_warmup_steps:
+            start_time = time.time()
+        sess.run(train_op, feed_dict=feed_dict)
+        if step >= FLAGS.num_warmup_steps:
+            num_steps += 1
+    return num_steps / (time.time() - start_time)
+
+
+def benchmark_feed_dict():
+    """The previous input path: numpy minibatches copied into placeholders at every step."""
+    graph = tf.Graph()
+    with graph.as_default(), tf.device('/cpu:0'):
+        batch_speech = tf.placeholder(tf.float32, (None, 20, 80, 40, 1))
+        batch_labels = tf.placeholder(tf.int32, (None,))
+        train_op = build_train_op(batch_speech, batch_labels)
+        init_op = tf.global_variables_initializer()
+
+    with tf.Session(graph=graph) as sess:
+        sess.run(init_op)
+        feed_dicts = ({batch_speech: speech[:, :, :, :, None], batch_labels: label}
+                      for speech, label in training_batches(FLAGS.num_warmup_steps + FLAGS.num_steps))
+        return run_steps(sess, train_op, feed_dicts)
+
+
+def benchmark_tf_data():
+    """The tf.data input path: the minibatches are prepared inside the pipeline ahead of the network."""
+    graph = tf.Graph()
+    with graph.as_default(), tf.device('/cpu:0'):
+        dataset = input_pipeline.hdf5_dataset(
+            lambda: input_prefetch.BatchPrefetcher(training_batches(FLAGS.num_warmup_steps + FLAGS.num_steps),
+                                                   capacity=FLAGS.prefetch_batches),
+            fileh.root.utterance_train.shape[1:], input_pipeline.development_transform,
+            num_parallel_calls=FLAGS.num_preprocessing_threads, prefetch_batches=FLAGS.prefetch_batches)
+        batch_speech, batch_labels = dataset.make_one_shot_iterator().get_next()
+        train_op = build_train_op(batch_speech, batch_labels)
+        init_op = tf.global_variables_initializer()
+
+    with tf.Session(graph=graph) as sess:
+        sess.run(init_op)
+        return run_steps(sess, train_op, (None for _ in range(FLAGS.num_warmup_steps + FLAGS.num_steps)))
+
+
+def main(_):
+    feed_dict_steps_per_sec = benchmark_feed_dict()
+    tf_data_steps_per_sec = benchmark_tf_data()
+    print("batch size: %d, timed steps: %d" % (FLAGS.batch_size, FLAGS.num_steps))
+    print("feed_dict: %.2f steps/sec" % feed_dict_steps_per_sec)
+    print("tf.data: %.2f steps/sec" % tf_data_steps_per_sec)
+    print("speedup: %.2fx" % (tf_data_steps_per_sec / feed_dict_steps_per_sec))
+
+
+if __name__ == '__main__':
+    tf.app.run()
@@ -0,0 +1,205 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import tensorflow as tf
+import numpy as np
+import tables
+from auxiliary import inference_graph
+
+tf.app.flags.DEFINE_string(
+    'checkpoint_dir', '../../results/TRAIN_CNN_3D',
+    'Directory where the checkpoints of the trained network are.')
+
+tf.app.flags.DEFINE_string(
+    'output_path', '../../results/TRAIN_CNN_3D/inference_graph.pb',
+    'The path of the frozen inference graph.')
+
+tf.app.flags.DEFINE_float(
+    'batch_norm_epsilon', 0.001,
+    'The epsilon of the batch normalization layers of the trained network.')
+
+tf.app.flags.DEFINE_string(
+    'precision', 'float32',
+    'The arithmetic of the exported network, one of "float32", "float16" or "int8". With "int8" '
+    'the weights are quantized per output channel and the inputs of the convolutions are '
+    'quantized to the ranges observed on the calibration data.')
+
+tf.app.flags.DEFINE_string(
+    'calibration_dataset_path', '../../data/development_sample_dataset_speaker.hdf5',
+    'The development dataset whose first training cubes calibrate the int8 activation ranges.')
+
+tf.app.flags.DEFINE_integer(
+    'num_calibration_samples', 128,
+    'The number of development cubes used for the int8 calibration.')
+
+# Store all elemnts in FLAG structure!
+FLAGS = tf.app.flags.FLAGS
+
+# The convolution layers of cnn_speech from the speech cube to the embedding (the
+# input of the fc layer): (scope, stride, batch normalized, followed by max-pooling).
+SPEECH_CNN_LAYERS = [
+    ('conv11', [1, 1, 1], True, False),
+    ('conv12', [1, 2, 1], True, True),
+    ('conv21', [1, 1, 1], True, False),
+    ('conv22', [1, 2, 1], True, True),
+    ('conv31', [1, 1, 1], True, False),
+    ('conv32', [1, 1, 1], True, False),
+    ('conv41', [1, 1, 1], True, False),
+    ('conv42', [1, 1, 1], True, False),
+    ('conv51', [1, 1, 1], False, False),
+]
+
+
+def folded_weights(reader, scope, batch_norm, epsilon, net_scope='cnn'):
+    """Folds the batch normalization of a layer into its convolution.
+
+    With the moving statistics, batch_norm(conv(x, w)) = conv(x, w * s) + beta - mean * s
+    in which s = 1 / sqrt(variance + epsilon), per output channel.
+
+    Returns:
+      A tuple of (weights, biases) numpy arrays.
+    """
+    weights = reader.get_tensor('%s/%s/weights' % (net_scope, scope))
+    if not batch_norm:
+        return weights, reader.get_tensor('%s/%s/biases' % (net_scope, scope))
+
+    beta = reader.get_tensor('%s/%s/BatchNorm/beta' % (net_scope, scope))
+    moving_mean = reader.get_tensor('%s/%s/BatchNorm/moving_mean' % (net_scope, scope))
+    moving_variance = reader.get_tensor('%s/%s/BatchNorm/moving_variance' % (net_scope, scope))
+    scale = 1.0 / np.sqrt(moving_variance + epsilon)
+    return weights * scale, beta - moving_mean * scale
+
+
+def quantize_per_channel(weights, num_bits=8):
+    """Symmetric linear quantization of convolution weights with one scale per output channel.
+
+    Returns:
+      A tuple of (quantized, scales) in which quantized is an int8 array of the shape of
+      `weights` and weights ~= quantized * scales.
+    """
+    max_level = 2 ** (num_bits - 1) - 1
+    max_abs = np.max(np.abs(weights.reshape(-1, weights.shape[-1])), axis=0)
+    scales = np.where(max_abs > 0, max_abs / max_level, 1.0).astype(np.float32)
+    quantized = np.clip(np.round(weights / scales), -max_level, max_level).astype(np.int8)
+    return quantized, scales
+
+
+def speech_cnn(net, reader, epsilon, precision='float32', activation_ranges=None):
+    """The layers of cnn_speech with their (folded) weights as constants.
+
+    Args:
+      net: The float32 speech cubes of shape [batch, 20, 80, 40, 1].
+      reader: The checkpoint reader.
+      epsilon: The epsilon of the batch normalization layers.
+      precision: One of "float32", "float16" or "int8".
+      activation_ranges: With "int8", a dictionary of the (min, max) of the input of each layer.
+
+    Returns:
+      A tuple of (embedding, layer_inputs) in which layer_inputs maps each layer scope to its
+      input tensor.
+
+    Raises:
+      ValueError: if `precision` is not recognized.
+    """
+    if precision not in ('float32', 'float16', 'int8'):
+        raise ValueError('Precision [%s] was not recognized' % precision)
+    dtype = tf.float16 if precision == 'float16' else tf.float32
+    net = tf.cast(net, dtype)
+
+    layer_inputs = {}
+    for scope, stride, batch_norm, max_pool in SPEECH_CNN_LAYERS:
+        weights, biases = folded_weights(reader, scope, batch_norm, epsilon)
+        with tf.name_scope(scope):
+            layer_inputs[scope] = net
+            if precision == 'int8':
+                # The int8 weights are stored in the graph and expanded to float32 when it
+                # is loaded; the activations go through their 8-bit quantization.
+                quantized, scales = quantize_per_channel(weights)
+                kernel = tf.cast(tf.constant(quantized), tf.float32) * tf.constant(scales)
+                net = tf.fake_quant_with_min_max_args(net, min=activation_ranges[scope][0],
+                                                      max=activation_ranges[scope][1], num_bits=8)
+            else:
+                kernel = tf.constant(weights.astype(dtype.as_numpy_dtype))
+            net = tf.nn.conv3d(net, kernel, strides=[1] + stride + [1], padding='VALID')
+            net = tf.nn.bias_add(net, tf.constant(biases.astype(dtype.as_numpy_dtype)))
+        if scope == SPEECH_CNN_LAYERS[-1][0]:
+            # The embedding is taken before the last activation.
+            break
+
+        # PReLU
+        alphas = tf.constant(reader.get_tensor('cnn/%s_activation' % scope).astype(dtype.as_numpy_dtype))
+        net = tf.nn.relu(net) + alphas * (net - abs(net)) * 0.5
+        if max_pool:
+            net = tf.nn.max_pool3d(net, strides=[1, 1, 1, 2, 1], ksize=[1, 1, 1, 2, 1], padding='VALID')
+
+    return tf.cast(tf.squeeze(net, [1, 2, 3]), tf.float32), layer_inputs
+
+
+def calibrate_activation_ranges(reader, epsilon, cubes, batch_size=16):
+    """Runs the float32 network on calibration cubes and records the range of each layer input.
+
+    Args:
+      reader: The checkpoint reader.
+      epsilon: The epsilon of the batch normalization layers.
+      cubes: The calibration speech cubes of shape [num_samples, 20, 80, 40, 1].
+      batch_size: The number of cubes run together.
+
+    Returns:
+      A dictionary mapping each layer scope to the (min, max) of its input. The ranges
+      always contain 0, as required by the quantization.
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        speech = tf.placeholder(tf.float32, [None, 20, 80, 40, 1])
+        _, layer_inputs = speech_cnn(speech, reader, epsilon)
+        ranges = dict((scope, [tf.reduce_min(tensor), tf.reduce_max(tensor)])
+                      for scope, tensor in layer_inputs.items())
+
+    activation_ranges = dict((scope, (0.0, 0.0)) for scope in ranges)
+    with tf.Session(graph=graph) as sess:
+        for start in range(0, cubes.shape[0], batch_size):
+            batch_ranges = sess.run(ranges, feed_dict={speech: cubes[start:start + batch_size]})
+            for scope, (low, high) in batch_ranges.items():
+                activation_ranges[scope] = (min(activation_ranges[scope][0], float(low)),
+                                            max(activation_ranges[scope][1], float(high)))
+    return activation_ranges
+
+
+def build_inference_graph(reader, epsilon, precision='float32', activation_ranges=None):
+    """Builds the speech cube to embedding graph with the weights as constants.
+
+    Returns:
+      A pruned `GraphDef` whose only input is the float32 `speech` placeholder and output the
+      float32 `embedding` tensor, whatever the precision inside.
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        speech = tf.placeholder(tf.float32, [None, 20, 80, 40, 1], name=inference_graph.INPUT_NAME)
+        embedding, _ = speech_cnn(speech, reader, epsilon, precision, activation_ranges)
+        tf.identity(embedding, name=inference_graph.OUTPUT_NAME)
+
+    return tf.graph_util.extract_sub_graph(graph.as_graph_def(), [inference_graph.OUTPUT_NAME])
+
+
+def main(_):
+    latest_checkpoint = tf.train.latest_checkpoint(checkpoint_dir=FLAGS.checkpoint_dir)
+    reader = tf.train.NewCheckpointReader(latest_checkpoint)
+    activation_ranges = None
+    if FLAGS.precision == 'int8':
+        with tables.open_file(FLAGS.calibration_dataset_path, mode='r') as fileh:
+            cubes = fileh.root.utterance_train[:FLAGS.num_calibration_samples]
+        activation_ranges = calibrate_activation_ranges(reader, FLAGS.batch_norm_epsilon,
+                                                        np.expand_dims(cubes, -1).astype(np.float32))
+    graph_def = build_inference_graph(reader, FLAGS.batch_norm_epsilon, FLAGS.precision, activation_ranges)
+
+    output_dir, output_name = os.path.split(os.path.abspath(FLAGS.output_path))
+    tf.train.write_graph(graph_def, output_dir, output_name, as_text=False)
+    print("Exported %s to %s (%s, %d nodes)" % (latest_checkpoint, FLAGS.output_path, FLAGS.precision,
+                                                len(graph_def.node)))
+
+
+if __name__ == '__main__':
+    tf.app.run()
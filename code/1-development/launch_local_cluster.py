@@ -0,0 +1,61 @@
+"""
+Launches a distributed training of train_softmax.py on the local machine:
+one process per parameter server and per worker, on consecutive localhost ports.
+The arguments which are not recognized here are forwarded to every process, e.g.
+
+    python launch_local_cluster.py --num_workers=4 -- --sync_replicas=True --replicas_to_aggregate=4
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+def host_list(base_port, num_tasks):
+    return ','.join('localhost:%d' % (base_port + i) for i in range(num_tasks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Launches a local distributed training.')
+    parser.add_argument('--num_ps', type=int, default=1, help='The number of parameter servers.')
+    parser.add_argument('--num_workers', type=int, default=2, help='The number of workers.')
+    parser.add_argument('--base_port', type=int, default=2222, help='The port of the first process.')
+    parser.add_argument('--log_dir', default='../../results/TRAIN_CNN_3D/cluster_logs',
+                        help='Directory where the output of each process is written to.')
+    args, train_args = parser.parse_known_args()
+    train_args = [arg for arg in train_args if arg != '--']
+
+    ps_hosts = host_list(args.base_port, args.num_ps)
+    worker_hosts = host_list(args.base_port + args.num_ps, args.num_workers)
+    if not os.path.exists(args.log_dir):
+        os.makedirs(args.log_dir)
+
+    def launch(job_name, task):
+        command = [sys.executable, 'train_softmax.py',
+                   '--ps_hosts=%s' % ps_hosts, '--worker_hosts=%s' % worker_hosts,
+                   '--job_name=%s' % job_name, '--task=%d' % task] + train_args
+        log = open(os.path.join(args.log_dir, '%s_%d.log' % (job_name, task)), 'w')
+        return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+
+    ps = [launch('ps', task) for task in range(args.num_ps)]
+    workers = [launch('worker', task) for task in range(args.num_workers)]
+    print("Started %d parameter servers (%s) and %d workers (%s), logs in %s"
+          % (args.num_ps, ps_hosts, args.num_workers, worker_hosts, args.log_dir))
+
+    # The parameter servers never return: they are stopped once all the workers are done.
+    try:
+        return_codes = [worker.wait() for worker in workers]
+    finally:
+        for process in ps + workers:
+            if process.poll() is None:
+                process.terminate()
+    print("Worker return codes: %s" % return_codes)
+    sys.exit(max(return_codes))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,16 @@
 # Siamese Architecture for face recognition
 
-import random
-import numpy as np
-import time
-import tensorflow as tf
-import math
-import pdb
-import sys
-import scipy.io as sio
-from sklearn import *
-import matplotlib.pyplot as plt
+from roc_curve import roc_metrics
 
 def calculate_eer_auc_ap(label,distance):
 
-    fpr, tpr, thresholds = metrics.roc_curve(label, -distance, pos_label=1)
-    AUC = metrics.roc_auc_score(label, -distance, average='macro', sample_weight=None)
-    AP = metrics.average_precision_score(label, -distance, average='macro', sample_weight=None)
+    # A single sorted pass gives all the operating points (a lower distance is a target).
+    thresholds, fps, tps = roc_metrics.roc_counts(-distance, label)
+    fpr, tpr = roc_metrics.rates(fps, tps)
+    AUC = roc_metrics.area_under_curve(fpr, tpr)
+    AP = roc_metrics.average_precision(fps, tps)
 
-    # Calculating EER
-    intersect_x = fpr[np.abs(fpr - (1 - tpr)).argmin(0)]
-    EER = intersect_x
-
-    return EER,AUC,AP,tpr, tpr
+    # Calculating EER (interpolated crossing of the false positive and miss rates)
+    EER = roc_metrics.equal_error_rate(fpr, tpr)
 
+    return EER,AUC,AP,fpr, tpr
@@ -5,12 +5,16 @@ from __future__ import print_function
 import tensorflow as tf
 
 import sys
+import os
 import tables
 import numpy as np
 from tensorflow.python.ops import control_flow_ops
-import random
 from nets import nets_factory
 from auxiliary import losses
+from auxiliary import input_prefetch
+from auxiliary import shuffle_sampler
+from auxiliary import input_pipeline
+from auxiliary import clone_deployment
 from roc_curve import calculate_roc
 
 slim = tf.contrib.slim
@@ -30,7 +34,16 @@ tf.app.flags.DEFINE_integer('num_clones', 3,
                             'Number of model clones to deploy.')
 
 tf.app.flags.DEFINE_boolean('clone_on_cpu', False,
-                            'Use CPUs to deploy clones.')
+                            'Use CPUs to deploy clones: the host is split in one CPU device per clone.')
+
+tf.app.flags.DEFINE_integer(
+    'intra_op_parallelism_threads', 0,
+    'The number of threads used inside each operation. If 0, one per core.')
+
+tf.app.flags.DEFINE_integer(
+    'inter_op_parallelism_threads', 0,
+    'The number of operations (e.g. of different clones) run concurrently. If 0, one per core.')
+
 tf.app.flags.DEFINE_boolean('online_pair_selection', False,
                             'Use online pair selection.')
 
@@ -49,6 +62,19 @@ tf.app.flags.DEFINE_integer(
     'num_preprocessing_threads', 8,
     'The number of threads used to create the batches.')
 
+tf.app.flags.DEFINE_integer(
+    'prefetch_batches', 4,
+    'The number of minibatches which are read ahead in the background.')
+
+tf.app.flags.DEFINE_integer(
+    'shuffle_buffer_size', 256,
+    'The number of training samples held in memory for shuffling, rounded to whole HDF5 chunks.')
+
+tf.app.flags.DEFINE_integer(
+    'shuffle_seed', None,
+    'The random seed of the training sample order. If None, the order is not reproducible '
+    '(a distributed training then uses 0, as all the workers must shard the same order).')
+
 tf.app.flags.DEFINE_integer(
     'log_every_n_steps', 1,
     'The frequency with which logs are print.')
@@ -64,6 +90,18 @@ tf.app.flags.DEFINE_integer(
 tf.app.flags.DEFINE_integer(
     'task', 0, 'Task id of the replica running the training.')
 
+tf.app.flags.DEFINE_string(
+    'ps_hosts', '',
+    'Comma-separated host:port list of the parameter servers of a distributed training.')
+
+tf.app.flags.DEFINE_string(
+    'worker_hosts', '',
+    'Comma-separated host:port list of the workers of a distributed training. If empty, '
+    'the training is local.')
+
+tf.app.flags.DEFINE_string(
+    'job_name', 'worker', 'The job of this process in a distributed training: "ps" or "worker".')
+
 ######################
 # Optimization Flags #
 ######################
@@ -143,7 +181,8 @@ tf.app.flags.DEFINE_float(
 
 tf.app.flags.DEFINE_bool(
     'sync_replicas', False,
-    'Whether or not to synchronize the replicas during training.')
+    'Whether or not to synchronize the replicas of a distributed training (with ps_hosts '
+    'and worker_hosts) during training.')
 
 tf.app.flags.DEFINE_integer(
     'replicas_to_aggregate', 1,
@@ -263,43 +302,9 @@ def _configure_optimizer(learning_rate):
         raise ValueError('Optimizer [%s] was not recognized', FLAGS.optimizer)
     return optimizer
 
-def average_gradients(tower_grads):
-    """Calculate the average gradient for each shared variable across all towers.
-
-    Note that this function provides a synchronization point across all towers.
-
-    Args:
-      tower_grads: List of lists of (gradient, variable) tuples. The outer list
-        is over individual gradients. The inner list is over the gradient
-        calculation for each tower.
-    Returns:
-       List of pairs of (gradient, variable) where the gradient has been averaged
-       across all towers.
-    """
-    average_grads = []
-    for grad_and_vars in zip(*tower_grads):
-        # Note that each grad_and_vars looks like the following:
-        #   ((grad0_gpu0, var0_gpu0), ... , (grad0_gpuN, var0_gpuN))
-        grads = []
-        for g, _ in grad_and_vars:
-            # Add 0 dimension to the gradients to represent the tower.
-            expanded_g = tf.expand_dims(g, 0)
-
-            # Append on a 'tower' dimension which we will average over below.
-            grads.append(expanded_g)
-
-        # Average over the 'tower' dimension.
-        grad = tf.concat(axis=0, values=grads)
-        grad = tf.reduce_mean(grad, 0)
-
-        # Keep in mind that the Variables are redundant because they are shared
-        # across towers. So .. we will just return the first tower's pointer to
-        # the Variable.
-        v = grad_and_vars[0][1]
-        grad_and_var = (grad, v)
-        average_grads.append(grad_and_var)
-    return average_grads
 
+# The blosc decompression of the HDF5 chunks is done by the parallel readers.
+tables.set_blosc_max_threads(FLAGS.num_readers)
 
 # Load the sample artificial dataset
 fileh = tables.open_file(FLAGS.development_dataset_path, mode='r')
@@ -319,6 +324,33 @@ print("Test label shape:",fileh.root.label_test.shape)
 # Get the number of subjects
 num_subjects = len(np.unique(fileh.root.label_train[:]))
 
+def _create_session(graph, config, server, is_chief, opt):
+    """Creates the training session.
+
+    Args:
+      graph: The training graph.
+      config: The session configuration.
+      server: The `tf.train.Server` of a distributed training, or None.
+      is_chief: Whether or not this worker initializes, saves and restores the variables.
+      opt: The optimizer, whose hook starts the synchronization of the replicas.
+
+    Returns:
+      A `tf.Session`, or a `tf.train.MonitoredTrainingSession` connected to the cluster.
+    """
+    if server is None:
+        return tf.Session(graph=graph, config=config)
+
+    hooks = []
+    if FLAGS.sync_replicas:
+        hooks.append(opt.make_session_run_hook(is_chief))
+    with graph.as_default():
+        return tf.train.MonitoredTrainingSession(master=server.target, is_chief=is_chief,
+                                                 checkpoint_dir=os.path.dirname(FLAGS.train_dir),
+                                                 save_checkpoint_secs=FLAGS.save_interval_secs,
+                                                 save_summaries_steps=None, save_summaries_secs=None,
+                                                 hooks=hooks, config=config)
+
+
 #################################
 ####### Main function ###########
 #################################
@@ -327,17 +359,50 @@ def main(_):
     # Log
     tf.logging.set_verbosity(tf.logging.INFO)
 
+    if FLAGS.batch_size % FLAGS.num_clones != 0:
+        raise ValueError('batch_size [%d] must be a multiple of num_clones [%d]' % (FLAGS.batch_size, FLAGS.num_clones))
+
+    config = clone_deployment.session_config(FLAGS.num_clones, FLAGS.clone_on_cpu,
+                                             FLAGS.intra_op_parallelism_threads,
+                                             FLAGS.inter_op_parallelism_threads)
+
+    # In a distributed training the parameter servers hold the variables and each worker
+    # trains on its own shard of the data. The first worker is the chief.
+    cluster = clone_deployment.cluster_spec(FLAGS.ps_hosts, FLAGS.worker_hosts)
+    if FLAGS.sync_replicas and cluster is None:
+        raise ValueError('sync_replicas needs a cluster: set ps_hosts and worker_hosts')
+    server = None
+    num_workers = 1
+    if cluster is not None:
+        num_workers = cluster.num_tasks('worker')
+        server = tf.train.Server(cluster, job_name=FLAGS.job_name, task_index=FLAGS.task, config=config)
+        if FLAGS.job_name == 'ps':
+            server.join()
+            return
+    is_chief = FLAGS.task == 0
+
     graph = tf.Graph()
-    with graph.as_default(), tf.device('/cpu:0'):
+    with graph.as_default(), tf.device(clone_deployment.replica_device(cluster, FLAGS.task)):
 
         #########################################
         ########## required from data ###########
         #########################################
         num_samples_per_epoch = fileh.root.label_train.shape[0]
-        num_batches_per_epoch = int(num_samples_per_epoch / FLAGS.batch_size)
+
+        # The training samples are shuffled over the whole dataset following its chunk layout.
+        # In a distributed training each worker reads its own share of the chunks.
+        sampler = shuffle_sampler.ChunkShuffleSampler(num_samples_per_epoch,
+                                                      fileh.root.utterance_train.chunkshape[0],
+                                                      buffer_size=FLAGS.shuffle_buffer_size,
+                                                      seed=FLAGS.shuffle_seed if FLAGS.shuffle_seed is not None
+                                                      or cluster is None else 0,
+                                                      num_shards=num_workers, shard_index=FLAGS.task)
+
+        # The last minibatch of each pass is padded to the batch size, so no sample is dropped.
+        num_batches_per_epoch = int(np.ceil(sampler.num_shard_samples / float(FLAGS.batch_size)))
 
         num_samples_per_epoch_test = fileh.root.label_test.shape[0]
-        num_batches_per_epoch_test = int(num_samples_per_epoch_test / FLAGS.batch_size)
+        num_batches_per_epoch_test = int(np.ceil(num_samples_per_epoch_test / float(FLAGS.batch_size)))
 
         # Create global_step
         global_step = tf.Variable(0, name='global_step', trainable=False)
@@ -347,6 +412,10 @@ def main(_):
         #####################################
         learning_rate = _configure_learning_rate(num_samples_per_epoch, global_step)
         opt = _configure_optimizer(learning_rate)
+        if FLAGS.sync_replicas:
+            # Each update averages the gradients of replicas_to_aggregate workers.
+            opt = tf.train.SyncReplicasOptimizer(opt, replicas_to_aggregate=FLAGS.replicas_to_aggregate,
+                                                 total_num_replicas=num_workers)
 
         ######################
         # Select the network #
@@ -374,27 +443,53 @@ def main(_):
         ##############################################################
         # with tf.device(deploy_config.inputs_device()):
         """
-        Define the place holders and creating the batch tensor.
+        The minibatches are read from the HDF5 file in the background and transformed
+        to the network input inside the tf.data pipeline.
         """
-        speech = tf.placeholder(tf.float32, (20, 80, 40, 1))
-        label = tf.placeholder(tf.int32, (1))
-        batch_dynamic = tf.placeholder(tf.int32, ())
-        margin_imp_tensor = tf.placeholder(tf.float32, ())
-
-        # Create the batch tensors
-        batch_speech, batch_labels = tf.train.batch(
-            [speech, label],
-            batch_size=batch_dynamic,
-            num_threads=FLAGS.num_preprocessing_threads,
-            capacity=5 * FLAGS.batch_size)
+        # The epoch to shuffle and the prefetcher of the current training pass (for its statistics).
+        input_state = {'epoch': 0, 'prefetcher': None}
+
+        def train_batches():
+            input_state['prefetcher'] = input_prefetch.BatchPrefetcher(
+                shuffle_sampler.chunk_shuffled_batches(fileh.root.utterance_train, fileh.root.label_train,
+                                                       FLAGS.batch_size, num_batches_per_epoch, sampler,
+                                                       input_state['epoch']),
+                capacity=FLAGS.prefetch_batches)
+            return input_state['prefetcher']
+
+        def test_batches():
+            return input_prefetch.BatchPrefetcher(
+                input_prefetch.hdf5_batches(fileh.root.utterance_test, fileh.root.label_test,
+                                            FLAGS.batch_size, num_batches_per_epoch_test),
+                capacity=FLAGS.prefetch_batches)
+
+        train_dataset = input_pipeline.hdf5_dataset(train_batches, fileh.root.utterance_train.shape[1:],
+                                                    input_pipeline.development_transform,
+                                                    num_parallel_calls=FLAGS.num_preprocessing_threads,
+                                                    prefetch_batches=FLAGS.prefetch_batches,
+                                                    batch_size=FLAGS.batch_size)
+        test_dataset = input_pipeline.hdf5_dataset(test_batches, fileh.root.utterance_test.shape[1:],
+                                                   input_pipeline.development_transform,
+                                                   num_parallel_calls=FLAGS.num_preprocessing_threads,
+                                                   prefetch_batches=FLAGS.prefetch_batches,
+                                                   batch_size=FLAGS.batch_size)
+
+        # Both datasets share the iterator which is initialized before each pass over the data.
+        iterator = tf.data.Iterator.from_structure(train_dataset.output_types, train_dataset.output_shapes)
+        train_init_op = iterator.make_initializer(train_dataset)
+        test_init_op = iterator.make_initializer(test_dataset)
+        batch_speech, batch_labels = iterator.get_next()
 
         #############################
         # Specify the loss function #
         #############################
         tower_grads = []
+        tower_num_valid = []
+        tower_num_correct = []
         with tf.variable_scope(tf.get_variable_scope()):
             for i in range(FLAGS.num_clones):
-                with tf.device('/gpu:%d' % i):
+                with tf.device(clone_deployment.replica_device(cluster, FLAGS.task,
+                                                               clone_deployment.clone_device(i, FLAGS.clone_on_cpu))):
                     with tf.name_scope('%s_%d' % ('tower', i)) as scope:
                         """
                         Two distance metric are defined:
@@ -418,13 +513,18 @@ def main(_):
                         ########## Loss function ##########
                         ###################################
                         # one_hot labeling
-                        label_onehot = tf.one_hot(tf.squeeze(batch_labels[i * step : (i + 1) * step], [1]), depth=num_subjects, axis=-1)
+                        label_onehot = tf.one_hot(batch_labels[i * step : (i + 1) * step], depth=num_subjects, axis=-1)
+
+                        # The samples which pad the last minibatch are masked out.
+                        mask = tf.cast(tf.not_equal(batch_labels[i * step : (i + 1) * step],
+                                                    input_pipeline.PAD_LABEL), tf.float32)
+                        num_valid = tf.maximum(tf.reduce_sum(mask), 1.0)
 
                         SOFTMAX = tf.nn.softmax_cross_entropy_with_logits(logits=logits, labels=label_onehot)
 
                         # Define loss
                         with tf.name_scope('loss'):
-                            loss = tf.reduce_mean(SOFTMAX)
+                            loss = tf.reduce_sum(SOFTMAX * mask) / num_valid
 
                         # Accuracy
                         with tf.name_scope('accuracy'):
@@ -432,7 +532,11 @@ def main(_):
                             correct_pred = tf.equal(tf.argmax(logits, 1), tf.argmax(label_onehot, 1))
 
                             # Accuracy calculation
-                            accuracy = tf.reduce_mean(tf.cast(correct_pred, tf.float32))
+                            accuracy = tf.reduce_sum(tf.cast(correct_pred, tf.float32) * mask) / num_valid
+
+                        # The (not padded) and correctly classified samples of this tower.
+                        tower_num_valid.append(tf.reduce_sum(mask))
+                        tower_num_correct.append(tf.reduce_sum(tf.cast(correct_pred, tf.float32) * mask))
 
                         # ##### call the optimizer ######
                         # # TODO: call optimizer object outside of this gpu environment
@@ -440,15 +544,24 @@ def main(_):
                         # Reuse variables for the next tower.
                         tf.get_variable_scope().reuse_variables()
 
+                        # The moving statistics of batch normalization are updated with the
+                        # batches of the first tower.
+                        if i == 0:
+                            batchnorm_updates = tf.get_collection(tf.GraphKeys.UPDATE_OPS, scope)
+
                         # Calculate the gradients for the batch of data on this CIFAR tower.
                         grads = opt.compute_gradients(loss)
 
                         # Keep track of the gradients across all towers.
                         tower_grads.append(grads)
 
+        # The sample counts of the whole minibatch, over all the towers.
+        num_valid_samples = tf.add_n(tower_num_valid)
+        num_correct_samples = tf.add_n(tower_num_correct)
+
         # We must calculate the mean of each gradient. Note that this is the
         # synchronization point across all towers.
-        grads = average_gradients(tower_grads)
+        grads = clone_deployment.average_gradients(tower_grads)
 
         # Apply the gradients to adjust the shared variables.
         apply_gradient_op = opt.apply_gradients(grads, global_step=global_step)
@@ -460,7 +573,7 @@ def main(_):
         variables_averages_op = variable_averages.apply(tf.trainable_variables())
 
         # Group all updates to into a single train op.
-        train_op = tf.group(apply_gradient_op, variables_averages_op)
+        train_op = tf.group(apply_gradient_op, variables_averages_op, *batchnorm_updates)
 
         #################################################
         ########### Summary Section #####################
@@ -488,21 +601,23 @@ def main(_):
         # Merge all summaries together.
         summary_op = tf.summary.merge(list(summaries), name='summary_op')
 
+        variables_to_restore = slim.get_variables_to_restore()
+        saver = tf.train.Saver(variables_to_restore, max_to_keep=20)
+
     ###########################
     ######## Training #########
     ###########################
 
-    with tf.Session(graph=graph, config=tf.ConfigProto(allow_soft_placement=True)) as sess:
+    with _create_session(graph, config, server, is_chief, opt) as sess:
 
-        # Initialization of the network.
-        variables_to_restore = slim.get_variables_to_restore()
-        saver = tf.train.Saver(variables_to_restore, max_to_keep=20)
+        # Initialization of the network (done by the chief in a distributed training).
         coord = tf.train.Coordinator()
-        sess.run(tf.global_variables_initializer())
-        sess.run(tf.local_variables_initializer())
+        if server is None:
+            sess.run(tf.global_variables_initializer())
+            sess.run(tf.local_variables_initializer())
 
         # op to write logs to Tensorboard
-        summary_writer = tf.summary.FileWriter(FLAGS.train_dir, graph=graph)
+        summary_writer = tf.summary.FileWriter(FLAGS.train_dir, graph=graph) if is_chief else None
 
         #####################################
         ############## TRAIN ################
@@ -511,72 +626,65 @@ def main(_):
         step = 1
         for epoch in range(FLAGS.num_epochs):
 
+            # Start a new shuffled pass over the training data.
+            input_state['epoch'] = epoch
+            sess.run(train_init_op)
+
             # Loop over all batches
             for batch_num in range(num_batches_per_epoch):
                 step += 1
-                start_idx = batch_num * FLAGS.batch_size
-                end_idx = (batch_num + 1) * FLAGS.batch_size
-                speech_train, label_train = fileh.root.utterance_train[start_idx:end_idx, :, :,
-                                            :], fileh.root.label_train[start_idx:end_idx]
-
-                # This transpose is necessary for 3D convolutional operation which will be performed by TensorFlow.
-                #speech_train = np.transpose(speech_train[None, :, :, :, :], axes=(1, 4, 2, 3, 0))
-                speech_train = np.transpose(speech_train[None, :, :, :, :], axes=(1, 2, 3, 4, 0))
-
-                # shuffling
-                index = random.sample(range(speech_train.shape[0]), speech_train.shape[0])
-                speech_train = speech_train[index]
-                label_train = label_train[index]
-
-
-                _, loss_value, train_accuracy, summary, training_step, _ = sess.run(
-                    [train_op, loss, accuracy, summary_op, global_step, is_training],
-                    feed_dict={is_training: True, batch_dynamic: label_train.shape[0], margin_imp_tensor: 100,
-                               batch_speech: speech_train,
-                               batch_labels: label_train.reshape([label_train.shape[0], 1])})
-                summary_writer.add_summary(summary, epoch * num_batches_per_epoch + i)
 
+                try:
+                    _, loss_value, train_accuracy, summary, training_step, _ = sess.run(
+                        [train_op, loss, accuracy, summary_op, global_step, is_training],
+                        feed_dict={is_training: True})
+                except tf.errors.OutOfRangeError:
+                    break
+                if summary_writer is not None:
+                    summary_writer.add_summary(summary, epoch * num_batches_per_epoch + batch_num)
 
                 # # log
                 if (batch_num + 1) % FLAGS.log_every_n_steps == 0:
+                    train_batches = input_state['prefetcher']
                     print("Epoch " + str(epoch + 1) + ", Minibatch " + str(
                         batch_num + 1) + " of %d " % num_batches_per_epoch + ", Minibatch Loss= " + \
                           "{:.4f}".format(loss_value) + ", TRAIN ACCURACY= " + "{:.3f}".format(
-                        100 * train_accuracy))
+                        100 * train_accuracy) + ", Steps/sec= " + "{:.2f}".format(
+                        train_batches.steps_per_sec) + ", Prefetch queue= " + "{:.1f}/{:d}".format(
+                        train_batches.mean_occupancy, train_batches.capacity))
+
+            # Save the model (the chief of a distributed training saves it periodically).
+            if server is None:
+                saver.save(sess, FLAGS.train_dir, global_step=training_step)
 
-            # Save the model
-            saver.save(sess, FLAGS.train_dir, global_step=training_step)
+            # The test set is evaluated by the chief only.
+            if not is_chief:
+                continue
 
             # ###################################################
             # ############## TEST PER EACH EPOCH ################
             # ###################################################
 
-            label_vector = np.zeros((FLAGS.batch_size * num_batches_per_epoch_test, 1))
-            test_accuracy_vector = np.zeros((num_batches_per_epoch_test, 1))
+            label_vector = np.zeros((num_samples_per_epoch_test, 1))
+            test_correct_vector = np.zeros((num_batches_per_epoch_test, 1))
+            test_valid_vector = np.zeros((num_batches_per_epoch_test, 1))
+            num_test_samples = 0
+
+            sess.run(test_init_op)
 
             # Loop over all batches
             for i in range(num_batches_per_epoch_test):
-                start_idx = i * FLAGS.batch_size
-                end_idx = (i + 1) * FLAGS.batch_size
-                speech_test, label_test = fileh.root.utterance_test[start_idx:end_idx, :, :,
-                                                           :], fileh.root.label_test[
-                                                                       start_idx:end_idx]
-
-                # Get the test batch.
-                #speech_test = np.transpose(speech_test[None,:,:,:,:],axes=(1,4,2,3,0))
-                speech_test = np.transpose(speech_test[None, :, :, :, :], axes=(1, 2, 3, 4, 0))
 
                 # Evaluation
-                loss_value, test_accuracy, _ = sess.run([loss, accuracy, is_training],
-                                                                             feed_dict={is_training: False,
-                                                                                        batch_dynamic: FLAGS.batch_size,
-                                                                                        margin_imp_tensor: 50,
-                                                                                        batch_speech: speech_test,
-                                                                                        batch_labels: label_test.reshape(
-                                                                                            [FLAGS.batch_size, 1])})
-                label_test = label_test.reshape([FLAGS.batch_size, 1])
-                label_vector[start_idx:end_idx] = label_test
-                test_accuracy_vector[i, :] = test_accuracy
+                loss_value, test_correct, test_valid, label_test = sess.run(
+                    [loss, num_correct_samples, num_valid_samples, batch_labels], feed_dict={is_training: False})
+
+                # The samples which pad the last minibatch are dropped.
+                label_test = label_test[label_test != input_pipeline.PAD_LABEL].reshape([-1, 1])
+                label_vector[num_test_samples:num_test_samples + label_test.shape[0]] = label_test
+                num_test_samples += label_test.shape[0]
+                test_correct_vector[i, :] = test_correct
+                test_valid_vector[i, :] = test_valid
 
 
                 # ROC
@@ -589,10 +697,11 @@ def main(_):
 
             K = 4
             Accuracy = np.zeros((K, 1))
-            batch_k_validation = int(test_accuracy_vector.shape[0] / float(K))
 
-            for i in range(K):
-                Accuracy[i, :] = 100 * np.mean(test_accuracy_vector[i * batch_k_validation:(i + 1) * batch_k_validation], axis=0)
+            # The accuracy of each fold is over its (not padded) samples. All the batches,
+            # including the padded last one, fall in one of the folds.
+            for i, fold in enumerate(np.array_split(np.arange(num_batches_per_epoch_test), K)):
+                Accuracy[i, :] = 100 * np.sum(test_correct_vector[fold], axis=0) / np.sum(test_valid_vector[fold], axis=0)
 
             # Reporting the K-fold validation
             print("Test Accuracy " + str(epoch + 1) + ", Mean= " + \
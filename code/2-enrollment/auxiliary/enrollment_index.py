@@ -0,0 +1,62 @@
+"""
+Speaker-to-rows index over the enrollment data
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def speaker_rows(labels, speakers, num_utterances):
+    """Finds the enrollment rows of every speaker with a single pass over the labels.
+
+    Args:
+      labels: The numpy array of enrollment labels, read once from the HDF5 file.
+      speakers: The speaker ids to enroll.
+      num_utterances: The number of utterances in the enrollment cube of each speaker.
+
+    Returns:
+      A dictionary mapping each speaker id to the sorted array of its first
+      `num_utterances` row indexes.
+    """
+    # A stable sort keeps the rows of each speaker in file order.
+    order = np.argsort(labels, kind='mergesort')
+    sorted_labels = labels[order]
+    unique_labels, starts, counts = np.unique(sorted_labels, return_index=True, return_counts=True)
+    ranges = dict(zip(unique_labels.tolist(), zip(starts.tolist(), counts.tolist())))
+
+    rows = {}
+    for speaker_id in speakers:
+        start, count = ranges.get(speaker_id, (0, 0))
+        # Check the minumum required utterances per speaker.
+        assert count >= num_utterances, "At least %d utterances is needed for each speaker" % num_utterances
+        rows[speaker_id] = order[start:start + num_utterances]
+    return rows
+
+
+def read_rows(data, rows):
+    """Reads the given sorted rows of a PyTables array, one slice per run of consecutive rows."""
+    breaks = np.where(np.diff(rows) != 1)[0] + 1
+    runs = np.split(rows, breaks)
+    return np.concatenate([data[run[0]:run[-1] + 1] for run in runs])
+
+
+def enrollment_cubes(data, rows, speakers, speakers_per_batch):
+    """Packs the enrollment cubes of many speakers in each minibatch.
+
+    Args:
+      data: The utterance EArray of shape [num_samples, 1, 80, 40].
+      rows: The output of `speaker_rows`.
+      speakers: The speaker ids to enroll, in the order of the minibatches.
+      speakers_per_batch: The number of speakers in each minibatch. The last one may be smaller
+        (it is padded in the input pipeline).
+
+    Yields:
+      Tuples of (speech, speaker_ids) in which speech has the shape
+      [speakers_per_batch, num_utterances, 1, 80, 40].
+    """
+    for batch_start in range(0, len(speakers), speakers_per_batch):
+        batch_speakers = speakers[batch_start:batch_start + speakers_per_batch]
+        speech = np.stack([read_rows(data, rows[speaker_id]) for speaker_id in batch_speakers])
+        yield speech, np.asarray(batch_speakers)
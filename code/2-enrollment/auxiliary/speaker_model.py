@@ -0,0 +1,124 @@
+"""
+The enrolled speaker models and their incremental update
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import glob
+import hashlib
+import os
+
+import numpy as np
+
+
+def model_digest(model_path):
+    """The digest of the contents of a frozen graph file or of the .index and .data files of a checkpoint.
+
+    A checkpoint retrained in place under the same name gets another digest.
+    """
+    if os.path.isfile(model_path):
+        paths = [model_path]
+    else:
+        paths = sorted(glob.glob(model_path + '.index') + glob.glob(model_path + '.data-*'))
+    if not paths:
+        raise ValueError('model [%s] was not found' % model_path)
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as in_handler:
+            for chunk in iter(lambda: in_handler.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cube_digest(cube, model):
+    """The digest of an enrollment cube and of the `model_digest` of the network its embedding is computed with."""
+    digest = hashlib.sha1(model.encode('utf-8'))
+    digest.update(np.ascontiguousarray(cube, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+
+def _replace(path, write_fn):
+    """Writes a file next to `path` and renames it over `path`, so readers never see a partial file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        write_fn(out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.rename(tmp_path, path)
+
+
+class SpeakerModel(object):
+    """The speaker models of the enrollment directory.
+
+    The models are stored as the rows of MODEL.npy, model.map gives the speaker of
+    each row and model.digest gives the `cube_digest` each model was computed from,
+    which tells which speakers changed since the last enrollment.
+
+    Args:
+      num_logits: The size of the speaker models.
+    """
+
+    def __init__(self, num_logits):
+        self.num_logits = num_logits
+        self.models = collections.OrderedDict()
+        self.digests = {}
+
+    @classmethod
+    def load(cls, enrollment_dir, num_logits):
+        """Loads the models of a previous enrollment. An empty model is returned if there is none."""
+        speaker_model = cls(num_logits)
+        model_path = os.path.join(enrollment_dir, 'MODEL.npy')
+        if not os.path.exists(model_path):
+            return speaker_model
+
+        MODEL = np.load(model_path)
+        rows = {}
+        with open(os.path.join(enrollment_dir, 'model.map')) as in_handler:
+            for line in in_handler:
+                line_arr = line.strip().split()
+                rows[int(line_arr[1])] = line_arr[0]
+        for row in sorted(rows):
+            speaker_model.models[rows[row]] = MODEL[row]
+
+        digest_path = os.path.join(enrollment_dir, 'model.digest')
+        if os.path.exists(digest_path):
+            with open(digest_path) as in_handler:
+                for line in in_handler:
+                    speaker, digest = line.strip().split()
+                    speaker_model.digests[speaker] = digest
+        return speaker_model
+
+    def needs_enrollment(self, speaker_id, digest):
+        """Whether the speaker is new or its enrollment cube or network changed."""
+        return self.digests.get(str(speaker_id)) != digest
+
+    def update(self, speaker_id, model, digest):
+        self.models[str(speaker_id)] = np.asarray(model, dtype=np.float32)
+        self.digests[str(speaker_id)] = digest
+
+    def remove(self, speaker_id):
+        self.models.pop(str(speaker_id), None)
+        self.digests.pop(str(speaker_id), None)
+
+    def save(self, enrollment_dir):
+        """Writes MODEL.npy, model.map and model.digest.
+
+        Each file is replaced atomically. The digests are written last: if the process
+        dies in between, the next incremental enrollment recomputes the affected speakers.
+        """
+        if not os.path.exists(enrollment_dir):
+            os.makedirs(enrollment_dir)
+        speakers = list(self.models.keys())
+        MODEL = np.zeros((len(speakers), self.num_logits), dtype=np.float32)
+        for i, speaker in enumerate(speakers):
+            MODEL[i, :] = self.models[speaker]
+
+        _replace(os.path.join(enrollment_dir, 'MODEL.npy'), lambda out: np.save(out, MODEL))
+        _replace(os.path.join(enrollment_dir, 'model.map'),
+                 lambda out: out.write(''.join("%s %s\n" % (speaker, i)
+                                               for i, speaker in enumerate(speakers)).encode('utf-8')))
+        _replace(os.path.join(enrollment_dir, 'model.digest'),
+                 lambda out: out.write(''.join("%s %s\n" % (speaker, self.digests.get(speaker, '-'))
+                                               for speaker in speakers).encode('utf-8')))
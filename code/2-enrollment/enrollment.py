@@ -12,6 +12,11 @@ from tensorflow.python.ops import control_flow_ops
 import random
 from nets import nets_factory
 from auxiliary import losses
+from auxiliary import input_pipeline
+from auxiliary import inference_graph
+from auxiliary import enrollment_index
+from auxiliary import speaker_model
+from auxiliary import speaker_index
 
 slim = tf.contrib.slim
 
@@ -61,6 +66,31 @@ tf.app.flags.DEFINE_integer(
     'num_preprocessing_threads', 8,
     'The number of threads used to create the batches.')
 
+tf.app.flags.DEFINE_integer(
+    'prefetch_batches', 4,
+    'The number of minibatches which are prepared ahead of the network.')
+
+tf.app.flags.DEFINE_string(
+    'enrollment_mode', 'full',
+    'Either "full", which enrolls all the speakers again, or "incremental", which '
+    'keeps the existing models and only enrolls the new or changed speakers.')
+
+tf.app.flags.DEFINE_string(
+    'remove_speakers', '',
+    'Comma-separated list of speaker ids removed from the speaker models.')
+
+tf.app.flags.DEFINE_boolean(
+    'build_speaker_index', True,
+    'Whether or not to build the speaker_index.npz identification index next to MODEL.npy.')
+
+tf.app.flags.DEFINE_integer(
+    'index_nlist', 0,
+    'The number of inverted lists of the speaker index. If 0, the square root of the number of speakers.')
+
+tf.app.flags.DEFINE_integer(
+    'speakers_per_batch', 64,
+    'The number of speakers whose enrollment cubes share a forward pass.')
+
 tf.app.flags.DEFINE_integer(
     'log_every_n_steps', 20,
     'The frequency with which logs are print.')
@@ -118,6 +148,11 @@ tf.app.flags.DEFINE_float(
 tf.app.flags.DEFINE_string(
     'model_speech', 'cnn_speech', 'The name of the architecture to train.')
 
+tf.app.flags.DEFINE_string(
+    'frozen_graph_path', '',
+    'If set, the frozen inference graph of export_inference_graph.py is used instead of '
+    'rebuilding the network and restoring the latest checkpoint.')
+
 tf.app.flags.DEFINE_integer(
     'batch_size', 1024, 'The number of samples in each batch.')
 
@@ -149,13 +184,30 @@ def main(_):
 
     tf.logging.set_verbosity(tf.logging.INFO)
 
+    # The model predefinition.
+    NumClasses = 2
+    NumLogits = 128
+
+    if FLAGS.enrollment_mode == 'full':
+        speaker_models = speaker_model.SpeakerModel(NumLogits)
+    elif FLAGS.enrollment_mode == 'incremental':
+        speaker_models = speaker_model.SpeakerModel.load(FLAGS.enrollment_dir, NumLogits)
+    else:
+        raise ValueError('enrollment_mode [%s] was not recognized' % FLAGS.enrollment_mode)
+
+    removed_speakers = set(speaker.strip() for speaker in FLAGS.remove_speakers.split(',') if speaker.strip())
+    for speaker_id in removed_speakers:
+        speaker_models.remove(speaker_id)
+
+    latest_checkpoint = tf.train.latest_checkpoint(checkpoint_dir=FLAGS.checkpoint_dir)
+
     graph = tf.Graph()
     with graph.as_default(), tf.device('/cpu:0'):
 
 
         # required from data
         num_samples_per_epoch = fileh.root.label_enrollment.shape[0]
-        num_batches_per_epoch = int(num_samples_per_epoch / FLAGS.batch_size)
+        num_batches_per_epoch = int(np.ceil(num_samples_per_epoch / float(FLAGS.batch_size)))
 
         num_samples_per_epoch_test = fileh.root.label_evaluation.shape[0]
         num_batches_per_epoch_test = int(num_samples_per_epoch_test / FLAGS.batch_size)
@@ -180,78 +232,115 @@ def main(_):
         ##############################################################
         # with tf.device(deploy_config.inputs_device()):
         """
-        Define the place holders and creating the batch tensor.
+        The utterances of each speaker are read from the HDF5 file and stacked in a
+        single enrollment cube inside the tf.data pipeline. The cubes of many speakers
+        are packed in each minibatch, so there is one forward pass per minibatch.
         """
-        speech = tf.placeholder(tf.float32, (20, 80, 40, 1))
-        label = tf.placeholder(tf.int32, (1))
-        batch_dynamic = tf.placeholder(tf.int32, ())
-        margin_imp_tensor = tf.placeholder(tf.float32, ())
-
-        # Create the batch tensors
-        batch_speech, batch_labels = tf.train.batch(
-            [speech, label],
-            batch_size=batch_dynamic,
-            num_threads=FLAGS.num_preprocessing_threads,
-            capacity=5 * FLAGS.batch_size)
-
-        #############################
-        # Specify the loss function #
-        #############################
-        tower_grads = []
-        with tf.variable_scope(tf.get_variable_scope()):
-            for i in range(FLAGS.num_clones):
-                with tf.device('/gpu:%d' % i):
-                    with tf.name_scope('%s_%d' % ('tower', i)) as scope:
-                        """
-                        Two distance metric are defined:
-                           1 - distance_weighted: which is a weighted average of the distance between two structures.
-                           2 - distance_l2: which is the regular l2-norm of the two networks outputs.
-                        Place holders
-
-                        """
-                        ########################################
-                        ######## Outputs of two networks #######
-                        ########################################
-                        features, logits, end_points_speech = model_speech_fn(batch_speech)
-
-
-                        # one_hot labeling
-                        # num_subjects is the number of subjects in development phase and not the enrollment.
-                        # Because we are using the pretrained network in the development phase and use the features of the
-                        # layer prior to Softmax!
-                        label_onehot = tf.one_hot(tf.squeeze(batch_labels, [1]), depth=num_subjects_development, axis=-1)
-
-                        # Define loss
-                        with tf.name_scope('loss'):
-                            loss = tf.reduce_mean(
-                                tf.nn.softmax_cross_entropy_with_logits(logits=logits, labels=label_onehot))
-
-                        # Accuracy
-                        with tf.name_scope('accuracy'):
-                            # Evaluate the model
-                            correct_pred = tf.equal(tf.argmax(logits, 1), tf.argmax(label_onehot, 1))
-
-                            # Accuracy calculation
-                            accuracy = tf.reduce_mean(tf.cast(correct_pred, tf.float32))
-
-                            # # ##### call the optimizer ######
-                            # # # TODO: call optimizer object outside of this gpu environment
-                            # #
-                            # # Reuse variables for the next tower.
-                            # tf.get_variable_scope().reuse_variables()
-
-        #################################################
-        ########### Summary Section #####################
-        #################################################
-
-        # Gather initial summaries.
-        summaries = set(tf.get_collection(tf.GraphKeys.SUMMARIES))
-
-        # Add summaries for all end_points.
-        for end_point in end_points_speech:
-            x = end_points_speech[end_point]
-            summaries.add(tf.summary.scalar('sparsity_speech/' + end_point,
-                                            tf.nn.zero_fraction(x)))
+        # The contributung number of utterances
+        NumUtterance = 20
+
+        # The enrollment rows of all the speakers are found with a single read of the labels.
+        speakers = [speaker_id for speaker_id in subject_development if str(speaker_id) not in removed_speakers]
+        speaker_rows = enrollment_index.speaker_rows(fileh.root.label_enrollment[:], speakers, NumUtterance)
+
+        # The digest of the network contents, so a checkpoint retrained in place re-enrolls everybody.
+        network_digest = speaker_model.model_digest(FLAGS.frozen_graph_path or latest_checkpoint)
+
+        digests = {}
+        if FLAGS.enrollment_mode == 'full':
+            # Every speaker is enrolled: the digests are computed from the cubes the pipeline reads.
+            speakers_to_enroll = speakers
+        else:
+            # Only the speakers which are new or whose cube or network changed go through the network.
+            for speaker_id in speakers:
+                digests[speaker_id] = speaker_model.cube_digest(
+                    enrollment_index.read_rows(fileh.root.utterance_enrollment, speaker_rows[speaker_id]),
+                    network_digest)
+            speakers_to_enroll = [speaker_id for speaker_id in speakers
+                                  if speaker_models.needs_enrollment(speaker_id, digests[speaker_id])]
+        print("Enrolling %d of %d speakers, removing %d speakers" % (
+            len(speakers_to_enroll), len(speakers), len(removed_speakers)))
+
+        def enrollment_batches():
+            for speech, speaker_ids in enrollment_index.enrollment_cubes(fileh.root.utterance_enrollment,
+                                                                         speaker_rows, speakers_to_enroll,
+                                                                         FLAGS.speakers_per_batch):
+                for cube, speaker_id in zip(speech, speaker_ids):
+                    if speaker_id not in digests:
+                        digests[speaker_id] = speaker_model.cube_digest(cube, network_digest)
+                yield speech, speaker_ids
+
+        cube_shape = [NumUtterance] + list(fileh.root.utterance_enrollment.shape[1:])
+        dataset = input_pipeline.hdf5_dataset(enrollment_batches, cube_shape,
+                                              input_pipeline.enrollment_transform,
+                                              num_parallel_calls=FLAGS.num_preprocessing_threads,
+                                              prefetch_batches=FLAGS.prefetch_batches,
+                                              batch_size=FLAGS.speakers_per_batch)
+        iterator = dataset.make_initializable_iterator()
+        batch_speech, batch_labels = iterator.get_next()
+
+        if FLAGS.frozen_graph_path:
+            # The frozen inference graph maps the speech cubes straight to the embeddings.
+            features = inference_graph.import_embedding(FLAGS.frozen_graph_path, batch_speech)
+        else:
+            #############################
+            # Specify the loss function #
+            #############################
+            tower_grads = []
+            with tf.variable_scope(tf.get_variable_scope()):
+                for i in range(FLAGS.num_clones):
+                    with tf.device('/gpu:%d' % i):
+                        with tf.name_scope('%s_%d' % ('tower', i)) as scope:
+                            """
+                            Two distance metric are defined:
+                               1 - distance_weighted: which is a weighted average of the distance between two structures.
+                               2 - distance_l2: which is the regular l2-norm of the two networks outputs.
+                            Place holders
+
+                            """
+                            ########################################
+                            ######## Outputs of two networks #######
+                            ########################################
+                            features, logits, end_points_speech = model_speech_fn(batch_speech)
+
+
+                            # one_hot labeling
+                            # num_subjects is the number of subjects in development phase and not the enrollment.
+                            # Because we are using the pretrained network in the development phase and use the features of the
+                            # layer prior to Softmax!
+                            label_onehot = tf.one_hot(batch_labels, depth=num_subjects_development, axis=-1)
+
+                            # Define loss
+                            with tf.name_scope('loss'):
+                                loss = tf.reduce_mean(
+                                    tf.nn.softmax_cross_entropy_with_logits(logits=logits, labels=label_onehot))
+
+                            # Accuracy
+                            with tf.name_scope('accuracy'):
+                                # Evaluate the model
+                                correct_pred = tf.equal(tf.argmax(logits, 1), tf.argmax(label_onehot, 1))
+
+                                # Accuracy calculation
+                                accuracy = tf.reduce_mean(tf.cast(correct_pred, tf.float32))
+
+                                # # ##### call the optimizer ######
+                                # # # TODO: call optimizer object outside of this gpu environment
+                                # #
+                                # # Reuse variables for the next tower.
+                                # tf.get_variable_scope().reuse_variables()
+
+            #################################################
+            ########### Summary Section #####################
+            #################################################
+
+            # Gather initial summaries.
+            summaries = set(tf.get_collection(tf.GraphKeys.SUMMARIES))
+
+            # Add summaries for all end_points.
+            for end_point in end_points_speech:
+                x = end_points_speech[end_point]
+                summaries.add(tf.summary.scalar('sparsity_speech/' + end_point,
+                                                tf.nn.zero_fraction(x)))
 
     ###########################
     ######## ######## #########
@@ -260,8 +349,6 @@ def main(_):
     with tf.Session(graph=graph, config=tf.ConfigProto(allow_soft_placement=True)) as sess:
 
         # Initialization of the network.
-        variables_to_restore = slim.get_variables_to_restore()
-        saver = tf.train.Saver(variables_to_restore, max_to_keep=20)
         coord = tf.train.Coordinator()
         sess.run(tf.global_variables_initializer())
         sess.run(tf.local_variables_initializer())
@@ -270,73 +357,40 @@ def main(_):
         ############## ENROLLMENT Model ################
         ################################################
 
-        latest_checkpoint = tf.train.latest_checkpoint(checkpoint_dir=FLAGS.checkpoint_dir)
-        saver.restore(sess, latest_checkpoint)
-
-        # The model predefinition.
-        NumClasses = 2
-        NumLogits = 128
-        #MODEL = np.zeros((NumClasses, NumLogits), dtype=np.float32)
-        MODEL = np.zeros((len(subject_development), NumLogits), dtype=np.float32)
-        model_map = {}
-
-        # Go through the speakers.
-        #for speaker_id, speaker_class in enumerate(range(1, 3)):
-        i = 0
-        for speaker_id in subject_development:
-            # The contributung number of utterances
-            NumUtterance = 20
-            # Get the indexes for each speaker in the enrollment data
-            #speaker_index = np.where(fileh.root.label_enrollment[:] == speaker_class)[0]
-            speaker_index = np.where(fileh.root.label_enrollment[:] == speaker_id)[0]
-
-            # Check the minumum required utterances per speaker.
-            assert len(speaker_index) >= NumUtterance, "At least %d utterances is needed for each speaker" % NumUtterance
-
-            # Get the indexes.
-            start_idx = speaker_index[0]
-            end_idx = min(speaker_index[0] + NumUtterance, speaker_index[-1])
-
-            # print(end_idx-start_idx)
-
-            # Enrollment of the speaker with specific number of utterances.
-            #speaker_enrollment, label_enrollment = fileh.root.utterance_enrollment[start_idx:end_idx, :, :,
-            #                                         0:1], fileh.root.label_enrollment[start_idx:end_idx]
-            speaker_enrollment, label_enrollment = fileh.root.utterance_enrollment[start_idx:end_idx, :, :,
-                                               : ], fileh.root.label_enrollment[start_idx:end_idx]
-            speaker_enrollment = np.transpose(speaker_enrollment[None, :, :, :, :], axes=(0, 1, 3, 4, 2))
-            # Just adding a dimention for 3D convolutional operations.
-            #speaker_enrollment = speaker_enrollment[None, :, :, :, :]
-
-            # Evaluation
-            feature = sess.run(
-                [features, is_training],
-                feed_dict={is_training: True, batch_dynamic: speaker_enrollment.shape[0],
-                           batch_speech: speaker_enrollment,
-                           batch_labels: label_enrollment.reshape([label_enrollment.shape[0], 1])})
-
-            # Extracting the associated numpy array.
-            feature_speaker = feature[0]
+        if not FLAGS.frozen_graph_path:
+            variables_to_restore = slim.get_variables_to_restore()
+            saver = tf.train.Saver(variables_to_restore, max_to_keep=20)
+            saver.restore(sess, latest_checkpoint)
 
-            # # # L2-norm along each utterance vector
-            # feature_speaker = sklearn.preprocessing.normalize(feature_speaker,norm='l2', axis=1, copy=True, return_norm=False)
+        sess.run(iterator.initializer)
 
-            # Averaging for creation of the spekear model
-            speaker_model = feature_speaker
+        # Go through the minibatches of enrollment cubes.
+        while True:
+            try:
+                feature_speakers, speaker_ids = sess.run(
+                    [features, batch_labels],
+                    feed_dict={is_training: False})
+            except tf.errors.OutOfRangeError:
+                break
 
-            # Creating the speaker model
-            MODEL[i,:] = speaker_model
-            model_map[speaker_id] = i
-            i += 1
+            # # # L2-norm along each utterance vector
+            # feature_speakers = sklearn.preprocessing.normalize(feature_speakers,norm='l2', axis=1, copy=True, return_norm=False)
+
+            # Creating the speaker models: each row is the model of one speaker.
+            # The cubes which pad the last minibatch are skipped.
+            for speaker_id, feature_speaker in zip(speaker_ids, feature_speakers):
+                if speaker_id == input_pipeline.PAD_LABEL:
+                    continue
+                speaker_models.update(speaker_id, feature_speaker, digests[speaker_id])
 
-        if not os.path.exists(FLAGS.enrollment_dir):
-            os.makedirs(FLAGS.enrollment_dir)
         # Save the created model.
-        np.save(os.path.join(FLAGS.enrollment_dir , 'MODEL.npy'), MODEL)
-        entry_list = sorted(model_map.items(),key = lambda x:x[1])
-        with open(os.path.join(FLAGS.enrollment_dir,"model.map"),"w") as out:
-            for each_entry in entry_list:
-                out.write("%s %s\n" % (str(each_entry[0]),str(each_entry[1])))
+        speaker_models.save(FLAGS.enrollment_dir)
+
+        # The index over the rows of MODEL.npy for large-scale identification.
+        if FLAGS.build_speaker_index and speaker_models.models:
+            MODEL = np.load(os.path.join(FLAGS.enrollment_dir, 'MODEL.npy'))
+            index = speaker_index.SpeakerIndex.build(MODEL, nlist=FLAGS.index_nlist)
+            index.save(os.path.join(FLAGS.enrollment_dir, 'speaker_index.npz'))
 
 if __name__ == '__main__':
     tf.app.run()
@@ -50,6 +50,9 @@ def speech_cnn_arg_scope(is_training, weight_decay=0.0005):
     """Defines the VGG arg scope.
 
     Args:
+      is_training: Whether the batch normalization layers use the batch statistics
+        (and update the moving statistics) or the moving statistics. A python bool or
+        a boolean tensor.
       weight_decay: The l2 regularization coefficient.
 
     Returns:
@@ -62,8 +65,11 @@ def speech_cnn_arg_scope(is_training, weight_decay=0.0005):
                         weights_initializer=tf.contrib.layers.variance_scaling_initializer(factor=1.0, mode='FAN_AVG'),
                         weights_regularizer=slim.l2_regularizer(weight_decay),
                         biases_initializer=tf.zeros_initializer()):
-        with slim.arg_scope([slim.conv3d], padding='VALID') as arg_sc:
-            return arg_sc
+        # In inference mode the moving statistics are used, so that the outputs do not
+        # depend on the other samples of the batch.
+        with slim.arg_scope([slim.batch_norm], is_training=is_training):
+            with slim.arg_scope([slim.conv3d], padding='VALID') as arg_sc:
+                return arg_sc
 
 
 def PReLU(input, scope):
@@ -0,0 +1,52 @@
+import numpy as np
+import scipy.io.wavfile as wav
+import speechpy
+
+
+def read_audio(sound_file_path):
+    """Decodes a sound file once.
+
+    PCM .wav files are memory-mapped by scipy and scaled to [-1, 1) exactly like
+    soundfile does, so the features do not depend on the decoder. Other formats
+    fall back to soundfile.
+
+    Args:
+        sound_file_path (string): The path of the sound file.
+
+    Returns:
+        A (signal, fs) tuple in which signal is a float64 array.
+    """
+    try:
+        fs, signal = wav.read(sound_file_path, mmap=True)
+    except ValueError:
+        # Not a format that can be memory-mapped.
+        import soundfile as sf
+        signal, fs = sf.read(sound_file_path)
+        return signal, fs
+
+    if signal.dtype == np.uint8:
+        signal = (signal.astype(np.float64) - 128.0) / 128.0
+    elif np.issubdtype(signal.dtype, np.integer):
+        signal = signal.astype(np.float64) / float(2 ** (8 * signal.dtype.itemsize - 1))
+    else:
+        signal = signal.astype(np.float64)
+    return signal, fs
+
+
+def extract_logenergy(sound_file_path, num_filters=40, frame_length=0.025, frame_stride=0.01, fft_length=1024):
+    """Returns the full-length log-mel-energy features of a sound file.
+
+    Args:
+        sound_file_path (string): The path of the sound file.
+        num_filters (int): The number of mel filters.
+        frame_length (float): The length of each frame in seconds.
+        frame_stride (float): The stride between frames in seconds.
+        fft_length (int): The number of FFT points.
+
+    Returns:
+        A (num_frames x num_filters) array.
+    """
+    signal, fs = read_audio(sound_file_path)
+    return speechpy.feature.lmfe(signal, sampling_frequency=fs, frame_length=frame_length, frame_stride=frame_stride,
+                                 num_filters=num_filters, fft_length=fft_length, low_frequency=0,
+                                 high_frequency=None)
@@ -0,0 +1,36 @@
+"""
+Loading of the frozen inference graph written by export_inference_graph.py
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+# The names of the input speech cubes and of the output embeddings in the frozen graph.
+INPUT_NAME = 'speech'
+OUTPUT_NAME = 'embedding'
+
+
+def load_graph_def(path):
+    """Reads a binary GraphDef file."""
+    graph_def = tf.GraphDef()
+    with tf.gfile.GFile(path, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+    return graph_def
+
+
+def import_embedding(path, speech, name='inference'):
+    """Imports the frozen inference graph in the default graph.
+
+    Args:
+      path: The path of the frozen graph.
+      speech: The tensor of speech cubes of shape [batch, 20, 80, 40, 1] which
+        replaces the input placeholder of the frozen graph.
+      name: The name scope of the imported operations.
+
+    Returns:
+      The embedding tensor of shape [batch, 128].
+    """
+    return tf.import_graph_def(load_graph_def(path), input_map={INPUT_NAME + ':0': speech},
+                               return_elements=[OUTPUT_NAME + ':0'], name=name)[0]
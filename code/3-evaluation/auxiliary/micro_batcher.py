@@ -0,0 +1,99 @@
+"""
+Dynamic micro-batching of concurrent requests
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class _Request(object):
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.start_time = time.time()
+
+
+class MicroBatcher(object):
+    """Groups the items submitted by concurrent callers into batches.
+
+    A single worker thread waits for the first item, then collects more items until
+    `max_batch_size` are gathered or `max_wait_ms` have passed since the first one,
+    and runs them together. A lone request therefore waits at most `max_wait_ms`,
+    while under load the batches fill up and the throughput grows.
+
+    Args:
+      run_batch: A function mapping a stacked numpy batch of items to a sequence of
+        results, one per item.
+      max_batch_size: The maximum number of items in a batch.
+      max_wait_ms: The maximum time the first item of a batch waits for others.
+      stats_window: The number of recent requests the latency statistics are computed on.
+    """
+
+    def __init__(self, run_batch, max_batch_size=64, max_wait_ms=5.0, stats_window=10000):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._latencies = collections.deque(maxlen=stats_window)
+        self._batch_sizes = collections.deque(maxlen=stats_window)
+
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, item):
+        """Runs one item within a batch and returns its result. Blocks the caller."""
+        request = _Request(item)
+        self._queue.put(request)
+        request.done.wait()
+        self._latencies.append(time.time() - request.start_time)
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _work(self):
+        while True:
+            requests = [self._queue.get()]
+            deadline = time.time() + self.max_wait
+            while len(requests) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self._batch_sizes.append(len(requests))
+            try:
+                results = self.run_batch(np.stack([request.item for request in requests]))
+                for request, result in zip(requests, results):
+                    request.result = result
+            except Exception as err:
+                for request in requests:
+                    request.error = err
+            for request in requests:
+                request.done.set()
+
+    def stats(self):
+        """The latency percentiles (in ms) and the mean batch size of the recent requests."""
+        latencies = np.array(self._latencies) * 1000.0
+        if latencies.size == 0:
+            return {'requests': 0}
+        return {'requests': int(latencies.size),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+                'mean_batch_size': float(np.mean(self._batch_sizes))}
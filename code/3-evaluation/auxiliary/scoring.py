@@ -0,0 +1,203 @@
+"""
+Cosine scoring of evaluation utterances against the enrolled speaker models.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+
+def l2_normalize(x, epsilon=1e-12):
+    """Normalizes each row of a matrix to unit L2-norm.
+
+    Rows with a zero norm are left untouched (all zeros), which matches the
+    behavior of sklearn's cosine_similarity.
+
+    Args:
+      x: A 2-D array of shape [num_rows, num_features].
+      epsilon: Norms below this value are considered as zero.
+
+    Returns:
+      A float64 array of the same shape as `x`.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    norm = np.sqrt(np.einsum('ij,ij->i', x, x))
+    norm[norm < epsilon] = 1.0
+    return x / norm[:, None]
+
+
+def rows_per_block(num_models, memory_budget_mb):
+    """Returns the number of trials scored together under a memory budget.
+
+    Each (trial, model) pair of a block costs one float64 score and about as much
+    again for its target comparison and output copies.
+
+    Args:
+      num_models: The number of enrolled speaker models.
+      memory_budget_mb: The memory budget of one block in megabytes.
+
+    Returns:
+      The number of trials per block (at least one).
+    """
+    bytes_per_trial = num_models * (8 + 8 + 1)
+    return max(1, int(memory_budget_mb * 1024 * 1024 // bytes_per_trial))
+
+
+class ScoreWriter(object):
+    """Scores the evaluation trials as their embeddings come and streams the scores to disk.
+
+    The trials are buffered up to one block of the memory budget, which is then scored
+    with a single matrix multiplication and written out, so the memory does not grow
+    with the number of trials. With all the pairs the outputs are score_vector.npy
+    (float32) and target_label_vector.npy (int8) of shape [num_trials * num_models, 1]
+    (trial-major), written through memory maps, and trial_label_vector.npy with the
+    test speaker of each trial (to resample the trials by speaker). With `top_k` only the best models of each
+    trial are kept, in top_k_labels.npy (the model labels) and top_k_scores.npy of shape
+    [num_trials, top_k], best first. If `score_log`, score.log has one
+    "model_label test_label score" line per kept pair; it is written `LOG_ROWS` lines at
+    a time, so its text buffers stay small next to a block.
+
+    Args:
+      evaluation_dir: The output directory.
+      num_trials: The number of evaluation trials.
+      MODEL: The speaker models of shape [num_models, num_features].
+      label_map: A dictionary from the row of `MODEL` to the speaker label.
+      memory_budget_mb: The memory budget of one block in megabytes.
+      top_k: If positive, the number of best models kept per trial.
+      score_log: Whether or not to write score.log.
+    """
+
+    # The number of score.log lines formatted at a time.
+    LOG_ROWS = 65536
+
+    def __init__(self, evaluation_dir, num_trials, MODEL, label_map, memory_budget_mb=256, top_k=0,
+                 score_log=False):
+        self.num_trials = num_trials
+        self.num_models = MODEL.shape[0]
+        self.top_k = min(top_k, self.num_models)
+        self.models_transposed = np.ascontiguousarray(l2_normalize(MODEL).T)
+        self.block_size = rows_per_block(self.num_models, memory_budget_mb)
+
+        self.model_labels = np.array([str(label_map[j]) for j in range(self.num_models)])
+        self.model_labels_int = self.model_labels.astype(np.int64)
+
+        if not os.path.exists(evaluation_dir):
+            os.makedirs(evaluation_dir)
+        if self.top_k > 0:
+            self.top_k_labels = np.lib.format.open_memmap(os.path.join(evaluation_dir, 'top_k_labels.npy'),
+                                                          mode='w+', dtype=np.int64,
+                                                          shape=(num_trials, self.top_k))
+            self.top_k_scores = np.lib.format.open_memmap(os.path.join(evaluation_dir, 'top_k_scores.npy'),
+                                                          mode='w+', dtype=np.float32,
+                                                          shape=(num_trials, self.top_k))
+        else:
+            self.score_vector = np.lib.format.open_memmap(os.path.join(evaluation_dir, 'score_vector.npy'),
+                                                          mode='w+', dtype=np.float32,
+                                                          shape=(num_trials * self.num_models, 1))
+            self.target_label_vector = np.lib.format.open_memmap(
+                os.path.join(evaluation_dir, 'target_label_vector.npy'), mode='w+', dtype=np.int8,
+                shape=(num_trials * self.num_models, 1))
+            self.trial_label_vector = np.lib.format.open_memmap(
+                os.path.join(evaluation_dir, 'trial_label_vector.npy'), mode='w+', dtype=np.int64,
+                shape=(num_trials,))
+        self.out_handler = open(os.path.join(evaluation_dir, 'score.log'), 'w') if score_log else None
+
+        self.num_written = 0
+        self.buffered_features = []
+        self.buffered_labels = []
+        self.num_buffered = 0
+
+    def add(self, feature, label):
+        """Adds the embeddings [batch, num_features] and labels [batch] of the next trials."""
+        self.buffered_features.append(np.asarray(feature))
+        self.buffered_labels.append(np.asarray(label).reshape(-1).astype(np.int64))
+        self.num_buffered += self.buffered_labels[-1].shape[0]
+        if self.num_buffered >= self.block_size:
+            self._write_block()
+
+    def _write_block(self):
+        if self.num_buffered == 0:
+            return
+        features = l2_normalize(np.concatenate(self.buffered_features))
+        test_labels_int = np.concatenate(self.buffered_labels)
+        self.buffered_features, self.buffered_labels, self.num_buffered = [], [], 0
+
+        for offset in range(0, features.shape[0], self.block_size):
+            scores = np.dot(features[offset:offset + self.block_size], self.models_transposed)
+            self._write_scores(scores, test_labels_int[offset:offset + self.block_size])
+
+    def _write_scores(self, scores, test_labels_int):
+        start_idx = self.num_written
+        end_idx = start_idx + scores.shape[0]
+
+        if self.top_k > 0:
+            # The k best models of each trial, best first.
+            top_rows = np.argpartition(-scores, self.top_k - 1, axis=1)[:, :self.top_k]
+            top_scores = np.take_along_axis(scores, top_rows, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='mergesort')
+            top_rows = np.take_along_axis(top_rows, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            self.top_k_labels[start_idx:end_idx] = self.model_labels_int[top_rows]
+            self.top_k_scores[start_idx:end_idx] = top_scores
+            log_rows = top_rows
+            log_scores = top_scores
+        else:
+            is_target = self.model_labels_int[None, :] == test_labels_int[:, None]
+            self.score_vector[start_idx * self.num_models:end_idx * self.num_models, 0] = scores.ravel()
+            self.target_label_vector[start_idx * self.num_models:end_idx * self.num_models, 0] = is_target.ravel()
+            self.trial_label_vector[start_idx:end_idx] = test_labels_int
+            log_rows = None
+            log_scores = scores
+
+        if self.out_handler is not None:
+            self._write_log(log_rows, log_scores, test_labels_int)
+        self.num_written = end_idx
+
+    def _write_log(self, rows, scores, test_labels_int):
+        # One line per kept (trial, model) pair in the same trial-major order as the vectors,
+        # formatted a few trials at a time.
+        models_per_trial = scores.shape[1]
+        step = max(1, self.LOG_ROWS // models_per_trial)
+        for offset in range(0, scores.shape[0], step):
+            chunk_scores = scores[offset:offset + step]
+            if rows is None:
+                models = np.tile(self.model_labels, chunk_scores.shape[0])
+            else:
+                models = self.model_labels[rows[offset:offset + step]].ravel()
+            tests = np.repeat(test_labels_int[offset:offset + step].astype(str), models_per_trial)
+            records = np.rec.fromarrays([models, tests, chunk_scores.ravel()])
+            np.savetxt(self.out_handler, records, fmt='%s %s %f')
+
+    def close(self):
+        """Writes the buffered trials and flushes the outputs."""
+        self._write_block()
+        if self.out_handler is not None:
+            self.out_handler.close()
+        outputs = ('top_k_labels', 'top_k_scores') if self.top_k > 0 else ('score_vector', 'target_label_vector',
+                                                                           'trial_label_vector')
+        for name in outputs:
+            getattr(self, name).flush()
+            delattr(self, name)
+
+
+def save_scores(evaluation_dir, feature_vector, label_vector, MODEL, label_map, memory_budget_mb=256, top_k=0,
+                score_log=False):
+    """Scores all the trials and saves them to the evaluation directory with a `ScoreWriter`.
+
+    Args:
+      evaluation_dir: The output directory.
+      feature_vector: The evaluation embeddings of shape [num_trials, num_features].
+      label_vector: The evaluation labels of shape [num_trials, 1].
+      MODEL: The speaker models of shape [num_models, num_features].
+      label_map: A dictionary from the row of `MODEL` to the speaker label.
+      memory_budget_mb: The memory budget of one block in megabytes.
+      top_k: If positive, the number of best models kept per trial.
+      score_log: Whether or not to write score.log.
+    """
+    writer = ScoreWriter(evaluation_dir, feature_vector.shape[0], MODEL, label_map,
+                         memory_budget_mb=memory_budget_mb, top_k=top_k, score_log=score_log)
+    writer.add(feature_vector, label_vector)
+    writer.close()
@@ -0,0 +1,150 @@
+"""
+Inverted-file (IVF) index over the speaker models for large-scale identification
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+
+def normalize(x, epsilon=1e-12):
+    """Normalizes each row to unit L2-norm in float32, so inner products are cosine similarities."""
+    x = np.asarray(x, dtype=np.float32)
+    norm = np.sqrt(np.einsum('ij,ij->i', x, x))
+    norm[norm < epsilon] = 1.0
+    return x / norm[:, None]
+
+
+def top_k(scores, k):
+    """Returns the column indexes of the `k` largest scores of each row, in decreasing order."""
+    k = min(k, scores.shape[1])
+    index = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, index, axis=1), axis=1)
+    return np.take_along_axis(index, order, axis=1)
+
+
+def exact_search(MODEL, queries, k=10):
+    """Brute-force cosine search, the reference of the index.
+
+    Returns:
+      A tuple of (rows, scores), both of shape [num_queries, k].
+    """
+    scores = np.dot(normalize(queries), normalize(MODEL).T)
+    rows = top_k(scores, k)
+    return rows, np.take_along_axis(scores, rows, axis=1)
+
+
+def _kmeans(vectors, nlist, num_iterations, rng):
+    """Spherical k-means: the centroids are kept on the unit sphere and assigned by inner product."""
+    centroids = vectors[rng.choice(vectors.shape[0], nlist, replace=False)]
+    for _ in range(num_iterations):
+        assignment = np.argmax(np.dot(vectors, centroids.T), axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        # Empty lists keep their previous centroid.
+        empty = np.bincount(assignment, minlength=nlist) == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize(sums)
+    return centroids
+
+
+class SpeakerIndex(object):
+    """An IVF index of L2-normalized speaker models with top-k cosine retrieval.
+
+    The models are clustered in `nlist` lists with k-means. A query is only compared
+    with the models of the `nprobe` lists whose centroids are the closest to it, which
+    is the recall/latency knob: `nprobe=nlist` is an exact search.
+
+    Args:
+      centroids: The [nlist, num_features] list centroids.
+      vectors: The normalized models of shape [num_models, num_features], stored list
+        after list.
+      rows: The row of MODEL.npy of each stored vector.
+      offsets: The [nlist + 1] boundaries of the lists in `vectors`.
+    """
+
+    def __init__(self, centroids, vectors, rows, offsets):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.rows = rows
+        self.offsets = offsets
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, MODEL, nlist=0, num_iterations=10, max_training_points=256, seed=0):
+        """Builds the index of the speaker models.
+
+        Args:
+          MODEL: The speaker models of shape [num_models, num_features].
+          nlist: The number of inverted lists. If 0, the square root of the number of models.
+          num_iterations: The number of k-means iterations.
+          max_training_points: The k-means runs on at most this many models per list.
+          seed: The random seed of k-means.
+
+        Returns:
+          A `SpeakerIndex`.
+        """
+        vectors = normalize(MODEL)
+        num_models = vectors.shape[0]
+        if nlist <= 0:
+            nlist = int(np.sqrt(num_models))
+        nlist = max(1, min(nlist, num_models))
+
+        rng = np.random.RandomState(seed)
+        training = vectors
+        if num_models > nlist * max_training_points:
+            training = vectors[rng.choice(num_models, nlist * max_training_points, replace=False)]
+        centroids = _kmeans(training, nlist, num_iterations, rng)
+
+        # Every model is stored in the list of its closest centroid.
+        assignment = np.argmax(np.dot(vectors, centroids.T), axis=1)
+        rows = np.argsort(assignment, kind='mergesort')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+        return cls(centroids, vectors[rows], rows, offsets)
+
+    def search(self, queries, k=10, nprobe=8):
+        """Finds the `k` most similar speaker models of each query.
+
+        Args:
+          queries: The embeddings of shape [num_queries, num_features].
+          k: The number of retrieved models.
+          nprobe: The number of inverted lists searched for each query.
+
+        Returns:
+          A tuple of (rows, scores), both of shape [num_queries, k]. The rows index
+          MODEL.npy, the scores are cosine similarities. When fewer than `k` models are
+          searched the remaining rows are -1 with a score of -inf.
+        """
+        queries = normalize(queries)
+        nprobe = max(1, min(nprobe, self.nlist))
+        probes = top_k(np.dot(queries, self.centroids.T), nprobe)
+
+        result_rows = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        result_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probes[i]])
+            if candidates.size == 0:
+                continue
+            scores = np.dot(self.vectors[candidates], query)
+            best = top_k(scores[None, :], k)[0]
+            result_rows[i, :best.size] = self.rows[candidates[best]]
+            result_scores[i, :best.size] = scores[best]
+        return result_rows, result_scores
+
+    def save(self, path):
+        """Saves the index in a .npz file, replacing any previous one atomically."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            np.savez(out, centroids=self.centroids, vectors=self.vectors, rows=self.rows, offsets=self.offsets)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['centroids'], data['vectors'], data['rows'], data['offsets'])
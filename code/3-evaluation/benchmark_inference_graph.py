@@ -0,0 +1,85 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import tensorflow as tf
+import numpy as np
+from nets import nets_factory
+from auxiliary import inference_graph
+
+slim = tf.contrib.slim
+
+tf.app.flags.DEFINE_string(
+    'checkpoint_dir', '../../results/TRAIN_CNN_3D',
+    'Directory where the checkpoints of the trained network are.')
+
+tf.app.flags.DEFINE_string(
+    'frozen_graph_path', '../../results/TRAIN_CNN_3D/inference_graph.pb',
+    'The frozen inference graph of export_inference_graph.py.')
+
+tf.app.flags.DEFINE_string(
+    'model_speech', 'cnn_speech', 'The name of the architecture.')
+
+tf.app.flags.DEFINE_integer(
+    'batch_size', 64, 'The number of speech cubes in each timed batch.')
+
+tf.app.flags.DEFINE_integer(
+    'num_steps', 20, 'The number of timed batches.')
+
+# Store all elemnts in FLAG structure!
+FLAGS = tf.app.flags.FLAGS
+
+
+def checkpoint_session():
+    """The previous path: the network is rebuilt and all its variables restored."""
+    latest_checkpoint = tf.train.latest_checkpoint(checkpoint_dir=FLAGS.checkpoint_dir)
+    num_classes = tf.train.NewCheckpointReader(latest_checkpoint).get_variable_to_shape_map()['cnn/fc/weights'][-1]
+    graph = tf.Graph()
+    with graph.as_default(), tf.device('/cpu:0'):
+        speech = tf.placeholder(tf.float32, (None, 20, 80, 40, 1))
+        model_speech_fn = nets_factory.get_network_fn(FLAGS.model_speech, num_classes=num_classes,
+                                                      is_training=False)
+        features, _, _ = model_speech_fn(speech)
+        saver = tf.train.Saver(slim.get_variables_to_restore())
+    sess = tf.Session(graph=graph)
+    saver.restore(sess, latest_checkpoint)
+    return sess, speech, features
+
+
+def frozen_session():
+    graph = tf.Graph()
+    with graph.as_default(), tf.device('/cpu:0'):
+        speech = tf.placeholder(tf.float32, (None, 20, 80, 40, 1))
+        features = inference_graph.import_embedding(FLAGS.frozen_graph_path, speech)
+    return tf.Session(graph=graph), speech, features
+
+
+def benchmark(session_fn, batch):
+    """Returns the startup time (up to the first embeddings) and the median per-batch latency."""
+    start_time = time.time()
+    sess, speech, features = session_fn()
+    sess.run(features, feed_dict={speech: batch})
+    startup = time.time() - start_time
+
+    latencies = []
+    for _ in range(FLAGS.num_steps):
+        start_time = time.time()
+        sess.run(features, feed_dict={speech: batch})
+        latencies.append(time.time() - start_time)
+    sess.close()
+    return startup, np.median(latencies)
+
+
+def main(_):
+    batch = np.random.RandomState(0).randn(FLAGS.batch_size, 20, 80, 40, 1).astype(np.float32)
+    checkpoint_startup, checkpoint_latency = benchmark(checkpoint_session, batch)
+    frozen_startup, frozen_latency = benchmark(frozen_session, batch)
+    print("batch size: %d, timed batches: %d" % (FLAGS.batch_size, FLAGS.num_steps))
+    print("checkpoint: startup %.3f s, %.2f ms/batch" % (checkpoint_startup, 1000 * checkpoint_latency))
+    print("frozen graph: startup %.3f s, %.2f ms/batch" % (frozen_startup, 1000 * frozen_latency))
+
+
+if __name__ == '__main__':
+    tf.app.run()
@@ -0,0 +1,54 @@
+import os
+import time
+import argparse
+import numpy as np
+from auxiliary import speaker_index
+
+
+def synthetic_models(MODEL, num_models, rng):
+    """Grows the enrolled models to `num_models` speakers by perturbing the existing ones."""
+    base = speaker_index.normalize(MODEL)
+    picks = rng.randint(0, base.shape[0], num_models)
+    return base[picks] + 0.3 * rng.randn(num_models, base.shape[1]).astype(np.float32) / np.sqrt(base.shape[1])
+
+
+def recall_at_k(rows, exact_rows):
+    """The fraction of the exact top-k speakers which are retrieved by the index."""
+    k = exact_rows.shape[1]
+    return np.mean([len(set(a) & set(b)) / float(k) for a, b in zip(rows, exact_rows)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recall and speed of the speaker index against exact cosine search')
+    parser.add_argument('--enrollment_dir', default='../../results/Model',
+                        help='The directory of MODEL.npy, used as the seed of the synthetic speakers')
+    parser.add_argument('--num_models', type=int, default=100000, help='The number of indexed speakers')
+    parser.add_argument('--num_queries', type=int, default=1000, help='The number of queries')
+    parser.add_argument('--nlist', type=int, default=0, help='The number of inverted lists (0: square root rule)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 16, 64], help='The searched lists')
+    parser.add_argument('--k', type=int, default=10, help='The number of retrieved speakers')
+    parser.add_argument('--seed', type=int, default=0, help='The random seed')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    model_path = os.path.join(args.enrollment_dir, 'MODEL.npy')
+    MODEL = np.load(model_path) if os.path.exists(model_path) else rng.randn(64, 128).astype(np.float32)
+    models = synthetic_models(MODEL, args.num_models, rng)
+    # The queries are noisy versions of indexed speakers.
+    queries = models[rng.randint(0, args.num_models, args.num_queries)]
+    queries = queries + 0.3 * rng.randn(*queries.shape).astype(np.float32) / np.sqrt(queries.shape[1])
+
+    start = time.time()
+    index = speaker_index.SpeakerIndex.build(models, nlist=args.nlist, seed=args.seed)
+    print("speakers: %d, lists: %d, build: %.2f s" % (args.num_models, index.nlist, time.time() - start))
+
+    start = time.time()
+    exact_rows, _ = speaker_index.exact_search(models, queries, args.k)
+    print("exact: recall@%d 1.000, %.1f queries/sec" % (args.k, args.num_queries / (time.time() - start)))
+
+    for nprobe in args.nprobe:
+        start = time.time()
+        rows, _ = index.search(queries, args.k, nprobe=nprobe)
+        elapsed = time.time() - start
+        print("nprobe %d: recall@%d %.3f, %.1f queries/sec" % (
+            nprobe, args.k, recall_at_k(rows, exact_rows), args.num_queries / elapsed))
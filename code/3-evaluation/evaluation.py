@@ -5,6 +5,7 @@ from __future__ import print_function
 import tensorflow as tf
 
 import sys
+import time
 import tables
 import os
 import numpy as np
@@ -12,7 +13,10 @@ from tensorflow.python.ops import control_flow_ops
 import random
 from nets import nets_factory
 from auxiliary import losses
-from sklearn.metrics.pairwise import cosine_similarity
+from auxiliary import scoring
+from auxiliary import speaker_index
+from auxiliary import input_pipeline
+from auxiliary import inference_graph
 
 slim = tf.contrib.slim
 
@@ -64,6 +68,10 @@ tf.app.flags.DEFINE_integer(
     'num_preprocessing_threads', 8,
     'The number of threads used to create the batches.')
 
+tf.app.flags.DEFINE_integer(
+    'prefetch_batches', 4,
+    'The number of minibatches which are prepared ahead of the network.')
+
 tf.app.flags.DEFINE_integer(
     'log_every_n_steps', 20,
     'The frequency with which logs are print.')
@@ -121,12 +129,47 @@ tf.app.flags.DEFINE_float(
 tf.app.flags.DEFINE_string(
     'model_speech', 'cnn_speech', 'The name of the architecture to train.')
 
+tf.app.flags.DEFINE_string(
+    'frozen_graph_path', '',
+    'If set, the frozen inference graph of export_inference_graph.py is used instead of '
+    'rebuilding the network and restoring the latest checkpoint.')
+
+tf.app.flags.DEFINE_boolean(
+    'single_frame_evaluation', True,
+    'Whether or not to compute the network on the single utterance of each evaluation cube '
+    'instead of repeating it 20 times. The embeddings are the same. Ignored with a frozen graph.')
+
 tf.app.flags.DEFINE_integer(
     'batch_size', 1, 'The number of samples in each batch.')
 
 tf.app.flags.DEFINE_integer(
     'num_epochs', 50, 'The number of epochs for training.')
 
+tf.app.flags.DEFINE_integer(
+    'score_memory_budget_mb', 256,
+    'The memory budget in megabytes of each block of the trial-by-speaker score matrix.')
+
+tf.app.flags.DEFINE_integer(
+    'score_top_k', 0,
+    'If positive, only the scores of the k best speakers of each trial are kept (top_k_labels.npy '
+    'and top_k_scores.npy) instead of all the pairs (score_vector.npy and target_label_vector.npy, '
+    'which the ROC curve needs).')
+
+tf.app.flags.DEFINE_boolean(
+    'write_score_log', False,
+    'Whether or not to also write the kept scores as text to score.log, which result_inspect.py '
+    'reads. It is about 30 bytes per kept pair, so it is best left off with all the pairs of a '
+    'large evaluation.')
+
+tf.app.flags.DEFINE_integer(
+    'identification_top_k', 0,
+    'If positive, the number of speakers retrieved for each utterance from the speaker index.')
+
+tf.app.flags.DEFINE_integer(
+    'index_nprobe', 8,
+    'The number of inverted lists of the speaker index searched for each utterance. '
+    'Larger values trade speed for recall.')
+
 # Store all elemnts in FLAG structure!
 FLAGS = tf.app.flags.FLAGS
 
@@ -156,10 +199,11 @@ def main(_):
 
         # required from data
         num_samples_per_epoch = fileh.root.label_enrollment.shape[0]
-        num_batches_per_epoch = int(num_samples_per_epoch / FLAGS.batch_size)
+        num_batches_per_epoch = int(np.ceil(num_samples_per_epoch / float(FLAGS.batch_size)))
 
+        # The last minibatch is padded to the batch size, so every trial is evaluated.
         num_samples_per_epoch_test = fileh.root.label_evaluation.shape[0]
-        num_batches_per_epoch_test = int(num_samples_per_epoch_test / FLAGS.batch_size)
+        num_batches_per_epoch_test = int(np.ceil(num_samples_per_epoch_test / float(FLAGS.batch_size)))
 
         # Create global_step
         global_step = tf.Variable(0, name='global_step', trainable=False)
@@ -170,8 +214,11 @@ def main(_):
 
         is_training = tf.placeholder(tf.bool)
 
+        # The single-utterance evaluation cubes go through the network as a single depth
+        # slice instead of being repeated 20 times (the frozen graph expects full cubes).
+        single_frame = FLAGS.single_frame_evaluation and not FLAGS.frozen_graph_path
         model_speech_fn = nets_factory.get_network_fn(
-            FLAGS.model_speech,
+            FLAGS.model_speech + ('_single_frame' if single_frame else ''),
             num_classes=num_subjects_development,
             is_training=is_training)
 
@@ -180,111 +227,120 @@ def main(_):
         ##############################################################
         # with tf.device(deploy_config.inputs_device()):
         """
-        Define the place holders and creating the batch tensor.
+        The evaluation utterances are read from the HDF5 file and repeated to the depth
+        of the network input inside the tf.data pipeline.
         """
-        speech = tf.placeholder(tf.float32, (20, 80, 40, 1))
-        label = tf.placeholder(tf.int32, (1))
-        batch_dynamic = tf.placeholder(tf.int32, ())
-        margin_imp_tensor = tf.placeholder(tf.float32, ())
-
-        # Create the batch tensors
-        batch_speech, batch_labels = tf.train.batch(
-            [speech, label],
-            batch_size=batch_dynamic,
-            num_threads=FLAGS.num_preprocessing_threads,
-            capacity=5 * FLAGS.batch_size)
-
-        #############################
-        # Specify the loss function #
-        #############################
-        tower_grads = []
-        with tf.variable_scope(tf.get_variable_scope()):
-            for i in range(FLAGS.num_clones):
-                with tf.device('/gpu:%d' % i):
-                    with tf.name_scope('%s_%d' % ('tower', i)) as scope:
-                        """
-                        Two distance metric are defined:
-                           1 - distance_weighted: which is a weighted average of the distance between two structures.
-                           2 - distance_l2: which is the regular l2-norm of the two networks outputs.
-                        Place holders
-
-                        """
-                        ########################################
-                        ######## Outputs of two networks #######
-                        ########################################
-                        # step = int(FLAGS.batch_size / float(FLAGS.num_clones))
-                        # logits, end_points_speech = model_speech_fn(batch_speech[i * step : (i + 1) * step])
-                        features, logits, end_points_speech = model_speech_fn(batch_speech)
-
-                        # # Uncomment if the output embedding is desired to be as |f(x)| = 1
-                        # logits_speech = tf.nn.l2_normalize(logits_speech, dim=1, epsilon=1e-12, name=None)
-                        # logits_mouth = tf.nn.l2_normalize(logits_mouth, dim=1, epsilon=1e-12, name=None)
-
-                        #######################################################
-                        ################# Distance Calculation ################
-                        #######################################################
-
-                        # ##### Weighted distance using a fully connected layer #####
-                        # distance_vector = tf.abs(tf.subtract(logits_speech_L, logits_speech_R, name=None))
-                        # logits = slim.fully_connected(distance_vector, 2, normalizer_fn=None, activation_fn=None,
-                        #                               scope='fc_weighted')
-
-                        ###############################################
-                        ########## Loss function ##########
-                        ###############################################
-
-                        # one_hot labeling
-                        label_onehot = tf.one_hot(tf.squeeze(batch_labels, [1]), depth=num_subjects_development, axis=-1)
-
-                        # Define loss
-                        with tf.name_scope('loss'):
-                            loss = tf.reduce_mean(
-                                tf.nn.softmax_cross_entropy_with_logits(logits=logits, labels=label_onehot))
-
-                        # Accuracy
-                        with tf.name_scope('accuracy'):
-                            # Evaluate the model
-                            correct_pred = tf.equal(tf.argmax(logits, 1), tf.argmax(label_onehot, 1))
-
-                            # Accuracy calculation
-                            accuracy = tf.reduce_mean(tf.cast(correct_pred, tf.float32))
-
-                            # # ##### call the optimizer ######
-                            # # # TODO: call optimizer object outside of this gpu environment
-                            # #
-                            # # Reuse variables for the next tower.
-                            # tf.get_variable_scope().reuse_variables()
-
-        #################################################
-        ########### Summary Section #####################
-        #################################################
-
-        # Gather initial summaries.
-        summaries = set(tf.get_collection(tf.GraphKeys.SUMMARIES))
-
-        # Add summaries for all end_points.
-        for end_point in end_points_speech:
-            x = end_points_speech[end_point]
-            summaries.add(tf.summary.scalar('sparsity_speech/' + end_point,
-                                            tf.nn.zero_fraction(x)))
-
-            # for end_point in end_points_speech_R:
-            #     x = end_points_speech_R[end_point]
-            #     summaries.add(tf.summary.scalar('sparsity_mouth/' + end_point,
-            #                                     tf.nn.zero_fraction(x)))
-
-            # # Add summaries for variables.
-            # for variable in slim.get_model_variables():
-            #     summaries.add(tf.summary.histogram(variable.op.name, variable))
-            #
-            # # # Add to parameters to summaries
-            # # summaries.add(tf.summary.scalar('learning_rate', learning_rate))
-            # # summaries.add(tf.summary.scalar('global_step', global_step))
-            # # summaries.add(tf.summary.scalar('eval/Loss', loss))
-            # # summaries |= set(tf.get_collection(tf.GraphKeys.SUMMARIES))
-            #
-            # # Merge all summaries together.
-            # summary_op = tf.summary.merge(list(summaries), name='summary_op')
+        def evaluation_batches():
+            # Loop over all batches
+            for batch_num in range(num_batches_per_epoch_test):
+                start_idx = batch_num * FLAGS.batch_size
+                end_idx = (batch_num + 1) * FLAGS.batch_size
+                yield fileh.root.utterance_evaluation[start_idx:end_idx], fileh.root.label_evaluation[start_idx:end_idx]
+
+        dataset = input_pipeline.hdf5_dataset(evaluation_batches, fileh.root.utterance_evaluation.shape[1:],
+                                              lambda speech: input_pipeline.evaluation_transform(
+                                                  speech, num_utterances=1 if single_frame else 20),
+                                              num_parallel_calls=FLAGS.num_preprocessing_threads,
+                                              prefetch_batches=FLAGS.prefetch_batches,
+                                              batch_size=FLAGS.batch_size)
+        iterator = dataset.make_initializable_iterator()
+        batch_speech, batch_labels = iterator.get_next()
+
+        if FLAGS.frozen_graph_path:
+            # The frozen inference graph maps the speech cubes straight to the embeddings.
+            features = inference_graph.import_embedding(FLAGS.frozen_graph_path, batch_speech)
+        else:
+            #############################
+            # Specify the loss function #
+            #############################
+            tower_grads = []
+            with tf.variable_scope(tf.get_variable_scope()):
+                for i in range(FLAGS.num_clones):
+                    with tf.device('/gpu:%d' % i):
+                        with tf.name_scope('%s_%d' % ('tower', i)) as scope:
+                            """
+                            Two distance metric are defined:
+                               1 - distance_weighted: which is a weighted average of the distance between two structures.
+                               2 - distance_l2: which is the regular l2-norm of the two networks outputs.
+                            Place holders
+
+                            """
+                            ########################################
+                            ######## Outputs of two networks #######
+                            ########################################
+                            # step = int(FLAGS.batch_size / float(FLAGS.num_clones))
+                            # logits, end_points_speech = model_speech_fn(batch_speech[i * step : (i + 1) * step])
+                            features, logits, end_points_speech = model_speech_fn(batch_speech)
+
+                            # # Uncomment if the output embedding is desired to be as |f(x)| = 1
+                            # logits_speech = tf.nn.l2_normalize(logits_speech, dim=1, epsilon=1e-12, name=None)
+                            # logits_mouth = tf.nn.l2_normalize(logits_mouth, dim=1, epsilon=1e-12, name=None)
+
+                            #######################################################
+                            ################# Distance Calculation ################
+                            #######################################################
+
+                            # ##### Weighted distance using a fully connected layer #####
+                            # distance_vector = tf.abs(tf.subtract(logits_speech_L, logits_speech_R, name=None))
+                            # logits = slim.fully_connected(distance_vector, 2, normalizer_fn=None, activation_fn=None,
+                            #                               scope='fc_weighted')
+
+                            ###############################################
+                            ########## Loss function ##########
+                            ###############################################
+
+                            # one_hot labeling
+                            label_onehot = tf.one_hot(batch_labels, depth=num_subjects_development, axis=-1)
+
+                            # Define loss
+                            with tf.name_scope('loss'):
+                                loss = tf.reduce_mean(
+                                    tf.nn.softmax_cross_entropy_with_logits(logits=logits, labels=label_onehot))
+
+                            # Accuracy
+                            with tf.name_scope('accuracy'):
+                                # Evaluate the model
+                                correct_pred = tf.equal(tf.argmax(logits, 1), tf.argmax(label_onehot, 1))
+
+                                # Accuracy calculation
+                                accuracy = tf.reduce_mean(tf.cast(correct_pred, tf.float32))
+
+                                # # ##### call the optimizer ######
+                                # # # TODO: call optimizer object outside of this gpu environment
+                                # #
+                                # # Reuse variables for the next tower.
+                                # tf.get_variable_scope().reuse_variables()
+
+            #################################################
+            ########### Summary Section #####################
+            #################################################
+
+            # Gather initial summaries.
+            summaries = set(tf.get_collection(tf.GraphKeys.SUMMARIES))
+
+            # Add summaries for all end_points.
+            for end_point in end_points_speech:
+                x = end_points_speech[end_point]
+                summaries.add(tf.summary.scalar('sparsity_speech/' + end_point,
+                                                tf.nn.zero_fraction(x)))
+
+                # for end_point in end_points_speech_R:
+                #     x = end_points_speech_R[end_point]
+                #     summaries.add(tf.summary.scalar('sparsity_mouth/' + end_point,
+                #                                     tf.nn.zero_fraction(x)))
+
+                # # Add summaries for variables.
+                # for variable in slim.get_model_variables():
+                #     summaries.add(tf.summary.histogram(variable.op.name, variable))
+                #
+                # # # Add to parameters to summaries
+                # # summaries.add(tf.summary.scalar('learning_rate', learning_rate))
+                # # summaries.add(tf.summary.scalar('global_step', global_step))
+                # # summaries.add(tf.summary.scalar('eval/Loss', loss))
+                # # summaries |= set(tf.get_collection(tf.GraphKeys.SUMMARIES))
+                #
+                # # Merge all summaries together.
+                # summary_op = tf.summary.merge(list(summaries), name='summary_op')
 
     ###########################
     ######## ######## #########
@@ -293,8 +349,6 @@ def main(_):
     with tf.Session(graph=graph, config=tf.ConfigProto(allow_soft_placement=True)) as sess:
 
         # Initialization of the network.
-        variables_to_restore = slim.get_variables_to_restore()
-        saver = tf.train.Saver(variables_to_restore, max_to_keep=20)
         coord = tf.train.Coordinator()
         sess.run(tf.global_variables_initializer())
         sess.run(tf.local_variables_initializer())
@@ -304,7 +358,10 @@ def main(_):
         ################################################
 
         latest_checkpoint = tf.train.latest_checkpoint(checkpoint_dir=FLAGS.checkpoint_dir)
-        saver.restore(sess, latest_checkpoint)
+        if not FLAGS.frozen_graph_path:
+            variables_to_restore = slim.get_variables_to_restore()
+            saver = tf.train.Saver(variables_to_restore, max_to_keep=20)
+            saver.restore(sess, latest_checkpoint)
 
         speaker_model_path = os.path.join(FLAGS.enrollment_dir,'MODEL.npy')
         MODEL = np.load(speaker_model_path)
@@ -315,79 +372,79 @@ def main(_):
                 line_arr = each_line.split()
                 label_map[int(line_arr[1])] = str(line_arr[0])
 
-        feature_vector = np.zeros((num_batches_per_epoch_test*FLAGS.batch_size, 128))
-        label_vector = np.zeros((num_batches_per_epoch_test * FLAGS.batch_size, 1))
+        # The scores are computed and written block by block as the embeddings come out. The
+        # embeddings themselves are only kept for the speaker index search.
+        score_writer = scoring.ScoreWriter(FLAGS.evaluation_dir, num_samples_per_epoch_test, MODEL, label_map,
+                                           memory_budget_mb=FLAGS.score_memory_budget_mb,
+                                           top_k=FLAGS.score_top_k, score_log=FLAGS.write_score_log)
+        feature_vector = np.zeros((num_samples_per_epoch_test, 128)) if FLAGS.identification_top_k > 0 else None
+        label_vector = np.zeros((num_samples_per_epoch_test, 1))
+
+        # The evaluation batches come out of the input pipeline in the order of the dataset.
+        sess.run(iterator.initializer)
 
         step = 1
+        embedding_time = 0.0
         # Loop over all batches
         for batch_num in range(num_batches_per_epoch_test):
 
             step += 1
             start_idx = batch_num * FLAGS.batch_size
-            end_idx = (batch_num + 1) * FLAGS.batch_size
-            #speech_evaluation, label_evaluation = fileh.root.utterance_evaluation[start_idx:end_idx, :, :,
-            #                                      0:1], fileh.root.label_evaluation[start_idx:end_idx]
-            speech_evaluation, label_evaluation = fileh.root.utterance_evaluation[start_idx:end_idx, :, :,
-                                                  :], fileh.root.label_evaluation[start_idx:end_idx]
-            # Copy to match dimension
-            #speech_evaluation = np.repeat(speech_evaluation,20,axis=3)
-            speech_evaluation = np.repeat(speech_evaluation, 20, axis=1)
-            print(speech_evaluation.shape)
-            #speech_evaluation = np.transpose(speech_evaluation[None, :, :, :, :], axes=(1, 4, 2, 3, 0))
-            speech_evaluation = np.transpose(speech_evaluation[None, :, :, :, :], axes=(0, 2, 3, 4, 1))
-
-
-            feature = sess.run(
-                [features],
-                feed_dict={is_training: True, batch_dynamic: label_evaluation.shape[0],
-                           batch_speech: speech_evaluation,
-                           batch_labels: label_evaluation.reshape([label_evaluation.shape[0], 1])})
+
+            start_time = time.time()
+            feature, label_evaluation = sess.run(
+                [features, batch_labels],
+                feed_dict={is_training: False})
+            embedding_time += time.time() - start_time
+
+            # The outputs of the samples which pad the last minibatch are dropped.
+            valid = label_evaluation != input_pipeline.PAD_LABEL
+            feature, label_evaluation = feature[valid], label_evaluation[valid]
+            end_idx = start_idx + label_evaluation.shape[0]
 
             # Extracting the associated numpy array.
-            feature_speaker = feature[0]
+            feature_speaker = feature
 
             # # # L2-norm along each utterance vector
             # feature_speaker = sklearn.preprocessing.normalize(feature_speaker, norm='l2', axis=1, copy=True,
             #                                                   return_norm=False)
 
-            feature_vector[start_idx:end_idx,:] = feature_speaker
+            score_writer.add(feature_speaker, label_evaluation)
+            if feature_vector is not None:
+                feature_vector[start_idx:end_idx,:] = feature_speaker
             label_vector[start_idx:end_idx,:] = label_evaluation.reshape([label_evaluation.shape[0], 1])
 
 
         ########################################
         ########## SCORE COMPUTATION ###########
         ########################################
-        NumClasses = MODEL.shape[0]
-        NumFeatures = MODEL.shape[1]
-        score_vector = np.zeros((feature_vector.shape[0]*NumClasses, 1))
-        target_label_vector = np.zeros((feature_vector.shape[0]*NumClasses, 1))
-
-        out_array = []
-        for i in range(feature_vector.shape[0]):
-            if i % 100 ==0:
-                print("processing file %d from %d" %(i,feature_vector.shape[0]))
-            for j in range(NumClasses):
-                model = MODEL[j:j+1, :]
-                score = cosine_similarity(feature_vector[i:i+1,:], model)
-                score_vector[i*NumClasses + j] = score
-                label_real = label_map[j]
-                #if (j+1) == label_vector[i,:]:
-                label_test = str(int(label_vector[i,0:1]))
-                print(label_real,label_test,score)
-                out_array.append((label_real,label_test,score))
-                if label_real == label_test:
-                    target_label_vector[i*NumClasses + j] = 1
-                else:
-                    target_label_vector[i * NumClasses + j] = 0
-
-        # Save the score and label vector.
-        if not os.path.exists(FLAGS.evaluation_dir):
-            os.makedirs(FLAGS.evaluation_dir)
-        np.save(os.path.join(FLAGS.evaluation_dir,'score_vector.npy'),score_vector)
-        np.save(os.path.join(FLAGS.evaluation_dir,'target_label_vector.npy'),target_label_vector)
-        with open(os.path.join(FLAGS.evaluation_dir,'score.log'),"w") as out_handler:
-            for each_tuple in out_array:
-                out_handler.write("%s %s %f\n" % (each_tuple[0],each_tuple[1],each_tuple[2]))
+        # The last block of scores is written and the score files are flushed.
+        score_writer.close()
+
+        # The embedding throughput, e.g. to compare the precisions of the frozen graph.
+        with open(os.path.join(FLAGS.evaluation_dir, 'throughput.log'), 'w') as out:
+            out.write("%d %f %f\n" % (num_samples_per_epoch_test, embedding_time,
+                                      num_samples_per_epoch_test / embedding_time))
+        print("Embeddings: %d utterances in %.3f s (%.2f utterances/sec)" % (
+            num_samples_per_epoch_test, embedding_time, num_samples_per_epoch_test / embedding_time))
+
+        ########################################
+        ########### IDENTIFICATION #############
+        ########################################
+        # The top-k speakers of each utterance are retrieved from the speaker index built at enrollment.
+        if FLAGS.identification_top_k > 0:
+            index = speaker_index.SpeakerIndex.load(os.path.join(FLAGS.enrollment_dir, 'speaker_index.npz'))
+            rows, scores = index.search(feature_vector, k=FLAGS.identification_top_k, nprobe=FLAGS.index_nprobe)
+            true_labels = [str(int(label)) for label in label_vector[:, 0]]
+            top_labels = [[label_map[row] if row >= 0 else '-' for row in rows_trial] for rows_trial in rows]
+            with open(os.path.join(FLAGS.evaluation_dir, 'identification.log'), 'w') as out:
+                for true_label, labels_trial, scores_trial in zip(true_labels, top_labels, scores):
+                    out.write("%s %s\n" % (true_label, ' '.join(
+                        "%s:%f" % (label, score) for label, score in zip(labels_trial, scores_trial))))
+            print("Identification top-1 accuracy: %f" % np.mean(
+                [labels_trial[0] == true_label for true_label, labels_trial in zip(true_labels, top_labels)]))
+            print("Identification top-%d accuracy: %f" % (FLAGS.identification_top_k, np.mean(
+                [true_label in labels_trial for true_label, labels_trial in zip(true_labels, top_labels)])))
 
 
 if __name__ == '__main__':
@@ -50,6 +50,9 @@ def speech_cnn_arg_scope(is_training, weight_decay=0.0005):
     """Defines the VGG arg scope.
 
     Args:
+      is_training: Whether the batch normalization layers use the batch statistics
+        (and update the moving statistics) or the moving statistics. A python bool or
+        a boolean tensor.
       weight_decay: The l2 regularization coefficient.
 
     Returns:
@@ -62,8 +65,11 @@ def speech_cnn_arg_scope(is_training, weight_decay=0.0005):
                         weights_initializer=tf.contrib.layers.variance_scaling_initializer(factor=1.0, mode='FAN_AVG'),
                         weights_regularizer=slim.l2_regularizer(weight_decay),
                         biases_initializer=tf.zeros_initializer()):
-        with slim.arg_scope([slim.conv3d], padding='VALID') as arg_sc:
-            return arg_sc
+        # In inference mode the moving statistics are used, so that the outputs do not
+        # depend on the other samples of the batch.
+        with slim.arg_scope([slim.batch_norm], is_training=is_training):
+            with slim.arg_scope([slim.conv3d], padding='VALID') as arg_sc:
+                return arg_sc
 
 
 def PReLU(input, scope):
@@ -166,3 +172,94 @@ def speech_cnn(inputs, num_classes=1000,
 
             return features, logits, end_points
 
+
+def _single_frame_conv3d(net, num_outputs, kernel_size, stride, scope, normalizer_fn=slim.batch_norm):
+    """A slim.conv3d layer applied to an input which is constant along the depth axis.
+
+    The VALID convolution of such an input is also constant along depth, and equal to
+    the convolution of a single depth slice with the kernel summed over depth. So the
+    layer is computed on one slice only. The variables are the ones of slim.conv3d.
+    """
+    with tf.variable_scope(scope):
+        num_inputs = net.get_shape()[-1].value
+        weights = slim.model_variable(
+            'weights', shape=list(kernel_size) + [num_inputs, num_outputs],
+            initializer=tf.contrib.layers.variance_scaling_initializer(factor=1.0, mode='FAN_AVG'))
+        kernel = tf.reduce_sum(weights, axis=0, keep_dims=True)
+        net = tf.nn.conv3d(net, kernel, strides=[1] + list(stride) + [1], padding='VALID')
+        if normalizer_fn is not None:
+            return normalizer_fn(net)
+        biases = slim.model_variable('biases', shape=[num_outputs], initializer=tf.zeros_initializer())
+        return tf.nn.bias_add(net, biases)
+
+
+def speech_cnn_single_frame(inputs, num_classes=1000,
+                            is_training=True,
+                            dropout_keep_prob=0.5,
+                            spatial_squeeze=True,
+                            scope='cnn'):
+    """speech_cnn for cubes made of a single utterance repeated along the depth axis.
+
+    The evaluation cubes repeat one utterance 20 times. Every layer of speech_cnn then
+    has an output which is constant along depth, so the network is computed on a single
+    depth slice: the inputs are [batch_size, 1, 80, 40, 1] instead of
+    [batch_size, 20, 80, 40, 1], for the same outputs and about 1/20 of the convolutions.
+    The variables are the ones of speech_cnn, so the same checkpoints are restored.
+
+    Args:
+      inputs: a tensor of size [batch_size, 1, 80, 40, 1].
+      num_classes: number of predicted classes.
+      is_training: whether or not the model is being trained.
+      dropout_keep_prob: unused, as in speech_cnn.
+      spatial_squeeze: whether or not should squeeze the spatial dimensions of the
+        outputs.
+      scope: Optional scope for the variables.
+
+    Returns:
+      the embeddings, the logits and the end_points dict.
+    """
+    with tf.variable_scope(scope, 'net', [inputs]) as sc:
+        net = tf.to_float(inputs)
+
+        ############ Conv-1 ###############
+        net = _single_frame_conv3d(net, 16, [3, 1, 5], [1, 1, 1], 'conv11')
+        net = PReLU(net, 'conv11_activation')
+        net = _single_frame_conv3d(net, 16, [3, 9, 1], [1, 2, 1], 'conv12')
+        net = PReLU(net, 'conv12_activation')
+        net = tf.nn.max_pool3d(net, strides=[1, 1, 1, 2, 1], ksize=[1, 1, 1, 2, 1], padding='VALID', name='pool1')
+
+        ############ Conv-2 ###############
+        net = _single_frame_conv3d(net, 32, [3, 1, 4], [1, 1, 1], 'conv21')
+        net = PReLU(net, 'conv21_activation')
+        net = _single_frame_conv3d(net, 32, [3, 8, 1], [1, 2, 1], 'conv22')
+        net = PReLU(net, 'conv22_activation')
+        net = tf.nn.max_pool3d(net, strides=[1, 1, 1, 2, 1], ksize=[1, 1, 1, 2, 1], padding='VALID', name='pool2')
+
+        ############ Conv-3 ###############
+        net = _single_frame_conv3d(net, 64, [3, 1, 3], [1, 1, 1], 'conv31')
+        net = PReLU(net, 'conv31_activation')
+        net = _single_frame_conv3d(net, 64, [3, 7, 1], [1, 1, 1], 'conv32')
+        net = PReLU(net, 'conv32_activation')
+
+        ############ Conv-4 ###############
+        net = _single_frame_conv3d(net, 128, [3, 1, 3], [1, 1, 1], 'conv41')
+        net = PReLU(net, 'conv41_activation')
+        net = _single_frame_conv3d(net, 128, [3, 7, 1], [1, 1, 1], 'conv42')
+        net = PReLU(net, 'conv42_activation')
+
+        ############ Conv-5 ###############
+        net = _single_frame_conv3d(net, 128, [4, 3, 3], [1, 1, 1], 'conv51', normalizer_fn=None)
+        features = net
+        net = PReLU(net, 'conv51_activation')
+
+        # Last layer which is the logits for classes
+        logits = tf.contrib.layers.conv3d(net, num_classes, [1, 1, 1], activation_fn=None, scope='fc')
+
+        end_points = {}
+        # Squeeze spatially to eliminate extra dimensions.(embedding layer)
+        if spatial_squeeze:
+            logits = tf.squeeze(logits, [1, 2, 3], name='fc/squeezed')
+            features = tf.squeeze(features, [1, 2, 3], name='features/squeezed')
+            end_points[sc.name + '/fc'] = logits
+
+        return features, logits, end_points
@@ -0,0 +1,62 @@
+"""Tests for nets.cnn_speech."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from nets import nets_factory
+
+
+class SpeechCnnTest(tf.test.TestCase):
+
+  def testInferenceIsBatchInvariant(self):
+    batch_size = 4
+    num_classes = 10
+    inputs = np.random.RandomState(0).randn(batch_size, 20, 80, 40, 1).astype(np.float32)
+    with self.test_session() as sess:
+      net_fn = nets_factory.get_network_fn('cnn_speech', num_classes, is_training=False)
+      speech = tf.placeholder(tf.float32, (None, 20, 80, 40, 1))
+      features, logits, _ = net_fn(speech)
+      self.assertEqual(logits.get_shape().as_list()[-1], num_classes)
+
+      sess.run(tf.global_variables_initializer())
+      # Make the moving statistics differ from their initial values.
+      for variable in tf.global_variables():
+        if 'moving_' in variable.op.name:
+          sess.run(variable.assign(np.random.uniform(0.5, 1.5, variable.get_shape().as_list())))
+
+      batch_features = sess.run(features, feed_dict={speech: inputs})
+      for i in range(batch_size):
+        single_features = sess.run(features, feed_dict={speech: inputs[i:i + 1]})
+        self.assertAllClose(batch_features[i:i + 1], single_features, rtol=1e-4, atol=1e-4)
+
+  def testSingleFrameMatchesRepeatedCube(self):
+    batch_size = 3
+    num_classes = 10
+    utterances = np.random.RandomState(1).randn(batch_size, 1, 80, 40, 1).astype(np.float32)
+    cubes = np.repeat(utterances, 20, axis=1)
+    with self.test_session() as sess:
+      speech = tf.placeholder(tf.float32, (None, 20, 80, 40, 1))
+      speech_single_frame = tf.placeholder(tf.float32, (None, 1, 80, 40, 1))
+      features, logits, _ = nets_factory.get_network_fn(
+          'cnn_speech', num_classes, is_training=False)(speech)
+      with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+        features_single_frame, logits_single_frame, _ = nets_factory.get_network_fn(
+            'cnn_speech_single_frame', num_classes, is_training=False)(speech_single_frame)
+
+      sess.run(tf.global_variables_initializer())
+      for variable in tf.global_variables():
+        if 'moving_' in variable.op.name or 'activation' in variable.op.name:
+          sess.run(variable.assign(np.random.uniform(0.5, 1.5, variable.get_shape().as_list())))
+
+      outputs = sess.run([features, logits], feed_dict={speech: cubes})
+      outputs_single_frame = sess.run([features_single_frame, logits_single_frame],
+                                      feed_dict={speech_single_frame: utterances})
+      self.assertAllClose(outputs[0], outputs_single_frame[0], rtol=1e-3, atol=1e-3)
+      self.assertAllClose(outputs[1], outputs_single_frame[1], rtol=1e-3, atol=1e-3)
+
+if __name__ == '__main__':
+  tf.test.main()
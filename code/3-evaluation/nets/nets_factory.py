@@ -26,9 +26,11 @@ from nets import cnn_speech
 
 slim = tf.contrib.slim
 
-networks_map = {'cnn_speech':cnn_speech.speech_cnn}
+networks_map = {'cnn_speech':cnn_speech.speech_cnn,
+                'cnn_speech_single_frame':cnn_speech.speech_cnn_single_frame}
 
-arg_scopes_map = {'cnn_speech':cnn_speech.speech_cnn_arg_scope}
+arg_scopes_map = {'cnn_speech':cnn_speech.speech_cnn_arg_scope,
+                  'cnn_speech_single_frame':cnn_speech.speech_cnn_arg_scope}
 
 
 def get_network_fn(name, num_classes, weight_decay=0.0, is_training=False):
@@ -1,3 +1,6 @@
+import argparse
+
+
 
 def fetch_best(path):
     last_score = 0.0
@@ -27,5 +30,6 @@ def fetch_best(path):
         print(record)
 
 if __name__ == '__main__':
-    path = "results/SCORES/score.log"
-    fetch_best(path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Prints the best scored model of each trial of score.log.')
+    parser.add_argument('--score_log', default='results/SCORES/score.log', help='The score.log of evaluation.py.')
+    fetch_best(parser.parse_args().score_log)
\ No newline at end of file
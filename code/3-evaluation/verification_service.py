@@ -0,0 +1,250 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import base64
+import io
+import json
+import os
+
+import tensorflow as tf
+import tables
+import numpy as np
+import speechpy
+from nets import nets_factory
+from auxiliary import audio_io
+from auxiliary import inference_graph
+from auxiliary import input_pipeline
+from auxiliary import micro_batcher
+from auxiliary import scoring
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+    from urllib.parse import urlparse, parse_qs
+
+slim = tf.contrib.slim
+
+tf.app.flags.DEFINE_string(
+    'checkpoint_dir', '../../results/TRAIN_CNN_3D',
+    'Directory where the checkpoints of the trained network are.')
+
+tf.app.flags.DEFINE_string(
+    'development_dataset_path', '../../data/development_sample_dataset_speaker.hdf5',
+    'The development dataset, which gives the number of outputs of the trained network.')
+
+tf.app.flags.DEFINE_string(
+    'enrollment_dir', '../../results/Model',
+    'Directory of the MODEL.npy and model.map speaker models.')
+
+tf.app.flags.DEFINE_string(
+    'model_speech', 'cnn_speech', 'The name of the architecture.')
+
+tf.app.flags.DEFINE_boolean(
+    'single_frame_evaluation', True,
+    'Whether or not to compute the network on the single utterance of each request '
+    'instead of repeating it 20 times. The embeddings are the same. Ignored with a frozen graph.')
+
+tf.app.flags.DEFINE_string(
+    'frozen_graph_path', '',
+    'If set, the frozen inference graph of export_inference_graph.py is used instead of '
+    'rebuilding the network and restoring the latest checkpoint.')
+
+tf.app.flags.DEFINE_string(
+    'host', '127.0.0.1', 'The address the HTTP service listens on.')
+
+tf.app.flags.DEFINE_integer(
+    'port', 8000, 'The port the HTTP service listens on.')
+
+tf.app.flags.DEFINE_string(
+    'unix_socket', '',
+    'If set, the service listens on this Unix socket instead of the HTTP port.')
+
+tf.app.flags.DEFINE_integer(
+    'max_batch_size', 64, 'The maximum number of requests in a forward pass.')
+
+tf.app.flags.DEFINE_float(
+    'max_wait_ms', 5.0,
+    'The maximum time a request waits for others to share its forward pass, in milliseconds.')
+
+# Store all elemnts in FLAG structure!
+FLAGS = tf.app.flags.FLAGS
+
+NumFrames = 80
+NumCoefficient = 40
+
+
+class Verifier(object):
+    """The trained network and the speaker models, loaded once.
+
+    The embeddings of concurrent requests are computed together by a `MicroBatcher`.
+    """
+
+    def __init__(self):
+        fileh_development = tables.open_file(FLAGS.development_dataset_path, mode='r')
+        num_subjects_development = len(np.unique(fileh_development.root.label_train[:]))
+        fileh_development.close()
+
+        self.graph = tf.Graph()
+        with self.graph.as_default(), tf.device('/cpu:0'):
+            self.utterances = tf.placeholder(tf.float32, (None, 1, NumFrames, NumCoefficient))
+            # The moving statistics of batch normalization are used, so a score does not depend
+            # on the other requests of its batch.
+            # The utterance goes through the network as a single depth slice instead of being
+            # repeated 20 times (the frozen graph expects full cubes).
+            single_frame = FLAGS.single_frame_evaluation and not FLAGS.frozen_graph_path
+            speech = input_pipeline.evaluation_transform(self.utterances, num_utterances=1 if single_frame else 20)
+            if FLAGS.frozen_graph_path:
+                # The frozen inference graph maps the speech cubes straight to the embeddings.
+                self.features = inference_graph.import_embedding(FLAGS.frozen_graph_path, speech)
+            else:
+                model_speech_fn = nets_factory.get_network_fn(
+                    FLAGS.model_speech + ('_single_frame' if single_frame else ''),
+                    num_classes=num_subjects_development, is_training=False)
+                self.features, _, _ = model_speech_fn(speech)
+                saver = tf.train.Saver(slim.get_variables_to_restore())
+
+        self.sess = tf.Session(graph=self.graph)
+        if not FLAGS.frozen_graph_path:
+            saver.restore(self.sess, tf.train.latest_checkpoint(checkpoint_dir=FLAGS.checkpoint_dir))
+
+        self.MODEL = scoring.l2_normalize(np.load(os.path.join(FLAGS.enrollment_dir, 'MODEL.npy')))
+        self.model_rows = {}
+        with open(os.path.join(FLAGS.enrollment_dir, 'model.map')) as in_handler:
+            for each_line in in_handler:
+                line_arr = each_line.strip().split()
+                self.model_rows[str(line_arr[0])] = int(line_arr[1])
+
+        self.batcher = micro_batcher.MicroBatcher(self.embed, max_batch_size=FLAGS.max_batch_size,
+                                                  max_wait_ms=FLAGS.max_wait_ms)
+
+    def embed(self, utterances):
+        return self.sess.run(self.features, feed_dict={self.utterances: utterances})
+
+    def verify(self, speaker, utterance):
+        """Returns the cosine score of an utterance of shape [80, 40] against a claimed (enrolled) speaker."""
+        feature = self.batcher.submit(utterance[None, :, :])
+        return float(np.dot(scoring.l2_normalize(feature[None, :])[0], self.MODEL[self.model_rows[speaker]]))
+
+
+def utterance_from_audio(audio_bytes):
+    """The first 80 frames of the log-mel-energy features of a sound file, as in the evaluation dataset."""
+    try:
+        signal, fs = audio_io.read_audio(io.BytesIO(audio_bytes))
+    except Exception as err:
+        # The decoders raise their own errors on a malformed file (e.g. soundfile.LibsndfileError),
+        # which are errors of the request.
+        raise ValueError('The audio could not be decoded: %s' % err)
+    feature = speechpy.feature.lmfe(signal, sampling_frequency=fs, frame_length=0.025, frame_stride=0.01,
+                                    num_filters=NumCoefficient, fft_length=1024, low_frequency=0,
+                                    high_frequency=None)
+    if feature.shape[0] < NumFrames:
+        raise ValueError('The utterance is shorter than %d frames' % NumFrames)
+    return feature[:NumFrames].astype(np.float32)
+
+
+def utterance_from_features(features):
+    utterance = np.asarray(features, dtype=np.float32)
+    if utterance.shape != (NumFrames, NumCoefficient):
+        raise ValueError('The features must have the shape [%d, %d]' % (NumFrames, NumCoefficient))
+    return utterance
+
+
+class VerificationHandler(BaseHTTPRequestHandler):
+    """The HTTP API of the service.
+
+    POST /verify with a JSON body {"speaker": id, "features": [[...]]} (80 x 40
+    log-mel-energies) or {"speaker": id, "audio": base64 encoded sound file}, or
+    POST /verify?speaker=id with the raw sound file as the body.
+    GET /stats returns the latency percentiles and the mean batch size.
+    """
+
+    verifier = None
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/stats':
+            self._reply(200, self.verifier.batcher.stats())
+        else:
+            self._reply(404, {'error': 'Unknown path'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/verify':
+            self._reply(404, {'error': 'Unknown path'})
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                request = json.loads(body.decode('utf-8'))
+                speaker = str(request['speaker'])
+                if 'features' in request:
+                    utterance = utterance_from_features(request['features'])
+                else:
+                    utterance = utterance_from_audio(base64.b64decode(request['audio']))
+            else:
+                speaker = parse_qs(url.query)['speaker'][0]
+                utterance = utterance_from_audio(body)
+        except (KeyError, TypeError, ValueError) as err:
+            self._reply(400, {'error': 'Malformed request: %s' % err})
+            return
+        if speaker not in self.verifier.model_rows:
+            self._reply(404, {'error': 'Speaker %s is not enrolled' % speaker})
+            return
+        try:
+            score = self.verifier.verify(speaker, utterance)
+        except Exception as err:
+            tf.logging.error('Verification of speaker %s failed: %s', speaker, err)
+            self._reply(500, {'error': 'Verification failed: %s' % err})
+            return
+        self._reply(200, {'speaker': speaker, 'score': score})
+
+    def _reply(self, code, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        tf.logging.debug(format, *args)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix socket clients have no address, which the request handler expects.
+        request, _ = self.socket.accept()
+        return request, ('', 0)
+
+
+def main(_):
+    tf.logging.set_verbosity(tf.logging.INFO)
+
+    VerificationHandler.verifier = Verifier()
+    if FLAGS.unix_socket:
+        if os.path.exists(FLAGS.unix_socket):
+            os.remove(FLAGS.unix_socket)
+        server = ThreadingUnixHTTPServer(FLAGS.unix_socket, VerificationHandler)
+        tf.logging.info('Verification service listening on %s', FLAGS.unix_socket)
+    else:
+        server = ThreadingHTTPServer((FLAGS.host, FLAGS.port), VerificationHandler)
+        tf.logging.info('Verification service listening on %s:%d', FLAGS.host, FLAGS.port)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    tf.app.run()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# The modules of the command line tools (see roc_cli.py).
+MODULES = ['roc_cli', 'calculate_roc', 'report', 'PlotROC', 'PlotPR', 'PlotHIST', 'precision_report']
+
+
+def import_time(module, repeats):
+    """The best wall time of a fresh interpreter importing `module`, minus that of an empty one."""
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def best(code):
+        times = []
+        for _ in range(repeats):
+            start = time.time()
+            subprocess.check_call([sys.executable, '-c', code], cwd=here)
+            times.append(time.time() - start)
+        return min(times)
+
+    return best('import %s' % module) - best('pass')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times the start-up of the evaluation and plotting tools.')
+    parser.add_argument('--repeats', type=int, default=5, help='The number of fresh interpreters per module.')
+    parser.add_argument('--budget_ms', type=float, default=250.0,
+                        help='The maximum import time of a module; the benchmark fails above it.')
+    args = parser.parse_args()
+
+    over_budget = []
+    print("%-18s %10s" % ("module", "import ms"))
+    for module in MODULES:
+        milliseconds = 1000 * import_time(module, args.repeats)
+        print("%-18s %10.1f" % (module, milliseconds))
+        if milliseconds > args.budget_ms:
+            over_budget.append(module)
+    if over_budget:
+        print("Over the %.0f ms budget: %s" % (args.budget_ms, ', '.join(over_budget)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,54 +1,118 @@
 # Siamese Architecture for face recognition
 
-import random
-import numpy as np
-import time
-import tensorflow as tf
-import math
-import pdb
-import sys
+import argparse
 import os
-import scipy.io as sio
-from sklearn import *
-import matplotlib.pyplot as plt
-
-tf.app.flags.DEFINE_string(
-    'evaluation_dir', '../../results/ROC',
-    'Directory where checkpoints and event logs are written to.')
-
-# Store all elemnts in FLAG structure!
-FLAGS = tf.app.flags.FLAGS
+import numpy as np
+import roc_metrics
+import roc_bootstrap
 
 
-score = np.load(os.path.join(FLAGS.evaluation_dir,'score_vector.npy'))
-label = np.load(os.path.join(FLAGS.evaluation_dir,'target_label_vector.npy'))
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='EER, AUC, AP and minDCF of the evaluation scores.')
+    parser.add_argument('--evaluation_dir', default='../../results/ROC',
+                        help='Directory of score_vector.npy and target_label_vector.npy.')
+    parser.add_argument('--num_bins', type=int, default=0,
+                        help='If positive, the metrics are computed out-of-core from score histograms with this '
+                             'number of bins in [-1, 1] instead of sorting all the scores in memory.')
+    parser.add_argument('--num_workers', type=int, default=1,
+                        help='The number of processes histogramming chunks of the score file (with num_bins) or '
+                             'running bootstrap resamples.')
+    parser.add_argument('--p_targets', default='0.01,0.001',
+                        help='Comma-separated prior probabilities of a target trial of the minDCF.')
+    parser.add_argument('--num_bootstrap', type=int, default=0,
+                        help='If positive, the number of bootstrap resamples of the confidence intervals (run in '
+                             'num_workers processes, with all the scores in memory).')
+    parser.add_argument('--bootstrap_cluster', default='speaker', choices=['pair', 'trial', 'speaker'],
+                        help='The unit resampled by the bootstrap: "pair", "trial" (all the pairs of a test '
+                             'utterance) or "speaker" (all the trials of a test speaker).')
+    parser.add_argument('--confidence_level', type=float, default=0.95,
+                        help='The confidence level of the bootstrap intervals.')
+    parser.add_argument('--bootstrap_seed', type=int, default=0, help='The random seed of the bootstrap resamples.')
+    return parser.parse_args(argv)
 
 
 def calculate_eer_auc_ap(label,distance):
 
-    fpr, tpr, thresholds = metrics.roc_curve(label, distance, pos_label=1)
-    AUC = metrics.roc_auc_score(label, distance, average='macro', sample_weight=None)
-    AP = metrics.average_precision_score(label, distance, average='macro', sample_weight=None)
+    # A single sorted pass gives all the operating points.
+    thresholds, fps, tps = roc_metrics.roc_counts(distance, label)
+    fpr, tpr = roc_metrics.rates(fps, tps)
+    AUC = roc_metrics.area_under_curve(fpr, tpr)
+    AP = roc_metrics.average_precision(fps, tps)
 
-    # Calculating EER
-    intersect_x = fpr[np.abs(fpr - (1 - tpr)).argmin(0)]
-    EER = intersect_x
+    # Calculating EER (interpolated crossing of the false positive and miss rates)
+    EER = roc_metrics.equal_error_rate(fpr, tpr)
 
     return EER,AUC,AP,fpr, tpr
 
-# K-fold validation for ROC
-k=1
-step = int(label.shape[0] / float(k))
-EER_VECTOR = np.zeros((k,1))
-AUC_VECTOR = np.zeros((k,1))
-for split_num in range(k):
-    index_start = split_num * step
-    index_end = (split_num + 1) * step
-    EER_temp,AUC_temp,AP,fpr, tpr = calculate_eer_auc_ap(label[index_start:index_end],score[index_start:index_end])
-    EER_VECTOR[split_num] = EER_temp * 100
-    AUC_VECTOR[split_num] = AUC_temp * 100
 
-print("EER=",np.mean(EER_VECTOR),np.std(EER_VECTOR))
-print("AUC=",np.mean(AUC_VECTOR),np.std(AUC_VECTOR))
+def load_scores(evaluation_dir):
+    """Loads the score and target label vectors written by evaluation.py."""
+    score = np.load(os.path.join(evaluation_dir,'score_vector.npy'))
+    label = np.load(os.path.join(evaluation_dir,'target_label_vector.npy'))
+    return score, label
+
+
+def kfold_eer_auc(label, score, k=1):
+    """K-fold validation for ROC: the EER and AUC (in percent) of each of the k splits."""
+    step = int(label.shape[0] / float(k))
+    EER_VECTOR = np.zeros((k,1))
+    AUC_VECTOR = np.zeros((k,1))
+    for split_num in range(k):
+        index_start = split_num * step
+        index_end = (split_num + 1) * step
+        EER_temp,AUC_temp,AP,fpr, tpr = calculate_eer_auc_ap(label[index_start:index_end],score[index_start:index_end])
+        EER_VECTOR[split_num] = EER_temp * 100
+        AUC_VECTOR[split_num] = AUC_temp * 100
+    return EER_VECTOR, AUC_VECTOR
+
+
+def trial_clusters(evaluation_dir, num_pairs, cluster):
+    """The cluster of each (trial, model) pair of the trial-major score vector, or None for "pair"."""
+    if cluster == 'pair':
+        return None
+    trial_labels = np.load(os.path.join(evaluation_dir,'trial_label_vector.npy'))
+    num_models = num_pairs // trial_labels.shape[0]
+    if cluster == 'trial':
+        return np.arange(num_pairs) // num_models
+    if cluster == 'speaker':
+        return np.repeat(trial_labels, num_models)
+    raise ValueError('Bootstrap cluster [%s] was not recognized' % cluster)
+
+
+def main(argv=None):
+    FLAGS = parse_args(argv)
+    p_targets = [float(p_target) for p_target in FLAGS.p_targets.split(',')]
+    if FLAGS.num_bins > 0:
+        histogram = roc_metrics.histogram_from_files(os.path.join(FLAGS.evaluation_dir,'score_vector.npy'),
+                                                     os.path.join(FLAGS.evaluation_dir,'target_label_vector.npy'),
+                                                     num_bins=FLAGS.num_bins, num_workers=FLAGS.num_workers)
+        thresholds, fps, tps = histogram.counts()
+    else:
+        score, label = load_scores(FLAGS.evaluation_dir)
+        thresholds, fps, tps = roc_metrics.roc_counts(score, label)
+    results = roc_metrics.verification_metrics(fps, tps, p_targets)
+
+    print("EER=",results['EER'] * 100)
+    print("AUC=",results['AUC'] * 100)
+    print("AP=",results['AP'] * 100)
+    for p_target in p_targets:
+        print("minDCF(p_target=%g)=" % p_target,results['minDCF'][p_target])
+
+    if FLAGS.num_bootstrap > 0:
+        if FLAGS.num_bins > 0:
+            score, label = load_scores(FLAGS.evaluation_dir)
+        sorted_scores = roc_bootstrap.SortedScores(score, label, trial_clusters(FLAGS.evaluation_dir, score.shape[0],
+                                                                                FLAGS.bootstrap_cluster))
+        resampled = roc_bootstrap.bootstrap(sorted_scores, FLAGS.num_bootstrap, p_targets, seed=FLAGS.bootstrap_seed,
+                                            num_workers=FLAGS.num_workers)
+        intervals = roc_bootstrap.confidence_intervals(resampled, FLAGS.confidence_level)
+        print("%g%% confidence intervals (%d resamples of %d %s clusters):" % (
+            100 * FLAGS.confidence_level, FLAGS.num_bootstrap, sorted_scores.num_clusters, FLAGS.bootstrap_cluster))
+        for name in sorted(intervals):
+            # The same units as above: percents for the EER, AUC and AP.
+            scale = 100 if name in roc_bootstrap.METRICS else 1
+            print("  %s: [%f, %f]" % (name, scale * intervals[name][0], scale * intervals[name][1]))
 
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# Accuracy drift and speedup of reduced-precision embeddings
+
+import argparse
+import os
+import numpy as np
+
+import calculate_roc
+
+
+def load_throughput(evaluation_dir):
+    """The utterances per second of the embeddings, from the throughput.log of evaluation.py."""
+    with open(os.path.join(evaluation_dir, 'throughput.log')) as in_handler:
+        return float(in_handler.read().split()[2])
+
+
+def evaluate_dir(evaluation_dir):
+    """The EER (%), AUC (%) and embedding throughput of an evaluation directory."""
+    score, label = calculate_roc.load_scores(evaluation_dir)
+    EER_VECTOR, AUC_VECTOR = calculate_roc.kfold_eer_auc(label, score)
+    return np.mean(EER_VECTOR), np.mean(AUC_VECTOR), load_throughput(evaluation_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='EER/AUC drift and speedup of reduced-precision embeddings.')
+    parser.add_argument('--reference_dir', default='../../results/SCORES',
+                        help='The evaluation directory of the float32 network.')
+    parser.add_argument('--candidate_dirs', default='../../results/SCORES_float16,../../results/SCORES_int8',
+                        help='Comma-separated evaluation directories of the reduced-precision frozen graphs.')
+    FLAGS = parser.parse_args(argv)
+
+    reference_eer, reference_auc, reference_throughput = evaluate_dir(FLAGS.reference_dir)
+
+    print("%-40s %8s %8s %8s %8s %12s %8s" % ("evaluation_dir", "EER", "dEER", "AUC", "dAUC",
+                                              "utt/sec", "speedup"))
+    print("%-40s %8.3f %8s %8.3f %8s %12.2f %8s" % (FLAGS.reference_dir, reference_eer, "-", reference_auc, "-",
+                                                    reference_throughput, "-"))
+    for candidate_dir in FLAGS.candidate_dirs.split(','):
+        eer, auc, throughput = evaluate_dir(candidate_dir)
+        print("%-40s %8.3f %+8.3f %8.3f %+8.3f %12.2f %8.2f" % (candidate_dir, eer, eer - reference_eer, auc,
+                                                               auc - reference_auc, throughput,
+                                                               throughput / reference_throughput))
+
+
+if __name__ == '__main__':
+    main()
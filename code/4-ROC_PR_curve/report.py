@@ -0,0 +1,160 @@
+"""
+Renders the ROC, PR and score histogram figures and the metrics of an evaluation in one pass.
+
+The scores are read once, chunk by chunk through memory maps, into fine score histograms
+(or sorted once with --score_bins=0). The curves are decimated to a fixed number of points
+and the figures are drawn with the non-interactive Agg backend, so the report runs headless.
+matplotlib is only imported when a figure is drawn.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os
+
+import numpy as np
+
+import roc_metrics
+
+
+def decimate(x, y, num_points=1000):
+    """Keeps about `num_points` points of a curve, evenly spaced along its length.
+
+    The first and last points are always kept, and the drawn curve is visually the same.
+    """
+    if x.shape[0] <= num_points:
+        return x, y
+    length = np.r_[0.0, np.cumsum(np.hypot(np.diff(x), np.diff(y)))]
+    index = np.searchsorted(length, np.linspace(0.0, length[-1], num_points))
+    index = np.unique(np.r_[0, np.minimum(index, x.shape[0] - 1), x.shape[0] - 1])
+    return x[index], y[index]
+
+
+def class_histograms(score, label, num_bins=50):
+    """The target and non-target counts over `num_bins` bins spanning the scores (vectorized).
+
+    Returns:
+      A tuple of (edges, target_counts, nontarget_counts).
+    """
+    score = np.asarray(score).reshape(-1)
+    is_target = np.asarray(label).reshape(-1) == 1
+    edges = np.linspace(np.amin(score), np.amax(score), num_bins + 1)
+    return edges, np.histogram(score[is_target], edges)[0], np.histogram(score[~is_target], edges)[0]
+
+
+def rebin(histogram, num_bins=50):
+    """The target and non-target counts of a `ScoreHistogram` merged into `num_bins` bins
+    spanning its non-empty bins, in the format of `class_histograms`."""
+    total = histogram.target_counts + histogram.nontarget_counts
+    nonzero = np.flatnonzero(total)
+    first, last = nonzero[0], nonzero[-1] + 1
+    starts = np.unique(np.linspace(first, last, num_bins + 1).astype(np.int64)[:-1])
+    fine_edges = np.linspace(histogram.low, histogram.high, histogram.num_bins + 1)
+    edges = np.r_[fine_edges[starts], fine_edges[last]]
+    return (edges, np.add.reduceat(histogram.target_counts[:last], starts),
+            np.add.reduceat(histogram.nontarget_counts[:last], starts))
+
+
+def _pyplot():
+    """Imports pyplot with the non-interactive Agg backend on first use."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot_roc(fpr, tpr, save_path):
+    plt = _pyplot()
+    fig = plt.figure()
+    ax = fig.gca()
+    lines = plt.plot(fpr, tpr, label='ROC Curve')
+    plt.setp(lines, linewidth=2, color='r')
+    ax.set_xticks(np.arange(0, 1.1, 0.1))
+    ax.set_yticks(np.arange(0, 1.1, 0.1))
+    plt.title('ROC.jpg')
+    plt.xlabel('False Positive Rate')
+    plt.ylabel('True Positive Rate')
+    plt.grid()
+    fig.savefig(save_path)
+    plt.close(fig)
+
+
+def plot_pr(recall, precision, save_path):
+    plt = _pyplot()
+    fig = plt.figure()
+    ax = fig.gca()
+    lines = plt.plot(recall, precision, label='PR Curve')
+    plt.setp(lines, linewidth=2, color='r')
+    ax.set_xticks(np.arange(0, 1.1, 0.1))
+    ax.set_yticks(np.arange(0, 1.1, 0.1))
+    plt.title('PR.jpg')
+    plt.xlabel('Recall')
+    plt.ylabel('Precision')
+    plt.grid()
+    fig.savefig(save_path)
+    plt.close(fig)
+
+
+def plot_histogram(edges, target_counts, nontarget_counts, save_path):
+    # The counts are drawn as the weights of one sample per bin.
+    centers = 0.5 * (edges[1:] + edges[:-1])
+    plt = _pyplot()
+    fig = plt.figure()
+    plt.hist(centers, edges, weights=target_counts, alpha=0.5, facecolor='blue', label='gen_dist_original')
+    plt.hist(centers, edges, weights=nontarget_counts, alpha=0.5, facecolor='red', label='imp_dist_original')
+    plt.legend(loc='upper right')
+    plt.title('OriginalFeatures_Histogram.jpg')
+    fig.savefig(save_path)
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Renders the ROC/PR/histogram report of an evaluation.')
+    parser.add_argument('--evaluation_dir', default='../../results/SCORES',
+                        help='Directory of score_vector.npy and target_label_vector.npy.')
+    parser.add_argument('--plot_dir', default='../../results/PLOTS', help='Directory where plots are saved to.')
+    parser.add_argument('--num_points', type=int, default=1000, help='The number of points of each curve.')
+    parser.add_argument('--num_bins', type=int, default=50, help='Number of bins for plotting histogram.')
+    parser.add_argument('--score_bins', type=int, default=100000,
+                        help='The number of bins in [-1, 1] of the score histograms the curves and metrics '
+                             'are computed from. If 0, all the scores are sorted in memory instead.')
+    parser.add_argument('--num_workers', type=int, default=1,
+                        help='The number of processes reading chunks of the score file.')
+    parser.add_argument('--p_targets', default='0.01,0.001',
+                        help='Comma-separated prior probabilities of a target trial of the minDCF.')
+    args = parser.parse_args(argv)
+
+    score_path = os.path.join(args.evaluation_dir, 'score_vector.npy')
+    label_path = os.path.join(args.evaluation_dir, 'target_label_vector.npy')
+    if args.score_bins > 0:
+        histogram = roc_metrics.histogram_from_files(score_path, label_path, num_bins=args.score_bins,
+                                                     num_workers=args.num_workers)
+        thresholds, fps, tps = histogram.counts()
+        edges, target_counts, nontarget_counts = rebin(histogram, args.num_bins)
+    else:
+        score, label = np.load(score_path), np.load(label_path)
+        thresholds, fps, tps = roc_metrics.roc_counts(score, label)
+        edges, target_counts, nontarget_counts = class_histograms(score, label, args.num_bins)
+        del score, label
+
+    p_targets = [float(p_target) for p_target in args.p_targets.split(',')]
+    results = roc_metrics.verification_metrics(fps, tps, p_targets)
+    lines = ["EER = %f" % results['EER'], "AUC = %f" % results['AUC'], "AP = %f" % results['AP']]
+    lines += ["minDCF(p_target=%g) = %f" % (p_target, results['minDCF'][p_target]) for p_target in p_targets]
+
+    if not os.path.exists(args.plot_dir):
+        os.makedirs(args.plot_dir)
+    fpr, tpr = roc_metrics.rates(fps, tps)
+    plot_roc(*decimate(fpr, tpr, args.num_points), save_path=os.path.join(args.plot_dir, 'ROC.jpg'))
+    precision, recall = roc_metrics.precision_recall(fps, tps)
+    plot_pr(*decimate(recall, precision, args.num_points), save_path=os.path.join(args.plot_dir, 'PR.jpg'))
+    plot_histogram(edges, target_counts, nontarget_counts, os.path.join(args.plot_dir, 'Histogram.jpg'))
+
+    with open(os.path.join(args.plot_dir, 'report.txt'), 'w') as out:
+        out.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Bootstrap confidence intervals of the EER, AUC, AP and minDCF
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+
+import numpy as np
+
+import roc_metrics
+
+METRICS = ('EER', 'AUC', 'AP')
+
+
+class SortedScores(object):
+    """The trials sorted once by decreasing score, shared by all the resamples.
+
+    A resample only changes how many times each trial counts, so its operating points are
+    weighted cumulative sums over this fixed order: O(n) instead of a new sort.
+
+    Args:
+      score: The scores of the trials.
+      label: The labels of the trials, 1 for target trials and 0 otherwise.
+      cluster: Optional cluster id (e.g. the test speaker or utterance) of each trial.
+        Clusters are resampled as a whole, which accounts for their correlated trials.
+    """
+
+    def __init__(self, score, label, cluster=None):
+        score = np.asarray(score).reshape(-1)
+        order = np.argsort(score, kind='mergesort')[::-1]
+        sorted_score = score[order]
+        self.is_target = np.asarray(label).reshape(-1)[order] == 1
+        # The last trial of each run of equal scores.
+        self.run_ends = np.r_[np.flatnonzero(np.diff(sorted_score)), sorted_score.shape[0] - 1]
+        self.num_trials = sorted_score.shape[0]
+        if cluster is None:
+            self.cluster = None
+            self.num_clusters = self.num_trials
+        else:
+            # Dense cluster indexes in the sorted order.
+            unique_clusters, cluster_index = np.unique(np.asarray(cluster).reshape(-1), return_inverse=True)
+            self.cluster = cluster_index[order]
+            self.num_clusters = unique_clusters.shape[0]
+
+    def counts(self, weights=None):
+        """The operating points (fps, tps) with each trial counted `weights` times."""
+        if weights is None:
+            tps = np.cumsum(self.is_target, dtype=np.int64)
+            fps = np.arange(1, self.num_trials + 1, dtype=np.int64) - tps
+        else:
+            tps = np.cumsum(np.where(self.is_target, weights, 0), dtype=np.int64)
+            fps = np.cumsum(weights, dtype=np.int64) - tps
+        return np.r_[0, fps[self.run_ends]], np.r_[0, tps[self.run_ends]]
+
+    def resample_weights(self, random_state):
+        """How many times each trial is drawn by a bootstrap resample (of trials or of clusters)."""
+        draws = np.bincount(random_state.randint(self.num_clusters, size=self.num_clusters),
+                            minlength=self.num_clusters)
+        if self.cluster is None:
+            return draws
+        return draws[self.cluster]
+
+    def metrics(self, weights=None, p_targets=(0.01,)):
+        """The metrics of the (re)sampled trials as a flat dictionary."""
+        fps, tps = self.counts(weights)
+        results = roc_metrics.verification_metrics(fps, tps, p_targets)
+        flat = dict((name, results[name]) for name in METRICS)
+        for p_target in p_targets:
+            flat['minDCF(%g)' % p_target] = results['minDCF'][p_target]
+        return flat
+
+
+# The scores of the pool workers, set once per process.
+_worker_scores = None
+
+
+def _init_worker(sorted_scores):
+    global _worker_scores
+    _worker_scores = sorted_scores
+
+
+def _resample_metrics(args):
+    seed, num_resamples, p_targets = args
+    random_state = np.random.RandomState(seed)
+    return [_worker_scores.metrics(_worker_scores.resample_weights(random_state), p_targets)
+            for _ in range(num_resamples)]
+
+
+def bootstrap(sorted_scores, num_resamples=1000, p_targets=(0.01,), seed=0, num_workers=1,
+              resamples_per_task=25):
+    """Computes the metrics of bootstrap resamples of the trials.
+
+    Args:
+      sorted_scores: A `SortedScores`.
+      num_resamples: The number of resamples.
+      p_targets: The prior probabilities of a target trial of the minDCF.
+      seed: The random seed; the resamples do not depend on the number of workers.
+      num_workers: The number of processes running resamples.
+      resamples_per_task: The number of resamples run by a worker at a time.
+
+    Returns:
+      A dictionary from each metric name to the numpy array of its resampled values.
+    """
+    tasks = [(seed + start, min(resamples_per_task, num_resamples - start), tuple(p_targets))
+             for start in range(0, num_resamples, resamples_per_task)]
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(sorted_scores,))
+        try:
+            results = pool.map(_resample_metrics, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_worker(sorted_scores)
+        results = [_resample_metrics(task) for task in tasks]
+
+    resamples = [metrics for task_results in results for metrics in task_results]
+    return dict((name, np.array([metrics[name] for metrics in resamples])) for name in resamples[0])
+
+
+def confidence_intervals(resampled, confidence_level=0.95):
+    """The percentile confidence interval of each metric: a dictionary from name to (low, high)."""
+    tail = 50.0 * (1.0 - confidence_level)
+    return dict((name, (np.percentile(values, tail), np.percentile(values, 100.0 - tail)))
+                for name, values in resampled.items())
@@ -0,0 +1,46 @@
+"""
+Command line of the evaluation and plotting tools, e.g.
+
+    python roc_cli.py roc --evaluation_dir=../../results/SCORES --num_bootstrap=1000
+    python roc_cli.py report --evaluation_dir=../../results/SCORES --plot_dir=../../results/PLOTS
+
+Only the module of the command is imported, and the tools import matplotlib only when they
+draw, so the start-up stays small. None of them imports TensorFlow or sklearn.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import importlib
+import sys
+
+# command -> (module, description)
+COMMANDS = [
+    ('roc', ('calculate_roc', 'EER, AUC, AP, minDCF and bootstrap confidence intervals.')),
+    ('report', ('report', 'All the figures and metrics of an evaluation in one pass.')),
+    ('plot_roc', ('PlotROC', 'The ROC curve.')),
+    ('plot_pr', ('PlotPR', 'The precision-recall curve.')),
+    ('plot_hist', ('PlotHIST', 'The histograms of the genuine and impostor scores.')),
+    ('precision_report', ('precision_report', 'EER/AUC drift and speedup of reduced-precision embeddings.')),
+]
+
+
+def usage():
+    lines = ["usage: roc_cli.py <command> [flags]  (roc_cli.py <command> -h for the flags)", "", "commands:"]
+    lines += ["  %-18s %s" % (command, description) for command, (_, description) in COMMANDS]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = dict(COMMANDS)
+    if not argv or argv[0] not in commands:
+        print(usage())
+        return 0 if argv and argv[0] in ('-h', '--help') else 2
+    module = importlib.import_module(commands[argv[0]][0])
+    module.main(argv[1:])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""Tests for the lean imports of the command line tools."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import unittest
+
+import benchmark_import_time
+
+HEAVY_MODULES = ['tensorflow', 'sklearn', 'matplotlib', 'scipy']
+
+
+class RocCliTest(unittest.TestCase):
+
+  def testToolsDoNotImportHeavyModules(self):
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in benchmark_import_time.MODULES:
+      code = ('import sys, %s; print(",".join(name for name in %r if name in sys.modules))'
+              % (module, HEAVY_MODULES))
+      loaded = subprocess.check_output([sys.executable, '-c', code], cwd=here).decode().strip()
+      self.assertEqual(loaded, '', '%s imports %s' % (module, loaded))
+
+  def testUnknownCommandPrintsUsage(self):
+    import roc_cli
+    self.assertEqual(roc_cli.main(['unknown']), 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
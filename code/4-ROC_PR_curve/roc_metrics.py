@@ -0,0 +1,183 @@
+"""
+EER, minDCF, AUC and AP of verification scores, from a sorted pass or from score histograms
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+
+import numpy as np
+
+
+def roc_counts(score, label):
+    """The cumulative false and true positive counts at every distinct threshold.
+
+    A single sort of the scores (higher means more likely a target). Tied scores form a
+    single operating point.
+
+    Args:
+      score: The scores of the trials.
+      label: The labels of the trials, 1 for target trials and 0 otherwise.
+
+    Returns:
+      A tuple of (thresholds, fps, tps) in decreasing threshold order, starting with the
+      operating point which accepts no trial (threshold +inf, zero counts).
+    """
+    score = np.asarray(score).reshape(-1)
+    label = np.asarray(label).reshape(-1)
+    order = np.argsort(score, kind='mergesort')[::-1]
+    score = score[order]
+    is_target = label[order] == 1
+    del order
+
+    tps = np.cumsum(is_target, dtype=np.int64)
+    fps = np.arange(1, score.shape[0] + 1, dtype=np.int64) - tps
+    # The last trial of each run of equal scores.
+    last = np.r_[np.flatnonzero(np.diff(score)), score.shape[0] - 1]
+    return np.r_[np.inf, score[last]], np.r_[0, fps[last]], np.r_[0, tps[last]]
+
+
+class ScoreHistogram(object):
+    """Fixed-bin histograms of the target and non-target scores.
+
+    The histograms of chunks of a score file can be accumulated one after another or in
+    parallel and merged, so huge score files are evaluated out-of-core. The operating points
+    are the bin edges, which bounds the error of the metrics by the bin width.
+
+    Args:
+      num_bins: The number of bins.
+      low: The lower edge of the first bin. Lower scores fall in the first bin.
+      high: The upper edge of the last bin. Higher scores fall in the last bin.
+    """
+
+    def __init__(self, num_bins=100000, low=-1.0, high=1.0):
+        self.num_bins = num_bins
+        self.low = low
+        self.high = high
+        self.target_counts = np.zeros(num_bins, dtype=np.int64)
+        self.nontarget_counts = np.zeros(num_bins, dtype=np.int64)
+
+    def add(self, score, label):
+        """Adds a chunk of scores and labels."""
+        score = np.asarray(score).reshape(-1)
+        is_target = np.asarray(label).reshape(-1) == 1
+        bins = ((score - self.low) * (self.num_bins / (self.high - self.low))).astype(np.int64)
+        np.clip(bins, 0, self.num_bins - 1, out=bins)
+        self.target_counts += np.bincount(bins[is_target], minlength=self.num_bins)
+        self.nontarget_counts += np.bincount(bins[~is_target], minlength=self.num_bins)
+        return self
+
+    def merge(self, other):
+        """Adds the counts of another histogram with the same bins."""
+        self.target_counts += other.target_counts
+        self.nontarget_counts += other.nontarget_counts
+        return self
+
+    def counts(self):
+        """The operating points at the bin edges, in the format of `roc_counts`."""
+        edges = np.linspace(self.low, self.high, self.num_bins + 1)
+        tps = np.r_[0, np.cumsum(self.target_counts[::-1])]
+        fps = np.r_[0, np.cumsum(self.nontarget_counts[::-1])]
+        return np.r_[np.inf, edges[-2::-1]], fps, tps
+
+
+def _chunk_histogram(args):
+    score_path, label_path, start, end, num_bins, low, high = args
+    score = np.load(score_path, mmap_mode='r')
+    label = np.load(label_path, mmap_mode='r')
+    return ScoreHistogram(num_bins, low, high).add(score[start:end], label[start:end])
+
+
+def histogram_from_files(score_path, label_path, num_bins=100000, low=-1.0, high=1.0,
+                         chunk_size=1 << 24, num_workers=1):
+    """Histograms .npy score and label files chunk by chunk through memory maps.
+
+    Args:
+      score_path: The score_vector.npy file.
+      label_path: The target_label_vector.npy file.
+      num_bins: The number of bins.
+      low: The lower edge of the first bin.
+      high: The upper edge of the last bin.
+      chunk_size: The number of trials read at once by a worker.
+      num_workers: The number of processes histogramming chunks in parallel.
+
+    Returns:
+      The merged `ScoreHistogram`.
+    """
+    num_trials = np.load(score_path, mmap_mode='r').shape[0]
+    chunks = [(score_path, label_path, start, min(start + chunk_size, num_trials), num_bins, low, high)
+              for start in range(0, num_trials, chunk_size)]
+    histogram = ScoreHistogram(num_bins, low, high)
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            for chunk in pool.imap_unordered(_chunk_histogram, chunks):
+                histogram.merge(chunk)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for chunk in chunks:
+            histogram.merge(_chunk_histogram(chunk))
+    return histogram
+
+
+def rates(fps, tps):
+    """The false and true positive rates of the operating points."""
+    return fps / float(max(fps[-1], 1)), tps / float(max(tps[-1], 1))
+
+
+def equal_error_rate(fpr, tpr):
+    """The EER, at the linearly interpolated crossing of the false positive and miss rates."""
+    fnr = 1.0 - tpr
+    difference = fnr - fpr
+    # difference decreases from 1 to -1; i is the first operating point past the crossing.
+    i = int(np.argmax(difference <= 0))
+    if i == 0:
+        return fpr[0]
+    weight = difference[i - 1] / (difference[i - 1] - difference[i])
+    return fpr[i - 1] + weight * (fpr[i] - fpr[i - 1])
+
+
+def min_dcf(fpr, tpr, p_target=0.01, c_miss=1.0, c_fa=1.0):
+    """The minimum of the detection cost function, normalized by the cost of the best trivial system."""
+    dcf = c_miss * p_target * (1.0 - tpr) + c_fa * (1.0 - p_target) * fpr
+    return np.min(dcf) / min(c_miss * p_target, c_fa * (1.0 - p_target))
+
+
+def area_under_curve(fpr, tpr):
+    """The area under the ROC curve (ties count as half, like the trapezoidal rule)."""
+    return np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) * 0.5)
+
+
+def average_precision(fps, tps):
+    """The average precision: the precision at each operating point weighted by the recall gained."""
+    recall = tps / float(max(tps[-1], 1))
+    accepted = np.maximum(fps + tps, 1)
+    return np.sum(np.diff(recall) * (tps[1:] / accepted[1:].astype(np.float64)))
+
+
+def precision_recall(fps, tps):
+    """The precision and recall of the operating points (the precision of accepting nothing is 1)."""
+    precision = np.where(fps + tps > 0, tps / np.maximum(fps + tps, 1).astype(np.float64), 1.0)
+    return precision, tps / float(max(tps[-1], 1))
+
+
+def verification_metrics(fps, tps, p_targets=(0.01,)):
+    """The EER, AUC, AP and minDCF (one per target prior) of the operating points.
+
+    Args:
+      fps: The cumulative false positive counts of `roc_counts` or `ScoreHistogram.counts`.
+      tps: The cumulative true positive counts.
+      p_targets: The prior probabilities of a target trial of the minDCF.
+
+    Returns:
+      A dictionary with the keys 'EER', 'AUC', 'AP' and 'minDCF', the latter being a
+      dictionary from each prior to its minDCF.
+    """
+    fpr, tpr = rates(fps, tps)
+    return {'EER': equal_error_rate(fpr, tpr),
+            'AUC': area_under_curve(fpr, tpr),
+            'AP': average_precision(fps, tps),
+            'minDCF': dict((p_target, min_dcf(fpr, tpr, p_target)) for p_target in p_targets)}
@@ -0,0 +1,65 @@
+"""Tests for roc_metrics."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+import roc_metrics
+
+
+class RocMetricsTest(unittest.TestCase):
+
+  def testSeparableScores(self):
+    score = np.array([0.9, 0.8, 0.3, 0.1])
+    label = np.array([1, 1, 0, 0])
+    _, fps, tps = roc_metrics.roc_counts(score, label)
+    results = roc_metrics.verification_metrics(fps, tps, p_targets=(0.01,))
+    self.assertAlmostEqual(results['EER'], 0.0)
+    self.assertAlmostEqual(results['AUC'], 1.0)
+    self.assertAlmostEqual(results['AP'], 1.0)
+    self.assertAlmostEqual(results['minDCF'][0.01], 0.0)
+
+  def testInterpolatedEqualErrorRate(self):
+    # The miss and false positive rates cross between two operating points.
+    score = np.array([0.9, 0.7, 0.6, 0.4, 0.2, 0.1])
+    label = np.array([1, 0, 1, 1, 0, 0])
+    _, fps, tps = roc_metrics.roc_counts(score, label)
+    fpr, tpr = roc_metrics.rates(fps, tps)
+    self.assertAlmostEqual(roc_metrics.equal_error_rate(fpr, tpr), 1.0 / 3)
+    # Two of the nine (target, non-target) pairs are ranked the wrong way.
+    self.assertAlmostEqual(roc_metrics.area_under_curve(fpr, tpr), 7.0 / 9)
+    self.assertAlmostEqual(roc_metrics.average_precision(fps, tps), (1 + 2.0 / 3 + 3.0 / 4) / 3)
+
+  def testTiedScoresAreOneOperatingPoint(self):
+    score = np.array([0.5, 0.5, 0.5, 0.5])
+    label = np.array([1, 0, 1, 0])
+    thresholds, fps, tps = roc_metrics.roc_counts(score, label)
+    self.assertEqual(len(thresholds), 2)
+    fpr, tpr = roc_metrics.rates(fps, tps)
+    self.assertAlmostEqual(roc_metrics.area_under_curve(fpr, tpr), 0.5)
+    self.assertAlmostEqual(roc_metrics.equal_error_rate(fpr, tpr), 0.5)
+
+  def testHistogramMatchesSortedPass(self):
+    random_state = np.random.RandomState(0)
+    label = (random_state.rand(20000) < 0.1).astype(np.int8)
+    score = np.tanh(random_state.randn(20000) * 0.5 + label)
+    _, fps, tps = roc_metrics.roc_counts(score, label)
+    exact = roc_metrics.verification_metrics(fps, tps)
+
+    histogram = roc_metrics.ScoreHistogram(num_bins=10000)
+    for start in range(0, 20000, 3000):
+      histogram.merge(roc_metrics.ScoreHistogram(num_bins=10000).add(score[start:start + 3000],
+                                                                    label[start:start + 3000]))
+    _, fps, tps = histogram.counts()
+    binned = roc_metrics.verification_metrics(fps, tps)
+    self.assertAlmostEqual(exact['EER'], binned['EER'], places=3)
+    self.assertAlmostEqual(exact['AUC'], binned['AUC'], places=3)
+    self.assertAlmostEqual(exact['minDCF'][0.01], binned['minDCF'][0.01], places=2)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -12,26 +12,9 @@ fi
 
 if [ $do_training = 'train' ]; then
 
-    # development
-    python -u ./code/1-development/train_softmax.py --num_epochs=1 --batch_size=3 --development_dataset_path=$development_dataset --train_dir=results/TRAIN_CNN_3D/train_logs
-
-    # enrollment - Automatically restore the latest checkpoint from all saved checkpoints
-    python -u ./code/2-enrollment/enrollment.py --development_dataset_path=$development_dataset --enrollment_dataset_path=$enrollment_dataset --checkpoint_dir=results/TRAIN_CNN_3D/ --enrollment_dir=results/Model
-
-    # evaluation
-    python -u ./code/3-evaluation/evaluation.py --development_dataset_path=$development_dataset --evaluation_dataset_path=$evaluation_dataset --checkpoint_dir=results/TRAIN_CNN_3D/ --evaluation_dir=results/SCORES --enrollment_dir=results/Model
-
-    # ROC curve
-    python -u ./code/4-ROC_PR_curve/calculate_roc.py --evaluation_dir=results/SCORES
-
-    # Plot ROC
-    python -u ./code/4-ROC_PR_curve/PlotROC.py --evaluation_dir=results/SCORES --plot_dir=results/PLOTS
-
-    # Plot ROC
-    python -u ./code/4-ROC_PR_curve/PlotPR.py --evaluation_dir=results/SCORES --plot_dir=results/PLOTS
-
-    # Plot HIST
-    python -u ./code/4-ROC_PR_curve/PlotHIST.py --evaluation_dir=results/SCORES --plot_dir=results/PLOTS --num_bins=5
+    # development, enrollment, evaluation, ROC curve and plots (the stages whose inputs
+    # are unchanged since their last run are skipped, see results/pipeline_state.json)
+    python -u ./run_pipeline.py --development_dataset=$development_dataset --enrollment_dataset=$enrollment_dataset --evaluation_dataset=$evaluation_dataset --results_dir=results --num_epochs=1 --batch_size=3 --num_bins=5
 
 
 
@@ -0,0 +1,283 @@
+"""
+Runs the development, enrollment, evaluation and ROC/plotting stages as a DAG.
+
+A stage is skipped when the content of its inputs (datasets, checkpoint, upstream
+results and its own code), its flags and its outputs are unchanged since it last
+succeeded. The stages whose dependencies are done run concurrently, and the wall
+time of every stage is recorded in the state file, e.g.
+
+    python run_pipeline.py
+    python run_pipeline.py --force=enrollment --max_parallel=2
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stage(object):
+    """A stage of the pipeline.
+
+    Args:
+      name: The name of the stage.
+      script: The Python script run by the stage, relative to the repository.
+      flags: The dictionary of command-line flags of the script.
+      inputs: The files and directories read by the stage (besides its code).
+      outputs: The files and directories written by the stage.
+      deps: The names of the stages which must finish first.
+    """
+
+    def __init__(self, name, script, flags, inputs, outputs, deps=()):
+        self.name = name
+        self.script = script
+        self.flags = flags
+        self.inputs = inputs
+        self.outputs = outputs
+        self.deps = list(deps)
+
+    def command(self):
+        return [sys.executable, '-u', self.script] + ['--%s=%s' % (key, self.flags[key])
+                                                      for key in sorted(self.flags)]
+
+    def code_dir(self):
+        return os.path.dirname(self.script)
+
+
+def pipeline_stages(args):
+    """The stages of run.sh with their inputs and outputs (the three plots are rendered by report.py)."""
+    results = args.results_dir
+    train_dir = os.path.join(results, 'TRAIN_CNN_3D')
+    model_dir = os.path.join(results, 'Model')
+    scores_dir = os.path.join(results, 'SCORES')
+    plots_dir = os.path.join(results, 'PLOTS')
+    scores = [os.path.join(scores_dir, 'score_vector.npy'), os.path.join(scores_dir, 'target_label_vector.npy')]
+    return [
+        Stage('development', 'code/1-development/train_softmax.py',
+              {'num_epochs': args.num_epochs, 'batch_size': args.batch_size,
+               'development_dataset_path': args.development_dataset,
+               'train_dir': os.path.join(train_dir, 'train_logs')},
+              [args.development_dataset], [train_dir]),
+        Stage('enrollment', 'code/2-enrollment/enrollment.py',
+              {'development_dataset_path': args.development_dataset,
+               'enrollment_dataset_path': args.enrollment_dataset,
+               'checkpoint_dir': train_dir + '/', 'enrollment_dir': model_dir},
+              [args.development_dataset, args.enrollment_dataset, train_dir], [model_dir],
+              deps=['development']),
+        Stage('evaluation', 'code/3-evaluation/evaluation.py',
+              {'development_dataset_path': args.development_dataset,
+               'evaluation_dataset_path': args.evaluation_dataset,
+               'checkpoint_dir': train_dir + '/', 'evaluation_dir': scores_dir, 'enrollment_dir': model_dir},
+              [args.development_dataset, args.evaluation_dataset, train_dir, model_dir], [scores_dir],
+              deps=['development', 'enrollment']),
+        Stage('roc', 'code/4-ROC_PR_curve/calculate_roc.py',
+              {'evaluation_dir': scores_dir}, scores, [], deps=['evaluation']),
+        Stage('report', 'code/4-ROC_PR_curve/report.py',
+              {'evaluation_dir': scores_dir, 'plot_dir': plots_dir, 'num_bins': args.num_bins}, scores,
+              [os.path.join(plots_dir, name) for name in ('ROC.jpg', 'PR.jpg', 'Histogram.jpg', 'report.txt')],
+              deps=['evaluation']),
+    ]
+
+
+class ContentHasher(object):
+    """SHA-1 of files and directories.
+
+    The digest of a file is reused while its size and modification time are unchanged,
+    so the datasets are only read again when they change.
+
+    Args:
+      cache: A dictionary of path -> [size, mtime, digest], kept in the state file.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+
+    def file_digest(self, path):
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.cache.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            return cached[2]
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self.lock:
+            self.cache[path] = [stat.st_size, stat.st_mtime, digest]
+        return digest
+
+    def digest(self, paths, exclude=()):
+        """The digest of the content (and relative names) of the files under `paths`.
+
+        A missing path hashes as missing, so creating it changes the digest.
+        """
+        sha = hashlib.sha1()
+        for path in sorted(paths):
+            sha.update(path.encode('utf-8'))
+            if os.path.isdir(path):
+                for directory, dirnames, filenames in os.walk(path):
+                    dirnames[:] = sorted(d for d in dirnames if d not in exclude)
+                    for filename in sorted(filenames):
+                        if filename.endswith('.pyc'):
+                            continue
+                        file_path = os.path.join(directory, filename)
+                        sha.update(os.path.relpath(file_path, path).encode('utf-8'))
+                        sha.update(self.file_digest(file_path).encode('utf-8'))
+            elif os.path.isfile(path):
+                sha.update(self.file_digest(path).encode('utf-8'))
+            else:
+                sha.update(b'<missing>')
+        return sha.hexdigest()
+
+
+def input_digest(stage, hasher):
+    """The digest of everything which determines the outputs of a stage."""
+    sha = hashlib.sha1()
+    sha.update(' '.join(stage.command()[1:]).encode('utf-8'))
+    sha.update(hasher.digest([stage.code_dir()], exclude=('__pycache__',)).encode('utf-8'))
+    sha.update(hasher.digest(stage.inputs).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def is_up_to_date(stage, record, hasher):
+    return (record is not None and record.get('status') == 'done'
+            and record.get('inputs') == input_digest(stage, hasher)
+            and all(os.path.exists(path) for path in stage.outputs)
+            and record.get('outputs') == hasher.digest(stage.outputs))
+
+
+def run_stage(stage, state, hasher, force, log_dir, lock):
+    """Runs a stage unless it is up to date and records its status and wall time."""
+    with lock:
+        record = state['stages'].get(stage.name)
+    if stage.name not in force and is_up_to_date(stage, record, hasher):
+        print("[%s] up to date, skipped" % stage.name)
+        return True
+
+    print("[%s] running: %s" % (stage.name, ' '.join(stage.command())))
+    start_time = time.time()
+    with open(os.path.join(log_dir, '%s.log' % stage.name), 'w') as log:
+        return_code = subprocess.call(stage.command(), stdout=log, stderr=subprocess.STDOUT, cwd=ROOT)
+    wall_time = time.time() - start_time
+
+    record = {'status': 'done' if return_code == 0 else 'failed', 'wall_time': wall_time,
+              'finished': time.strftime('%Y-%m-%d %H:%M:%S')}
+    if return_code == 0:
+        record['inputs'] = input_digest(stage, hasher)
+        record['outputs'] = hasher.digest(stage.outputs)
+    with lock:
+        state['stages'][stage.name] = record
+    print("[%s] %s in %.1f s" % (stage.name, record['status'], wall_time))
+    return return_code == 0
+
+
+def run_pipeline(stages, state, hasher, force=(), max_parallel=4, log_dir='.'):
+    """Runs the stages in dependency order, the ready ones concurrently.
+
+    Returns:
+      The names of the stages which failed or were not run because a dependency failed.
+    """
+    pending = dict((stage.name, stage) for stage in stages)
+    done, failed = set(), set()
+    lock = threading.Lock()
+    while pending:
+        blocked = [name for name, stage in pending.items() if any(dep in failed for dep in stage.deps)]
+        for name in blocked:
+            failed.add(name)
+            del pending[name]
+        ready = sorted(name for name, stage in pending.items() if all(dep in done for dep in stage.deps))
+        if not ready:
+            break
+
+        for wave_start in range(0, len(ready), max_parallel):
+            results = {}
+
+            def target(name):
+                results[name] = run_stage(pending[name], state, hasher, force, log_dir, lock)
+
+            threads = [threading.Thread(target=target, args=(name,))
+                       for name in ready[wave_start:wave_start + max_parallel]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for name, success in results.items():
+                (done if success else failed).add(name)
+        for name in ready:
+            del pending[name]
+    return sorted(failed | set(pending))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the speaker verification pipeline with stage caching.')
+    parser.add_argument('--development_dataset', default='data/development_sample_dataset_speaker.hdf5')
+    parser.add_argument('--enrollment_dataset', default='data/enrollment-evaluation_sample_dataset.hdf5')
+    parser.add_argument('--evaluation_dataset', default='data/enrollment-evaluation_sample_dataset.hdf5')
+    parser.add_argument('--results_dir', default='results')
+    parser.add_argument('--num_epochs', type=int, default=1)
+    parser.add_argument('--batch_size', type=int, default=3)
+    parser.add_argument('--num_bins', type=int, default=5, help='Number of bins of the score histogram plot.')
+    parser.add_argument('--stages', default='',
+                        help='Comma-separated stages to run (with their dependencies). Default: all.')
+    parser.add_argument('--force', default='', help='Comma-separated stages to run even if up to date.')
+    parser.add_argument('--max_parallel', type=int, default=4, help='The number of stages run concurrently.')
+    parser.add_argument('--state_path', default='',
+                        help='The JSON state file. Default: pipeline_state.json in results_dir.')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    stages = pipeline_stages(args)
+    if args.stages:
+        by_name = dict((stage.name, stage) for stage in stages)
+        selected, queue = set(), args.stages.split(',')
+        while queue:
+            name = queue.pop()
+            if name not in by_name:
+                raise ValueError('Stage [%s] was not recognized' % name)
+            if name not in selected:
+                selected.add(name)
+                queue.extend(by_name[name].deps)
+        stages = [stage for stage in stages if stage.name in selected]
+
+    state_path = args.state_path or os.path.join(args.results_dir, 'pipeline_state.json')
+    log_dir = os.path.join(args.results_dir, 'pipeline_logs')
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    state = {'stages': {}, 'file_digests': {}}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state.update(json.load(f))
+    hasher = ContentHasher(state['file_digests'])
+
+    start_time = time.time()
+    try:
+        failed = run_pipeline(stages, state, hasher, force=set(filter(None, args.force.split(','))),
+                              max_parallel=args.max_parallel, log_dir=log_dir)
+    finally:
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.rename(state_path + '.tmp', state_path)
+
+    print("%-12s %-8s %10s" % ("stage", "status", "wall (s)"))
+    for stage in stages:
+        record = state['stages'].get(stage.name, {})
+        print("%-12s %-8s %10.1f" % (stage.name, record.get('status', '-'), record.get('wall_time', 0.0)))
+    print("Total wall time: %.1f s (logs in %s)" % (time.time() - start_time, log_dir))
+    if failed:
+        print("Failed or not run: %s" % ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()